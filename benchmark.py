@@ -0,0 +1,425 @@
+"""
+Benchmark pipeline upload smokeweed dengan export BIMA sintetis.
+
+Generator: export realistis (STO dari KPRO_STO_ROW_MAP, status dari DASHBOARD_STATUS_ORDER,
+hierarki ERRORCODE/SUBERRORCODE, tanggal tersebar satu bulan) dengan seed tetap, file
+di-cache di BENCH_DIR agar run berikutnya tidak generate ulang (xlsx 1M baris lewat
+openpyxl butuh beberapa menit saat pertama kali).
+
+Harness: tiap stage (ingestion, compute_metrics, text report, dashboard, KPRO/Sheet, upload end-to-end)
+dijalankan di proses spawn baru sehingga peak RSS (ru_maxrss) adalah milik stage itu.
+Google Sheets & Telegram diganti stub lokal (tanpa jaringan). Hasil ditulis ke JSON;
+--compare membandingkan dengan hasil commit lain.
+
+    python benchmark.py --rows 10000,100000,1000000 --format xlsx --output .cache/bench/bench.json
+    python benchmark.py --rows 100000 --format csv --compare bench.json
+    python benchmark.py --rows '' --cold-start --max-first-response 1.5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import re
+import signal
+import socket
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+# Cache upload, store & snapshot dimatikan: tiap run mengukur pipeline penuh.
+# Diset sebelum import smokeweed agar juga berlaku di proses spawn.
+os.environ.setdefault("ENABLE_UPLOAD_CACHE", "0")
+os.environ.setdefault("ENABLE_SNAPSHOT_STORE", "0")
+os.environ.setdefault("SHEETS_ACCESS_TOKEN", "bench")
+os.environ.setdefault("DASHBOARD_RENDER_CACHE_DIR", os.path.join(tempfile.gettempdir(), f"smokeweed-bench-renders-{os.getpid()}"))
+
+import numpy as np
+import pandas as pd
+import httpx
+import smokeweed as sw
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.getenv("BENCH_DIR", ".cache/bench")
+BENCH_DEFAULT_ROWS = "10000,100000,1000000"
+# Tanggal acuan tetap (pertengahan bulan) agar hasil antar commit bisa dibandingkan
+BENCH_DEFAULT_DATE = "2026-01-15 14:00"
+BENCH_STAGES = ['ingest', 'compute_metrics', 'text_report', 'dashboard', 'kpro', 'upload_e2e']
+
+# Hierarki kendala seperti di export BIMA: ERRORCODE -> SUBERRORCODE
+BENCH_ERROR_TREE = {
+    'KENDALA PELANGGAN': ['PELANGGAN TIDAK DI TEMPAT', 'RNA', 'PELANGGAN BATAL', 'ALAMAT TIDAK DITEMUKAN', 'RUMAH KOSONG'],
+    'KENDALA TEKNIK': ['ODP FULL', 'ODP JAUH', 'TIANG', 'REDAMAN TINGGI', 'JALUR KABEL'],
+    'KENDALA SISTEM': ['SALAH TAGGING', 'GAGAL AKTIVASI'],
+}
+# Proporsi status (urutan DASHBOARD_STATUS_ORDER)
+BENCH_STATUS_WEIGHTS = [0.08, 0.38, 0.05, 0.04, 0.05, 0.04, 0.10, 0.06, 0.05, 0.05, 0.10]
+# Proporsi baris yang punya ERRORCODE per status; status lain 3%
+BENCH_ERROR_RATE = {'WORKFAIL': 0.9, 'CANCLWORK': 0.5}
+
+# ==========================================
+# GENERATOR EXPORT SINTETIS
+# ==========================================
+def generate_export(rows: int, seed: int = 1, reference: datetime = None) -> pd.DataFrame:
+    """Export BIMA sintetis (vectorized, 1M baris ~ beberapa detik)."""
+    reference = reference or datetime.strptime(BENCH_DEFAULT_DATE, "%Y-%m-%d %H:%M")
+    rng = np.random.default_rng(seed)
+
+    stos = np.array(list(sw.KPRO_STO_ROW_MAP) + ['TGP'])
+    sto = rng.choice(stos, rows, p=[0.22, 0.26, 0.18, 0.16, 0.15, 0.03])
+    # Sebagian kecil STO berformat kotor (huruf kecil / spasi) seperti export asli
+    dirty = rng.random(rows) < 0.03
+    sto = np.where(dirty, np.char.add(np.char.add(' ', np.char.lower(sto)), ' '), sto)
+    status = rng.choice(np.array(sw.DASHBOARD_STATUS_ORDER), rows, p=BENCH_STATUS_WEIGHTS)
+
+    codes = np.array(list(BENCH_ERROR_TREE))
+    code_idx = rng.integers(0, len(codes), rows)
+    rate = np.full(rows, 0.03)
+    for s, r in BENCH_ERROR_RATE.items(): rate[status == s] = r
+    has_error = rng.random(rows) < rate
+    errorcode = np.where(has_error, codes[code_idx], None)
+    sub_pick = rng.random(rows)
+    suberror = np.array([None] * rows, dtype=object)
+    for i, code in enumerate(codes):
+        subs = np.array(BENCH_ERROR_TREE[code])
+        mask = has_error & (code_idx == i)
+        suberror[mask] = subs[(sub_pick[mask] * len(subs)).astype(int)]
+
+    # STATUSDATE: awal bulan s/d acuan, 30% menumpuk di hari acuan
+    month_start = reference.replace(day=1, hour=0, minute=0)
+    span = int((reference - month_start).total_seconds())
+    today_start = int((reference.replace(hour=0, minute=0) - month_start).total_seconds())
+    offset = np.where(rng.random(rows) < 0.3, rng.integers(today_start, span, rows), rng.integers(0, span, rows))
+    status_date = pd.Series(np.datetime64(month_start, 's') + offset.astype('timedelta64[s]'))
+    created = status_date - pd.to_timedelta(rng.exponential(2 * 86400, rows).astype(int), unit='s')
+    manja = created.dt.normalize() + pd.to_timedelta(rng.integers(0, 6, rows), unit='D')
+
+    df = pd.DataFrame({
+        'WONUM': [f"WO{seed:02d}{i:09d}" for i in range(rows)],
+        'SCORDERNO': rng.integers(10**7, 10**8, rows),
+        'STO': sto,
+        'STATUS': status,
+        'ERRORCODE': errorcode,
+        'SUBERRORCODE': suberror,
+        'STATUSDATE': status_date.astype(str),
+        'DATECREATED': created.astype(str),
+        'TGL_MANJA': manja.dt.strftime('%Y-%m-%d'),
+        # Kolom lain di export yang tidak dipakai laporan (menguji usecols)
+        'CUSTOMER_NAME': np.char.add('PELANGGAN ', rng.integers(0, 50000, rows).astype(str)),
+        'PACKAGE_NAME': rng.choice(['INDIHOME 1P 50M', 'INDIHOME 2P 100M', 'INDIHOME 3P 150M'], rows),
+    })
+    df.loc[rng.random(rows) < 0.02, 'STATUSDATE'] = None
+    df.loc[rng.random(rows) < 0.2, 'TGL_MANJA'] = None
+    return df
+
+def export_path(rows: int, seed: int, fmt: str, reference: datetime) -> str:
+    """File export di BENCH_DIR (generate sekali per rows/seed/format/tanggal)."""
+    path = os.path.join(BENCH_DIR, f"bima-{rows}-s{seed}-{reference:%Y%m%d%H%M}.{fmt}")
+    if os.path.exists(path): return path
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+    df = generate_export(rows, seed, reference)
+    tmp = os.path.join(BENCH_DIR, f".tmp-{os.path.basename(path)}")  # ekstensi tetap (dicek pandas)
+    if fmt == 'xlsx': df.to_excel(tmp, index=False, engine='openpyxl')
+    else: df.to_csv(tmp, index=False, compression='gzip' if fmt == 'csv.gz' else None)
+    os.replace(tmp, path)
+    print(f"📦 Generate {os.path.basename(path)}: {time.perf_counter() - t0:.1f}s, {os.path.getsize(path) / 2**20:.1f} MB")
+    return path
+
+# ==========================================
+# STUB SHEETS & TELEGRAM
+# ==========================================
+def install_sheets_stub() -> list:
+    """Ganti client Sheets dengan MockTransport lokal. Return list jumlah cell per request."""
+    requests = []
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(len(json.loads(request.content)['data']))
+        return httpx.Response(200, json={'totalUpdatedCells': requests[-1]})
+    sw.SHEETS_COALESCE_SECONDS = 0
+    sw._sheets_http = httpx.AsyncClient(base_url=sw.SHEETS_API_BASE, transport=httpx.MockTransport(handler))
+    sw._sheets_semaphore = asyncio.Semaphore(sw.SHEETS_MAX_CONCURRENCY)
+    return requests
+
+class StubMessage:
+    """Pengganti telegram.Message: semua balasan dicatat, tidak dikirim."""
+    def __init__(self, path: str, reference: datetime):
+        self.chat_id, self.message_id = 1, 1
+        self.date = reference.replace(tzinfo=sw.WIB_TZ)
+        self.document = SimpleNamespace(file_name=os.path.basename(path), file_size=os.path.getsize(path), file_unique_id=path, file_id=path)
+        self.sent = []
+
+    async def _record(self, kind: str):
+        self.sent.append(kind)
+        return StubMessage.Sent()
+
+    async def reply_text(self, text, **kwargs): return await self._record('text')
+    async def reply_photo(self, photo, **kwargs): return await self._record('photo')
+    async def reply_document(self, document, **kwargs): return await self._record('document')
+
+    class Sent:
+        async def edit_text(self, text, **kwargs): pass
+        async def delete(self): pass
+
+class StubFile:
+    def __init__(self, path: str): self.path = path
+    async def download_to_memory(self, out):
+        with open(self.path, 'rb') as fh: out.write(fh.read())
+
+class StubBot:
+    async def get_file(self, file_id): return StubFile(file_id)
+
+# ==========================================
+# STAGE (masing-masing di proses spawn baru)
+# ==========================================
+def analyze_file(path: str, ts: datetime) -> dict:
+    with open(path, 'rb') as fh: file_bytes = fh.read()
+    if path.endswith('.xlsx'): return sw.analyze_upload(file_bytes, ts)
+    return sw.analyze_csv_upload(file_bytes, ts, 'gzip' if path.endswith('.gz') else None)
+
+def load_frame(path: str):
+    """DataFrame ter-normalisasi penuh dari export (input compute_metrics)."""
+    if path.endswith('.xlsx'):
+        with open(path, 'rb') as fh: return sw.load_export(fh.read())[0]
+    df = pd.read_csv(path, usecols=lambda c: c in sw.REPORT_COLUMNS, dtype=sw.EXPORT_TEXT_DTYPES)
+    return sw.normalize_export(df, {})
+
+async def _kpro_stage(result: dict, ts: datetime) -> dict:
+    requests = install_sheets_stub()
+    t0 = time.perf_counter()
+    cells = sw.build_kpro_cells(result['metrics'])
+    build = time.perf_counter() - t0
+    ok, log, _ = await sw.process_kpro_logic(None, result['metrics'], ts.date(), result['wonum_details'])
+    await sw.close_sheets_session()
+    return {'build_cells_s': build, 'cells': len(cells), 'requests': requests, 'ok': ok and '❌' not in log}
+
+async def _e2e_stage(path: str, reference: datetime) -> dict:
+    requests = install_sheets_stub()
+    # Server hangat (setelah preload): spawn worker & exec modul lazy tidak ikut terukur
+    await sw.ensure_heavy_modules()
+    await sw.warm_process_pool(sw.PROCESS_POOL_WORKERS)
+    message = StubMessage(path, reference)
+    update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=1), effective_user=SimpleNamespace(id=1))
+    t0 = time.perf_counter()
+    await sw.process_upload(update, SimpleNamespace(bot=StubBot()))
+    visible = time.perf_counter() - t0
+    # Sheet jalan di background setelah balasan terkirim
+    await asyncio.gather(*list(sw._background_tasks))
+    total = time.perf_counter() - t0
+    await sw.close_sheets_session()
+    sw.shutdown_process_pool()
+    return {'seconds': visible, 'with_background_s': total, 'replies': message.sent, 'sheet_requests': requests,
+            'worker_peak_rss_mb': sw._job_metrics['worker_peak_rss_mb']}
+
+def run_stage(stage: str, *args) -> dict:
+    """Entry proses spawn: jalankan satu stage, return durasi & peak RSS proses ini."""
+    base_rss = sw.peak_rss_mb()
+    t0 = time.perf_counter()
+    extra = {}
+    if stage == 'ingest':
+        result = analyze_file(*args)
+        extra = {'rows': result['rows'], 'timings': result['timings'], 'result': result}
+    elif stage == 'compute_metrics':
+        # Hanya compute_metrics yang diukur: load & parsing tanggal di luar durasi dan peak
+        path, ts = args
+        t_load = time.perf_counter()
+        df = sw.normalize_date_columns(load_frame(path))
+        load = time.perf_counter() - t_load
+        sw.reset_peak_rss()
+        t0 = time.perf_counter()
+        metrics = sw.compute_metrics(df, ts.date())
+        extra = {'seconds': time.perf_counter() - t0, 'load_s': load, 'stos': len(metrics)}
+    elif stage == 'text_report':
+        result, ts = args
+        extra = {'chars': len(sw.create_detailed_text_report(None, ts, result['metrics']))}
+    elif stage == 'dashboard':
+        result, ts = args
+        counts = result['dashboard_counts']
+        status_counts = counts.groupby(level='STATUS', observed=True).sum()
+        extra = {'png_kb': len(sw.create_integrated_dashboard(None, ts, status_counts, counts).getvalue()) // 1024, 'renderer': sw.DASHBOARD_RENDERER}
+    elif stage == 'kpro':
+        extra = asyncio.run(_kpro_stage(*args))
+    elif stage == 'upload_e2e':
+        extra = asyncio.run(_e2e_stage(*args))
+    # Stage boleh melaporkan durasinya sendiri (e2e: tanpa warmup pool, hanya yang dirasakan user)
+    seconds = extra.pop('seconds', time.perf_counter() - t0)
+    return {'seconds': seconds, 'peak_rss_mb': sw.peak_rss_mb(), 'base_rss_mb': base_rss, **extra}
+
+def spawn_stage(stage: str, *args) -> dict:
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_stage, stage, *args).result()
+
+# ==========================================
+# COLD START (import & respon pertama uvicorn)
+# ==========================================
+def measure_import() -> float:
+    """Durasi `import smokeweed` di interpreter baru."""
+    code = "import time; t0 = time.perf_counter(); import smokeweed; print(time.perf_counter() - t0)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+def measure_first_response(timeout: float = 60) -> dict:
+    """
+    Jalankan uvicorn baru, ukur waktu dari launch proses sampai GET / menjawab 200, lalu ambil
+    fase startup dari /metrics (menunggu preload selesai). Token bot palsu: start_bot gagal &
+    mencoba ulang di background tanpa mengganggu pengukuran.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0)); port = sock.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, 'BOT_TOKEN': '0:bench'}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'smokeweed:app', '--port', str(port), '--log-level', 'warning'],
+                            cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        # Poll port dengan connect mentah (murah) agar harness tidak berebut CPU dengan startup
+        while True:
+            if proc.poll() is not None: raise RuntimeError("uvicorn berhenti sebelum menjawab")
+            if time.perf_counter() - t0 > timeout: raise TimeoutError("uvicorn tidak menjawab /")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.02)
+        if httpx.get(f"{base}/", timeout=10).status_code != 200: raise RuntimeError("GET / tidak 200")
+        first_response = time.perf_counter() - t0
+        phases = {}
+        while 'preload' not in phases and time.perf_counter() - t0 < timeout:
+            text = httpx.get(f"{base}/metrics", timeout=5).text
+            phases = {m[1]: float(m[2]) for m in re.finditer(r'smokeweed_startup_seconds\{phase="(\w+)"\} ([\d.]+)', text)}
+            time.sleep(0.05)
+        return {'first_response_s': first_response, 'app_phases_s': phases}
+    finally:
+        # Satu process group: worker pool hasil preload ikut dihentikan
+        os.killpg(proc.pid, signal.SIGTERM); proc.wait()
+
+def benchmark_cold_start(repeat: int) -> dict:
+    imports = [measure_import() for _ in range(repeat)]
+    runs = [measure_first_response() for _ in range(repeat)]
+    first = [r['first_response_s'] for r in runs]
+    return {'import_s': statistics.median(imports), 'import_runs_s': imports,
+            'first_response_s': statistics.median(first), 'first_response_runs_s': first,
+            'app_phases_s': runs[-1]['app_phases_s']}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=REPO_DIR).stdout.strip()
+    except Exception:
+        return None
+
+def benchmark_size(rows: int, fmt: str, seed: int, reference: datetime, repeat: int, stages: list) -> dict:
+    path = export_path(rows, seed, fmt, reference)
+    ts = reference.replace(tzinfo=sw.WIB_TZ)
+    runs = {stage: [] for stage in stages}
+    result = None
+    for _ in range(repeat):
+        ingest = spawn_stage('ingest', path, ts)
+        result = ingest.pop('result')
+        if 'ingest' in runs: runs['ingest'].append(ingest)
+        for stage in stages:
+            if stage == 'ingest': continue
+            if stage == 'dashboard' and result['dashboard_counts'] is None: continue
+            args = {'upload_e2e': (path, reference), 'compute_metrics': (path, ts)}.get(stage, (result, ts))
+            runs[stage].append(spawn_stage(stage, *args))
+
+    summary = {}
+    for stage, stage_runs in runs.items():
+        if not stage_runs: continue
+        seconds = [r['seconds'] for r in stage_runs]
+        summary[stage] = {
+            'median_s': statistics.median(seconds), 'min_s': min(seconds), 'runs_s': seconds,
+            'peak_rss_mb': max(r['peak_rss_mb'] for r in stage_runs),
+            'base_rss_mb': min(r['base_rss_mb'] for r in stage_runs),
+            'detail': {k: v for k, v in stage_runs[-1].items() if k not in ('seconds', 'peak_rss_mb', 'base_rss_mb')},
+        }
+    out = {'rows': rows, 'format': fmt, 'file_mb': round(os.path.getsize(path) / 2**20, 2), 'stages': summary}
+    # Budget memori sama dengan check_memory_budget; reader Excel di luar budget
+    if 'ingest' in summary and fmt != 'xlsx':
+        out['memory_budget_ok'] = summary['ingest']['peak_rss_mb'] <= sw.MEMORY_BUDGET_MB
+    return out
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """Cetak perbandingan median per (rows, stage). Return False jika ada regresi > tolerance."""
+    ok = True
+    base = {(r['rows'], r['format']): r for r in baseline['results']}
+    print(f"\n📊 vs {(baseline.get('commit') or '?')[:10]} (toleransi {tolerance:.0%})")
+    for res in current['results']:
+        old = base.get((res['rows'], res['format']))
+        if old is None: continue
+        for stage, cur in res['stages'].items():
+            prev = old['stages'].get(stage)
+            if prev is None: continue
+            ratio = cur['median_s'] / prev['median_s'] if prev['median_s'] else 1.0
+            mem = cur['peak_rss_mb'] - prev['peak_rss_mb']
+            flag = "❌" if ratio > 1 + tolerance else "✅"
+            if ratio > 1 + tolerance: ok = False
+            print(f"{flag} {res['rows']:>8} {res['format']:<6} {stage:<15} {prev['median_s']:8.3f}s -> {cur['median_s']:8.3f}s ({ratio - 1:+.0%}), peak {mem:+.0f} MB")
+    if current.get('cold_start') and baseline.get('cold_start'):
+        for key in ('import_s', 'first_response_s'):
+            prev, cur = baseline['cold_start'][key], current['cold_start'][key]
+            ratio = cur / prev if prev else 1.0
+            if ratio > 1 + tolerance: ok = False
+            print(f"{'❌' if ratio > 1 + tolerance else '✅'} cold start {key:<16} {prev:8.3f}s -> {cur:8.3f}s ({ratio - 1:+.0%})")
+    return ok
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline upload smokeweed (export BIMA sintetis).")
+    parser.add_argument('--rows', default=BENCH_DEFAULT_ROWS, help="ukuran export, pisah koma (kosong = lewati)")
+    parser.add_argument('--format', default='xlsx', choices=['xlsx', 'csv', 'csv.gz'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--date', default=BENCH_DEFAULT_DATE, help="timestamp acuan upload (WIB), 'YYYY-MM-DD HH:MM'")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', default=",".join(BENCH_STAGES))
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'benchmark.json'))
+    parser.add_argument('--compare', help="JSON hasil benchmark sebelumnya")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="regresi median yang masih diterima (0.15 = 15%%)")
+    parser.add_argument('--cold-start', action='store_true', help="ukur juga import & respon pertama uvicorn")
+    parser.add_argument('--max-first-response', type=float, help="gagal jika respon pertama (detik) melebihi nilai ini")
+    args = parser.parse_args()
+
+    reference = datetime.strptime(args.date, "%Y-%m-%d %H:%M")
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(BENCH_STAGES)
+    if unknown: parser.error(f"stage tidak dikenal: {', '.join(sorted(unknown))}")
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+        'config': {'seed': args.seed, 'date': args.date, 'repeat': args.repeat, 'renderer': sw.DASHBOARD_RENDERER,
+                   'excel_engine': sw.EXCEL_ENGINE, 'memory_budget_mb': sw.MEMORY_BUDGET_MB},
+        'results': [],
+    }
+    for rows in (int(r) for r in args.rows.split(',') if r):
+        res = benchmark_size(rows, args.format, args.seed, reference, args.repeat, stages)
+        report['results'].append(res)
+        for stage, s in res['stages'].items():
+            print(f"⏱️ {rows:>8} {args.format:<6} {stage:<15} median {s['median_s']:8.3f}s  peak {s['peak_rss_mb']:6.0f} MB")
+        if res.get('memory_budget_ok') is False:
+            print(f"⚠️ {rows} baris: peak ingestion melebihi budget {sw.MEMORY_BUDGET_MB} MB")
+
+    if args.cold_start:
+        cold = report['cold_start'] = benchmark_cold_start(args.repeat)
+        phases = ", ".join(f"{k}={v:.2f}s" for k, v in cold['app_phases_s'].items())
+        print(f"🚀 Cold start: import {cold['import_s']:.3f}s, respon pertama {cold['first_response_s']:.3f}s ({phases})")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as fh: json.dump(report, fh, indent=2, default=str)
+    print(f"💾 Hasil: {args.output}")
+
+    ok = all(r.get('memory_budget_ok', True) for r in report['results'])
+    if args.cold_start and args.max_first_response is not None and report['cold_start']['first_response_s'] > args.max_first_response:
+        print(f"❌ Respon pertama {report['cold_start']['first_response_s']:.3f}s > {args.max_first_response}s")
+        ok = False
+    if args.compare:
+        with open(args.compare) as fh: ok = compare(report, json.load(fh), args.tolerance) and ok
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,96 @@
+from __future__ import annotations
 import logging
-import pandas as pd
-import matplotlib
-# Backend Agg wajib untuk server agar tidak error GUI
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from telegram import Update, InputFile
-from telegram.ext import Application, MessageHandler, filters, CommandHandler, ContextTypes
-from telegram.request import HTTPXRequest
+import importlib.util
+import importlib.machinery
 import io
 import os
+import sys
+import time
+_IMPORT_T0 = time.perf_counter()
+
+# --- IMPORT BERAT DITUNDA (cold start) ---
+# numpy/pandas/matplotlib/google-auth baru di-exec saat atributnya pertama dipakai (atau
+# oleh preload_heavy_modules di background), sehingga app langsung bisa menjawab / & webhook.
+_lazy_specs = {}
+
+def lazy_import(name: str):
+    """
+    Modul LazyLoader: terdaftar di sys.modules, di-exec saat atribut pertama diakses.
+    Hanya untuk modul Python; extension C (mis. matplotlib.ft2font) dibuat saat itu juga
+    sehingga aksesnya harus lewat modul Python yang meng-import-nya.
+    """
+    if name in sys.modules: return sys.modules[name]
+    parent, _, child = name.rpartition('.')
+    if parent:
+        # Spec submodule dicari tanpa menyentuh atribut parent (agar parent tetap lazy)
+        lazy_import(parent)
+        parent_spec = _lazy_specs.get(parent) or sys.modules[parent].__spec__
+        spec = importlib.machinery.PathFinder.find_spec(name, parent_spec.submodule_search_locations)
+    else:
+        spec = importlib.util.find_spec(name)
+    if spec is None: raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    # Namespace package (mis. 'google') tidak punya kode untuk ditunda
+    if not hasattr(spec.loader, 'exec_module') or spec.origin is None: return importlib.import_module(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    _lazy_specs[name] = spec
+    spec.loader.exec_module(module)
+    if parent: setattr(sys.modules[parent], child, module)
+    return module
+
+# Backend Agg wajib untuk server agar tidak error GUI (lewat env karena matplotlib lazy)
+os.environ['MPLBACKEND'] = 'Agg'
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+matplotlib = lazy_import('matplotlib')
+plt = lazy_import('matplotlib.pyplot')
+lazy_import('matplotlib.dates')
+from telegram import Update, InputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+from telegram.ext import Application, MessageHandler, filters, CommandHandler, CallbackQueryHandler, ContextTypes, InvalidCallbackData
+from telegram.request import HTTPXRequest
 import json
+import asyncio
+from collections import OrderedDict, deque
+import random
+import httpx
+import hashlib
+import sqlite3
+import resource
+import cProfile
+import pstats
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI, Request, Response
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, closing
 from datetime import datetime, timezone, timedelta
 
-# --- LIBRARY GOOGLE SHEETS ---
+# --- LIBRARY GOOGLE AUTH (token service account untuk Sheets API via httpx) ---
+try:
+    service_account = lazy_import('google.oauth2.service_account')
+    google_auth_requests = lazy_import('google.auth.transport.requests')
+    HAS_GOOGLE_AUTH = True
+except ImportError:
+    HAS_GOOGLE_AUTH = False
+
+# --- ENGINE EXCEL CEPAT (opsional) ---
+# Cukup cek terpasang: modulnya di-import pandas sendiri saat read_excel (hemat cold start)
+HAS_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+# --- PILLOW UNTUK RENDER DASHBOARD CEPAT (opsional, fallback matplotlib) ---
 try:
-    import gspread
-    HAS_GSPREAD = True
+    from PIL import Image, ImageDraw, ImageFont
+    font_manager = lazy_import('matplotlib.font_manager')
+    backend_agg = lazy_import('matplotlib.backends.backend_agg')
+    HAS_PIL = True
 except ImportError:
-    HAS_GSPREAD = False
+    HAS_PIL = False
+
+# --- PARQUET UNTUK CACHE (opsional, fallback pickle) ---
+# Sama seperti calamine: pyarrow (yang ikut meng-import numpy) baru dimuat oleh pandas
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
 
 # ==========================================
 # 1. KONFIGURASI UTAMA
@@ -34,6 +105,96 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "8330450329:AAGEPd2j2a1dZ1PEJ7BrneykiZ-3Kv1T3
 WEBHOOK_URL = "https://psbiqbal.onrender.com"
 WEBHOOK_PATH = "/telegram"
 
+# --- ANTRIAN UPLOAD (maks. 1 job per chat, job berjalan dibatasi global) ---
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "2"))
+# Upload yang menunggu; di atas batas ini upload dari chat baru ditolak
+UPLOAD_QUEUE_MAX = int(os.getenv("UPLOAD_QUEUE_MAX", "20"))
+
+# --- PROCESS POOL (parsing, agregasi & render di luar event loop) ---
+# Tiap worker memuat pandas/matplotlib sendiri (~190 MB), jadi default-nya sejumlah upload
+# yang boleh jalan bersamaan, dibatasi CPU yang benar-benar boleh dipakai proses ini
+# (os.cpu_count() di container = core host).
+_available_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0")) or max(1, min(UPLOAD_MAX_CONCURRENCY, _available_cpus))
+# Worker yang di-spawn & di-preload saat startup (0 = semua worker baru dibuat saat upload pertama)
+PROCESS_POOL_WARM_WORKERS = min(int(os.getenv("PROCESS_POOL_WARM_WORKERS", "1")), PROCESS_POOL_WORKERS)
+# Worker diganti setelah N job agar heap sisa parsing file besar dikembalikan ke OS
+PROCESS_POOL_MAX_TASKS = int(os.getenv("PROCESS_POOL_MAX_TASKS", "10"))
+
+# --- INGESTION EXPORT BIMA ---
+# Hanya kolom ini yang dibaca dari file; kolom lain tidak dipakai laporan mana pun
+REPORT_COLUMNS = ['STO', 'STATUS', 'ERRORCODE', 'SUBERRORCODE', 'WONUM', 'STATUSDATE', 'DATECREATED', 'TGL_MANJA']
+NORMALIZED_COLUMNS = ['STO', 'STATUS', 'ERRORCODE', 'SUBERRORCODE']
+EXPORT_TEXT_DTYPES = {c: str for c in NORMALIZED_COLUMNS + ['WONUM']}
+# Format tanggal dicoba berurutan (pisah ';'), fallback ke parsing per nilai
+EXPORT_DATE_FORMATS = os.getenv("EXPORT_DATE_FORMATS", "%Y-%m-%d %H:%M:%S;ISO8601").split(';')
+# Urutan tanggal ambigu (01/02/2026) pada fallback: 0 = bulan dulu (perilaku awal), 1 = hari dulu
+EXPORT_DATE_DAYFIRST = os.getenv("EXPORT_DATE_DAYFIRST", "0") == "1"
+EXCEL_ENGINE = 'calamine' if HAS_CALAMINE else None
+EXCEL_EXTENSIONS = ('.xls', '.xlsx')
+CSV_EXTENSIONS = ('.csv', '.csv.gz')
+# CSV dibaca & diagregasi per chunk agar memori datar berapa pun ukuran file
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000"))
+# Budget memori: peak RSS worker untuk normalisasi + agregasi export MEMORY_BUDGET_ROWS baris
+# dari cache parquet atau CSV harus < MEMORY_BUDGET_MB. Dicapai dengan proyeksi kolom, kolom
+# teks kategorikal (500k baris ~21 MB) & tanpa copy DataFrame penuh. Hanya jalur itu yang
+# dicek: reader Excel (calamine/openpyxl) memuat seluruh sheet ke memori (200k baris ~600 MB)
+# dan di luar budget; worker-nya didaur lewat PROCESS_POOL_MAX_TASKS. Worker jalur cache/CSV
+# yang melewati budget (berapa pun jumlah barisnya) dipensiunkan setelah job-nya agar heap-nya
+# kembali ke OS. Dijaga tests/test_upload.py (slow).
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "512"))
+MEMORY_BUDGET_ROWS = 500_000
+
+# --- CACHE UPLOAD (DataFrame hasil parsing, key: file_unique_id + hash konten) ---
+ENABLE_UPLOAD_CACHE = os.getenv("ENABLE_UPLOAD_CACHE", "1") == "1"
+UPLOAD_CACHE_DIR = os.getenv("UPLOAD_CACHE_DIR", ".cache/uploads")
+UPLOAD_CACHE_MAX_MB = int(os.getenv("UPLOAD_CACHE_MAX_MB", "256"))
+# Naikkan jika isi DataFrame hasil load_export berubah, agar cache lama tidak terpakai
+UPLOAD_CACHE_VERSION = 2
+
+# --- STORE STATE PER WONUM (SQLite, opsional) ---
+# Aktif: tiap upload di-upsert ke store & laporan dihitung dari query ber-index, sehingga
+# export delta (hanya WO yang berubah) sudah cukup. Nonaktif: tiap upload = data lengkap.
+ENABLE_WONUM_STORE = os.getenv("ENABLE_WONUM_STORE", "0") == "1"
+WONUM_STORE_PATH = os.getenv("WONUM_STORE_PATH", ".cache/wonum.sqlite3")
+# WONUM yang tidak muncul di upload mana pun selama N hari dibuang dari store
+WONUM_STORE_RETENTION_DAYS = int(os.getenv("WONUM_STORE_RETENTION_DAYS", "62"))
+
+# --- SNAPSHOT AGREGAT HARIAN & PER 2 JAM (sumber data /trend) ---
+ENABLE_SNAPSHOT_STORE = os.getenv("ENABLE_SNAPSHOT_STORE", "1") == "1"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".cache/snapshots")
+SNAPSHOT_SLOT_HOURS = 2
+
+# --- RENDER DASHBOARD ---
+# 'pillow' = raster langsung dengan layout yang sama (cepat), 'matplotlib' = renderer lama
+DASHBOARD_RENDERER = os.getenv("DASHBOARD_RENDERER", "pillow")
+DASHBOARD_DPI = int(os.getenv("DASHBOARD_DPI", "200"))
+# PNG di atas batas ini dikonversi ke palet lalu diperkecil sampai muat
+DASHBOARD_MAX_KB = int(os.getenv("DASHBOARD_MAX_KB", "1024"))
+DASHBOARD_RENDER_CACHE_DIR = os.getenv("DASHBOARD_RENDER_CACHE_DIR", ".cache/renders")
+DASHBOARD_RENDER_CACHE_ENTRIES = int(os.getenv("DASHBOARD_RENDER_CACHE_ENTRIES", "64"))
+
+# --- DRILL-DOWN WONUM (inline keyboard, index in-memory per upload) ---
+WONUM_INDEX_TTL_MINUTES = float(os.getenv("WONUM_INDEX_TTL_MINUTES", "720"))
+WONUM_INDEX_MAX_MB = float(os.getenv("WONUM_INDEX_MAX_MB", "32"))
+WONUM_INDEX_MAX_UPLOADS = int(os.getenv("WONUM_INDEX_MAX_UPLOADS", "100"))
+WONUM_PAGE_SIZE = int(os.getenv("WONUM_PAGE_SIZE", "50"))
+
+# --- COMMAND QUERY (/sto, /kendala, /manja, /ps) dari upload terakhir per chat ---
+CHAT_REPORT_MAX_CHATS = int(os.getenv("CHAT_REPORT_MAX_CHATS", "200"))
+
+# --- INSTRUMENTASI (/metrics Prometheus & /profile) ---
+# User ID Telegram yang boleh memakai /profile (pisah koma)
+ADMIN_USER_IDS = {int(x) for x in os.getenv("ADMIN_USER_IDS", "").split(',') if x.strip()}
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "40"))
+
+# --- COLD START ---
+# Setelah app siap: exec modul lazy (numpy/pandas/matplotlib) & spawn worker pool di background
+PRELOAD_HEAVY_MODULES = os.getenv("PRELOAD_HEAVY_MODULES", "1") == "1"
+# Preload dimulai setelah respon pertama (atau setelah N detik) agar tidak berebut CPU dengannya
+PRELOAD_DELAY_SECONDS = float(os.getenv("PRELOAD_DELAY_SECONDS", "2"))
+BOT_STARTUP_RETRY_MAX_SECONDS = float(os.getenv("BOT_STARTUP_RETRY_MAX_SECONDS", "60"))
+
 # --- PENGATURAN GOOGLE SHEET ---
 ENABLE_GOOGLE_SHEETS = True
 
@@ -42,6 +203,32 @@ KPRO_SHEET_ID = "1wPeYLmInP7JlPCLZ1XYR-A75l9oHQfZ_U2R4Pc6ohVY"
 KPRO_TARGET_SHEET_NAME = "REPORT PS INDIHOME"
 KPRO_MICRO_UPDATE_SHEET_NAME = "UPDATE PER 2JAM"
 
+# --- REGION / WITEL (regions.json, opsional) ---
+# Satu bot untuk beberapa witel dari satu export gabungan: tiap region punya sheet, STO &
+# mapping baris sendiri. Tanpa file: satu region DEFAULT_WITEL dengan mapping KPRO_* di
+# bawah dan seluruh STO di export (perilaku lama).
+REGIONS_CONFIG = os.getenv("REGIONS_CONFIG", "regions.json")
+DEFAULT_WITEL = "JAKPUS"
+
+# --- SHEETS API (httpx async) ---
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+# Base URL bisa diarahkan ke fake server lokal untuk testing
+SHEETS_API_BASE = os.getenv("SHEETS_API_BASE", "https://sheets.googleapis.com/v4")
+# Token statis opsional (testing/fake server); kosong = token service account
+SHEETS_ACCESS_TOKEN = os.getenv("SHEETS_ACCESS_TOKEN", "")
+SHEETS_REQUEST_TIMEOUT = float(os.getenv("SHEETS_REQUEST_TIMEOUT", "20"))
+SHEETS_MAX_CONCURRENCY = int(os.getenv("SHEETS_MAX_CONCURRENCY", "2"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1"))
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "30"))
+
+# --- PENULISAN SHEET (diff + coalescing) ---
+# Flush pertama langsung ditulis; upload yang masuk dalam jendela ini setelah flush
+# terakhir digabung jadi satu flush. Cell diurutkan per timestamp report (terbaru menang)
+SHEETS_COALESCE_SECONDS = float(os.getenv("SHEETS_COALESCE_SECONDS", "5"))
+# Setelah N menit semua cell ditulis ulang (jaga-jaga jika sheet diedit manual)
+SHEETS_FULL_REFRESH_MINUTES = float(os.getenv("SHEETS_FULL_REFRESH_MINUTES", "60"))
+
 # ==========================================
 # 2. LOGIKA KREDENSIAL DARI ENV
 # ==========================================
@@ -70,17 +257,17 @@ def get_credentials_dict():
       "universe_domain": "googleapis.com"
     }
 
-def get_gspread_client():
-    if not HAS_GSPREAD: 
-        logger.error("❌ Library 'gspread' TIDAK DITEMUKAN. Cek requirements.txt")
+def get_google_credentials():
+    """Kredensial service account Sheets; token OAuth di-cache & di-refresh oleh google-auth."""
+    if not HAS_GOOGLE_AUTH: 
+        logger.error("❌ Library 'google-auth' TIDAK DITEMUKAN. Cek requirements.txt")
         return None
     try:
         creds_dict = get_credentials_dict()
         if not creds_dict:
             return None
             
-        gc = gspread.service_account_from_dict(creds_dict)
-        return gc
+        return service_account.Credentials.from_service_account_info(creds_dict, scopes=SHEETS_SCOPES)
     except Exception as e:
         logger.error(f"❌ Google Auth Gagal: {e}", exc_info=True)
         return None
@@ -98,8 +285,182 @@ KPRO_MICRO_COLUMN_INDEX_MAP = {
     'VALSTART': 9, 'VALCOMP': 10, 'WORKFAIL': 11, 'CANCLWORK': 12, 'COMPWORK': 13, 'TOTAL WO': 14
 }
 
+def load_regions(path: str) -> list:
+    """
+    Definisi region dari file JSON: list objek dengan field wajib name, sheet_id, sto_row_map,
+    micro_sto_row_map; opsional stos (default: STO kedua row map), target_sheet_name,
+    micro_sheet_name, column_index_map, micro_column_index_map (default: konstanta KPRO_*).
+    File tidak ada -> satu region default (stos None = semua STO).
+    """
+    default = {
+        'name': DEFAULT_WITEL, 'sheet_id': KPRO_SHEET_ID, 'stos': None,
+        'target_sheet_name': KPRO_TARGET_SHEET_NAME, 'micro_sheet_name': KPRO_MICRO_UPDATE_SHEET_NAME,
+        'sto_row_map': KPRO_STO_ROW_MAP, 'micro_sto_row_map': KPRO_MICRO_STO_ROW_MAP,
+        'column_index_map': KPRO_COLUMN_INDEX_MAP, 'micro_column_index_map': KPRO_MICRO_COLUMN_INDEX_MAP,
+    }
+    if not os.path.exists(path): return [default]
+    with open(path) as fh: entries = json.load(fh)
+
+    regions, owner = [], {}
+    for entry in entries:
+        missing = [k for k in ('name', 'sheet_id', 'sto_row_map', 'micro_sto_row_map') if k not in entry]
+        if missing: raise ValueError(f"{path}: region {entry.get('name', '?')} tanpa field {', '.join(missing)}")
+        region = {**default, **entry}
+        region['name'] = str(region['name']).upper()
+        mapped = [str(s).upper() for s in dict.fromkeys([*region['sto_row_map'], *region['micro_sto_row_map']])]
+        region['stos'] = [str(s).upper() for s in entry['stos']] if entry.get('stos') else mapped
+        # STO di row map tapi di luar stos tidak pernah punya data -> baris sheet-nya selalu 0
+        outside = [sto for sto in mapped if sto not in region['stos']]
+        if outside: raise ValueError(f"{path}: STO {', '.join(outside)} ada di row map {region['name']} tapi tidak di stos")
+        unknown = set(region['micro_column_index_map']) - set(KPRO_MICRO_COLUMN_INDEX_MAP)
+        if unknown: raise ValueError(f"{path}: status micro tidak dikenal di {region['name']}: {', '.join(sorted(unknown))}")
+        for sto in region['stos']:
+            # Satu STO hanya milik satu region agar total witel tidak dobel
+            if sto in owner: raise ValueError(f"{path}: STO {sto} ada di region {owner[sto]} dan {region['name']}")
+            owner[sto] = region['name']
+        regions.append(region)
+    if not regions: raise ValueError(f"{path}: tidak ada region")
+    if len({r['name'] for r in regions}) != len(regions): raise ValueError(f"{path}: nama region dobel")
+    if multiprocessing.parent_process() is None:
+        logger.info(f"🗺️ {len(regions)} region dari {path}: {', '.join(r['name'] + '(' + str(len(r['stos'])) + ' STO)' for r in regions)}")
+    return regions
+
+REGIONS = load_regions(REGIONS_CONFIG)
+# STO yang daftar WONUM micro-nya dikumpulkan (gabungan semua region, urutan region)
+WONUM_DETAIL_STOS = list(dict.fromkeys(sto for region in REGIONS for sto in region['micro_sto_row_map']))
+
+def find_region(name: str):
+    """Region berdasarkan nama (tidak peka huruf besar/kecil), None jika tidak ada."""
+    return next((r for r in REGIONS if r['name'] == name.upper()), None)
+
 # ==========================================
-# 3. DASHBOARD & TEXT REPORT (LOGIC UTAMA)
+# 3. METRICS ENGINE (SATU PASS)
+# ==========================================
+WIB_TZ = timezone(timedelta(hours=7))
+DATE_COLUMNS = ['STATUSDATE', 'DATECREATED', 'TGL_MANJA']
+
+# Kelompok status yang dipakai bersama oleh Text Report & Sheet KPRO
+FO_AKTIVASI_STATUSES = ['CONTWORK', 'INSTCOMP', 'PENDWORK']
+ACOM_STATUSES = ['VALSTART', 'ACOMP', 'ACTCOMP', 'VALCOMP']
+VALSTART_ENDSTATE_STATUSES = ['INSTCOMP', 'ACTCOMP', 'VALCOMP', 'VALSTART']
+MICRO_STATUSES = [s for s in KPRO_MICRO_COLUMN_INDEX_MAP if s != 'TOTAL WO']
+METRIC_DERIVED_COLUMNS = ['ESTIMASI PS', 'TOTAL WO', 'PS/RE HI', 'PS/RE MTD']
+
+# Kolom checkpoint yang ditulis ke sheet REPORT PS INDIHOME (urutan = urutan tulis)
+KPRO_CHECKPOINT_METRICS = [
+    'RE HI', 'PS ENDSTATE', 'VALSTART ENDSATATE', 'EST PS H-1', 'EST PS W-1',
+    'MANJA HI', 'LEWAT MANJA', 'KENDALA PELANGGAN', 'KENDALA JARINGAN',
+]
+
+def parse_date_column(s: pd.Series) -> pd.Series:
+    """
+    Parse kolom tanggal teks dengan format eksplisit (cepat), fallback ke parsing per nilai.
+    Fallback tidak menebak format dari nilai pertama, sehingga chunk CSV mana pun memberi
+    hasil yang sama dengan kolom Excel utuh.
+    """
+    non_null = s.notna().sum()
+    for fmt in EXPORT_DATE_FORMATS:
+        parsed = pd.to_datetime(s, format=fmt, errors='coerce')
+        if parsed.notna().sum() == non_null: return parsed
+    return pd.to_datetime(s, format='mixed', dayfirst=EXPORT_DATE_DAYFIRST, errors='coerce')
+
+def normalize_date_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Konversi kolom tanggal ke datetime (naive) sekali saja. Aman dipanggil berulang."""
+    for col in DATE_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.NaT
+            continue
+        s = df[col]
+        if not pd.api.types.is_datetime64_any_dtype(s):
+            s = parse_date_column(s)
+        if getattr(s.dt, 'tz', None) is not None:
+            s = s.dt.tz_localize(None)
+        df[col] = s
+    return df
+
+def compute_metrics(df: pd.DataFrame, today) -> pd.DataFrame:
+    """
+    Hitung semua metrik per STO dalam satu pass groupby.
+    Hasil: tabel index STO x kolom metrik (hitungan aditif + kolom turunan/rasio).
+    Dipakai bersama oleh create_detailed_text_report dan process_kpro_logic.
+    """
+    return add_metric_ratios(count_metrics(df, today))
+
+def count_metrics(df: pd.DataFrame, today) -> pd.DataFrame:
+    """Bagian aditif compute_metrics: hitungan per STO (bisa dijumlah antar chunk)."""
+    normalize_date_columns(df)
+    today = pd.Timestamp(today)
+    yesterday = today - pd.Timedelta(days=1)
+    seven_days = today - pd.Timedelta(days=6)
+    month_start = today.replace(day=1)
+    next_month = month_start + pd.offsets.MonthBegin(1)
+
+    # Kategorikal: perbandingan & str.contains cukup dilakukan pada kode/kategori unik
+    status = df['STATUS'].astype('category')
+    errorcode = (df['ERRORCODE'] if 'ERRORCODE' in df.columns else pd.Series('', index=df.index)).astype('category')
+    sd, dc = df['STATUSDATE'], df['DATECREATED']
+    sd_day, dc_day, manja_day = sd.dt.normalize(), dc.dt.normalize(), df['TGL_MANJA'].dt.normalize()
+    sd_hour = sd.dt.hour
+
+    # Mask dasar dihitung sekali untuk seluruh frame
+    is_today = sd_day == today
+    is_ps = status == 'COMPWORK'
+    is_pi = status == 'STARTWORK'
+    is_fail = status == 'WORKFAIL'
+    kendala_today = is_today & is_fail
+
+    flags = {
+        'RE HI': dc_day == today,
+        'WO MTD': (dc >= month_start) & (dc < next_month),
+        'FO AKTIVASI': is_today & status.isin(FO_AKTIVASI_STATUSES),
+        'ACOM': is_today & status.isin(ACOM_STATUSES),
+        'PS ENDSTATE': is_today & is_ps,
+        'VALSTART ENDSATATE': is_today & status.isin(VALSTART_ENDSTATE_STATUSES),
+        'EST PS H-1': (sd_day == yesterday) & is_ps,
+        'EST PS W-1': (sd_day >= seven_days) & (sd_day <= today) & is_ps,
+        'PS MTD': (sd >= month_start) & (sd < next_month) & is_ps,
+        'PI': is_pi,
+        'PI OPS': is_pi & (sd_hour < 17),
+        'PI NON OPS': is_pi & (sd_hour >= 17),
+        'LEWAT MANJA': is_pi & (manja_day < today),
+        'MANJA HI': is_pi & (manja_day == today),
+        'MANJA SETELAH HI': is_pi & (manja_day > today),
+        'KENDALA HI': kendala_today,
+        'KENDALA TEKNIK HI': kendala_today & errorcode.str.contains('TEKNIK', na=False),
+        'KENDALA NON TEKNIK HI': kendala_today & errorcode.str.contains('PELANGGAN', na=False),
+        'KENDALA PELANGGAN': is_fail & (errorcode == 'KENDALA PELANGGAN'),
+        'KENDALA JARINGAN': is_fail & (errorcode == 'KENDALA TEKNIK'),
+    }
+    for s in MICRO_STATUSES:
+        flags[s] = is_today & (status == s)
+
+    counts = pd.DataFrame(flags).groupby(df['STO'], dropna=False, observed=True).sum()
+    counts.index.name = 'STO'
+    return counts
+
+def merge_metric_counts(parts: list) -> pd.DataFrame:
+    """Jumlahkan beberapa hasil count_metrics (mis. per chunk CSV) menjadi satu tabel."""
+    merged = pd.concat(parts).groupby(level=0, dropna=False).sum()
+    merged.index.name = 'STO'
+    return merged
+
+def add_metric_ratios(counts: pd.DataFrame) -> pd.DataFrame:
+    """Tambah kolom turunan (Estimasi PS, Total WO micro, PS/RE) dari kolom hitungan."""
+    table = counts.copy()
+    table['ESTIMASI PS'] = table['PS ENDSTATE'] + table['ACOM']
+    table['TOTAL WO'] = table[MICRO_STATUSES].sum(axis=1)
+    table['PS/RE HI'] = (table['PS ENDSTATE'] / table['RE HI'] * 100).where(table['RE HI'] > 0, 0.0)
+    table['PS/RE MTD'] = (table['PS MTD'] / table['WO MTD'] * 100).where(table['WO MTD'] > 0, 0.0)
+    return table
+
+def metrics_total(metrics: pd.DataFrame) -> pd.Series:
+    """Total seluruh STO (rasio dihitung ulang dari total, bukan dijumlah)."""
+    count_cols = [c for c in metrics.columns if c not in METRIC_DERIVED_COLUMNS]
+    totals = metrics[count_cols].sum().to_frame().T
+    return add_metric_ratios(totals).iloc[0]
+
+# ==========================================
+# 4. DASHBOARD & TEXT REPORT (LOGIC UTAMA)
 # ==========================================
 
 def format_indo_date(dt_obj):
@@ -130,172 +491,250 @@ def create_summary_text(status_counts: pd.Series) -> str:
         f"EST PS (PS+ACOM)                = {est_ps}"
     )
 
-def create_detailed_text_report(df: pd.DataFrame, report_timestamp: datetime) -> str:
+# Bagian Text Report: (judul, [(label, kolom metrik, persen?)]). Dipakai juga oleh command query
+REPORT_SECTIONS = {
+    'Aktivasi HI': [('FO AKTIVASI', 'FO AKTIVASI', False), ('ACOM', 'ACOM', False), ('PS HI', 'PS ENDSTATE', False), ('Estimasi PS', 'ESTIMASI PS', False)],
+    'Sisa WO': [('Sisa PI HI (Jam OPS)', 'PI OPS', False), ('Sisa PI HI (Diluar Jam OPS)', 'PI NON OPS', False), ('PI HI', 'PI', False)],
+    'Manja': [('H-', 'LEWAT MANJA', False), ('HI', 'MANJA HI', False), ('H+', 'MANJA SETELAH HI', False)],
+    'WO Kendala HI': [('Kendala HI', 'KENDALA HI', False), ('Teknik', 'KENDALA TEKNIK HI', False), ('Non Teknik', 'KENDALA NON TEKNIK HI', False)],
+    'PS/RE': [('PS/RE HI', 'PS/RE HI', True), ('PS/RE MTD', 'PS/RE MTD', True)],
+}
+
+def format_metric_value(value, pct: bool = False) -> str:
+    return f"{float(value):.1f}%" if pct else f"{int(value)}"
+
+def format_report_section(title: str, m) -> str:
+    """Satu blok Text Report ('Judul' + baris '* label: nilai') dari total/baris metrik `m`."""
+    lines = [title] + [f"* {label}: {format_metric_value(m[col], pct)}" for label, col, pct in REPORT_SECTIONS[title]]
+    return "\n".join(lines)
+
+def create_detailed_text_report(df: pd.DataFrame, report_timestamp: datetime, metrics: pd.DataFrame = None, witel: str = DEFAULT_WITEL) -> str:
     """
     Fungsi membuat Laporan Teks Detail (Format WhatsApp).
+    Angka diambil dari tabel compute_metrics (dihitung ulang jika tidak diberikan).
     """
-    # Setup Timezone
-    wib_tz = timezone(timedelta(hours=7))
-    current_dt = report_timestamp.astimezone(wib_tz)
-    today_date = current_dt.date()
-    
-    # Konversi kolom ke datetime
-    df['STATUSDATE'] = pd.to_datetime(df['STATUSDATE'], errors='coerce')
-    df['DATECREATED'] = pd.to_datetime(df['DATECREATED'], errors='coerce')
-    df['TGL_MANJA'] = pd.to_datetime(df['TGL_MANJA'], errors='coerce')
-    
-    # --- FILTER DATASET ---
-    # 1. Transaksi Hari Ini (Berdasarkan Status Date)
-    df_today = df[df['STATUSDATE'].dt.date == today_date]
-    
-    # 2. Transaksi Created Hari Ini (Untuk Total WO / RE HI)
-    df_created_today = df[df['DATECREATED'].dt.date == today_date]
-    
-    # 3. Snapshot Active (Untuk PI & Manja) - Cari status STARTWORK
-    df_pi = df[df['STATUS'] == 'STARTWORK']
-    
-    # --- HITUNG METRIK ---
-    
-    # A. Total WO: DATE CREAT HI (HARI INI)
-    total_wo_hi = len(df_created_today)
-    
-    # B. Aktivasi HI (Status Date Hari Ini)
-    fo_aktivasi = len(df_today[df_today['STATUS'].isin(['CONTWORK', 'INSTCOMP', 'PENDWORK'])])
-    acom = len(df_today[df_today['STATUS'].isin(['VALSTART', 'ACOMP', 'ACTCOMP', 'VALCOMP'])])
-    ps_hi = len(df_today[df_today['STATUS'] == 'COMPWORK'])
-    estimasi_ps = ps_hi + acom
-    
-    # C. Sisa WO (Dari Snapshot PI/STARTWORK)
-    # Jam OPS: < 17:00
-    pi_ops = len(df_pi[df_pi['STATUSDATE'].dt.hour < 17])
-    # Luar OPS: >= 17:00
-    pi_non_ops = len(df_pi[df_pi['STATUSDATE'].dt.hour >= 17])
-    # Total PI
-    pi_total = len(df_pi)
-    
-    # D. Manja (Dari Snapshot PI berdasarkan TGL_MANJA)
-    manja_h_min = len(df_pi[df_pi['TGL_MANJA'].dt.date < today_date])
-    manja_hi = len(df_pi[df_pi['TGL_MANJA'].dt.date == today_date])
-    manja_h_plus = len(df_pi[df_pi['TGL_MANJA'].dt.date > today_date])
-    
-    # E. Kendala HI (Status Date Hari Ini)
-    df_kendala = df_today[df_today['STATUS'] == 'WORKFAIL']
-    kendala_hi = len(df_kendala)
-    
-    # Deteksi Teknik vs Non Teknik via string matching
-    # Asumsi: Jika error code mengandung 'TEKNIK' masuk teknik, 'PELANGGAN' masuk non-teknik
-    teknik = len(df_kendala[df_kendala['ERRORCODE'].str.contains('TEKNIK', na=False)])
-    non_teknik = len(df_kendala[df_kendala['ERRORCODE'].str.contains('PELANGGAN', na=False)])
-    # Sisa yang tidak terdeteksi (opsional, dimasukkan ke Non Teknik jika perlu)
-    # sisa_kendala = kendala_hi - teknik - non_teknik 
-    # non_teknik += sisa_kendala 
-    
-    # F. PS/RE (Persentase)
-    # PS/RE HI = (PS HI / Total WO HI) * 100
-    ps_re_hi_pct = 0.0
-    if total_wo_hi > 0:
-        ps_re_hi_pct = (ps_hi / total_wo_hi) * 100
-        
-    # PS/RE MTD (Month to Date)
-    df_mtd_created = df[(df['DATECREATED'].dt.month == today_date.month) & (df['DATECREATED'].dt.year == today_date.year)]
-    df_mtd_ps = df[(df['STATUSDATE'].dt.month == today_date.month) & (df['STATUSDATE'].dt.year == today_date.year) & (df['STATUS'] == 'COMPWORK')]
-    
-    total_wo_mtd = len(df_mtd_created)
-    ps_mtd = len(df_mtd_ps)
-    
-    ps_re_mtd_pct = 0.0
-    if total_wo_mtd > 0:
-        ps_re_mtd_pct = (ps_mtd / total_wo_mtd) * 100
+    current_dt = report_timestamp.astimezone(WIB_TZ)
+    if metrics is None:
+        metrics = compute_metrics(df, current_dt.date())
+    m = metrics_total(metrics)
 
     # --- FORMAT OUTPUT ---
+    # A. Total WO (DATE CREAT HI), B-F blok REPORT_SECTIONS (Aktivasi, Sisa PI, Manja, Kendala, PS/RE)
     header_date = format_indo_date(current_dt)
     last_update_str = current_dt.strftime('%d/%m/%y %H:%M')
+    sections = "\n\n".join(format_report_section(title, m) for title in REPORT_SECTIONS)
 
     report_text = (
-        f"Fulfillment Endstate Witel JAKPUS\n"
+        f"Fulfillment Endstate Witel {witel}\n"
         f"{header_date}\n"
         f"--------------------\n\n"
         
-        f"Total WO: {total_wo_hi}\n\n"
-        
-        f"Aktivasi HI\n"
-        f"* FO AKTIVASI: {fo_aktivasi}\n"
-        f"* ACOM: {acom}\n"
-        f"* PS HI: {ps_hi}\n"
-        f"* Estimasi PS: {estimasi_ps}\n\n"
-        
-        f"Sisa WO\n"
-        f"* Sisa PI HI (Jam OPS): {pi_ops}\n"
-        f"* Sisa PI HI (Diluar Jam OPS): {pi_non_ops}\n"
-        f"* PI HI: {pi_total}\n\n"
-        
-        f"Manja\n"
-        f"* H-: {manja_h_min}\n"
-        f"* HI: {manja_hi}\n"
-        f"* H+: {manja_h_plus}\n\n"
-        
-        f"WO Kendala HI\n"
-        f"* Kendala HI: {kendala_hi}\n"
-        f"* Teknik: {teknik}\n"
-        f"* Non Teknik: {non_teknik}\n\n"
+        f"Total WO: {int(m['RE HI'])}\n\n"
         
-        f"PS/RE\n"
-        f"* PS/RE HI: {ps_re_hi_pct:.1f}%\n"
-        f"* PS/RE MTD: {ps_re_mtd_pct:.1f}%\n\n"
+        f"{sections}\n\n"
         
         f"Last Update BIMA: {last_update_str}"
     )
     
     return report_text
 
-def create_integrated_dashboard(daily_df: pd.DataFrame, report_timestamp: datetime, status_counts: pd.Series) -> io.BytesIO:
-    # --- 1. Persiapan Data ---
-    stos = sorted(daily_df['STO'].unique())
-    status_order = ['CANCLWORK', 'COMPWORK', 'ACOMP', 'VALCOMP', 'VALSTART', 'ACTCOMP', 'STARTWORK', 'INSTCOMP', 'PENDWORK', 'CONTWORK', 'WORKFAIL']
-    
+DASHBOARD_STATUS_ORDER = ['CANCLWORK', 'COMPWORK', 'ACOMP', 'VALCOMP', 'VALSTART', 'ACTCOMP', 'STARTWORK', 'INSTCOMP', 'PENDWORK', 'CONTWORK', 'WORKFAIL']
+DASHBOARD_KEYS = ['STATUS', 'ERRORCODE', 'SUBERRORCODE', 'STO']
+
+def _is_blank_code(code) -> bool:
+    return str(code).upper() in ['NAN', 'N/A']
+
+def aggregate_dashboard_counts(daily_df: pd.DataFrame) -> pd.Series:
+    """Jumlah baris per (STATUS, ERRORCODE, SUBERRORCODE, STO) dalam satu groupby."""
+    counts = daily_df.groupby(DASHBOARD_KEYS, dropna=False, observed=True).size()
+    return counts[counts > 0]
+
+def build_dashboard_table(counts: pd.Series):
+    """
+    Bangun tabel bertingkat STATUS -> ERRORCODE -> SUBERRORCODE x STO dari hasil
+    aggregate_dashboard_counts. Biaya sebanding jumlah kode unik, bukan jumlah baris.
+    Return (display_df, row_styles, stos) atau None jika tidak ada status yang relevan.
+    """
+    agg = counts.rename('N').reset_index()
+    for col in DASHBOARD_KEYS:
+        agg[col] = agg[col].astype(object).where(agg[col].notna(), 'NAN')
+    # Kolom STO dari semua baris harian (juga STO yang hanya punya status di luar urutan)
+    stos = sorted(agg['STO'].unique())
+    agg = agg[agg['STATUS'].isin(DASHBOARD_STATUS_ORDER)]
+    if agg.empty: return None
+
+    grid = agg.pivot_table(index=['STATUS', 'ERRORCODE', 'SUBERRORCODE'], columns='STO', values='N', aggfunc='sum', fill_value=0)
+    grid = grid.reindex(columns=stos, fill_value=0)
+    status_totals = grid.groupby(level='STATUS').sum()
+
     table_data, row_styles = [], {}
-    unique_statuses_in_data = daily_df['STATUS'].unique()
-    
-    for status in status_order:
-        if status not in unique_statuses_in_data: continue
-            
-        status_df = daily_df[daily_df['STATUS'] == status]
-        
-        row_data = {'KATEGORI': status}
-        for sto in stos: row_data[sto] = len(status_df[status_df['STO'] == sto])
-        
-        table_data.append(row_data)
-        row_styles[len(table_data) - 1] = {'level': 1, 'status': status}
+    def add_row(label, values, style):
+        table_data.append({'KATEGORI': label, **values.to_dict()})
+        row_styles[len(table_data) - 1] = style
+
+    for status in DASHBOARD_STATUS_ORDER:
+        if status not in status_totals.index: continue
+        add_row(status, status_totals.loc[status], {'level': 1, 'status': status})
 
         if status == 'WORKFAIL':
-            for error_code, error_group in status_df.groupby('ERRORCODE'):
-                if str(error_code).upper() in ['NAN', 'N/A']: continue
-                error_row = {'KATEGORI': f"  ↳ {error_code}"}
-                for sto in stos: error_row[sto] = len(error_group[error_group['STO'] == sto])
-                table_data.append(error_row)
-                row_styles[len(table_data) - 1] = {'level': 2, 'status': status, 'error': error_code}
-
-                for sub_error_code, sub_error_group in error_group.groupby('SUBERRORCODE'):
-                    if str(sub_error_code).upper() in ['NAN', 'N/A']: continue
-                    sub_error_row = {'KATEGORI': f"    → {sub_error_code}"}
-                    for sto in stos: sub_error_row[sto] = len(sub_error_group[sub_error_group['STO'] == sto])
-                    if sum(list(sub_error_row.values())[1:]) > 0:
-                        table_data.append(sub_error_row)
-                        row_styles[len(table_data) - 1] = {'level': 3, 'status': status}
-
-    if not table_data: return create_empty_dashboard(report_timestamp)
+            workfail = grid.xs(status, level='STATUS')
+            for error_code, error_values in workfail.groupby(level='ERRORCODE').sum().iterrows():
+                if _is_blank_code(error_code): continue
+                add_row(f"  ↳ {error_code}", error_values, {'level': 2, 'status': status, 'error': error_code})
+
+                for sub_error_code, sub_values in workfail.xs(error_code, level='ERRORCODE').sort_index().iterrows():
+                    if _is_blank_code(sub_error_code): continue
+                    if sub_values.sum() > 0:
+                        add_row(f"    → {sub_error_code}", sub_values, {'level': 3, 'status': status})
 
     display_df = pd.DataFrame(table_data, columns=['KATEGORI'] + stos).fillna(0)
     display_df['Grand Total'] = display_df[stos].sum(axis=1)
-    
-    relevant_statuses = [row['KATEGORI'] for row in table_data if row_styles.get(table_data.index(row), {}).get('level') == 1]
-    total_source_df = daily_df[daily_df['STATUS'].isin(relevant_statuses)]
-    grand_total_row = {'KATEGORI': 'Grand Total'}
-    for sto in stos: grand_total_row[sto] = len(total_source_df[total_source_df['STO'] == sto])
-    grand_total_row['Grand Total'] = len(total_source_df)
-    
+
+    # Grand Total = seluruh baris dengan status level-1 (jumlah baris status di atas)
+    sto_totals = status_totals.sum()
+    grand_total_row = {'KATEGORI': 'Grand Total', **{sto: sto_totals[sto] for sto in stos}}
+    grand_total_row['Grand Total'] = sto_totals.sum()
+
     display_df = pd.concat([display_df, pd.DataFrame([grand_total_row])], ignore_index=True)
     row_styles[len(display_df)-1] = {'level': 0, 'status': 'Total'}
+    return display_df, row_styles, stos
+
+DASHBOARD_COLORS = {
+    'COMPWORK': ('#556B2F', 'white'), 'ACOMP': ('#9ACD32', 'black'), 'ACTCOMP': ('#9ACD32', 'black'), 'VALCOMP': ('#9ACD32', 'black'),  
+    'VALSTART': ('#9ACD32', 'black'), 'WORKFAIL': ('#FF8C00', 'white'), 'KENDALA_ERROR': ('#FFDAB9', 'black'), 
+    'STARTWORK': ('#FFFACD', 'black'), 'CANCLWORK': ('#DC143C', 'white'), 'Total': ('#F5F5F5', 'black')
+}
+DASHBOARD_HEADER_COLORS = ('#404040', 'white')
+DASHBOARD_EDGE_COLOR = '#D3D3D3'
+
+def dashboard_row_colors(style: dict) -> tuple:
+    """(warna latar, warna teks) untuk satu baris tabel dashboard."""
+    status_key = style.get('status')
+    if style.get('level') == 2 and status_key == 'WORKFAIL': status_key = 'KENDALA_ERROR'
+    return DASHBOARD_COLORS.get(status_key, ('white', 'black'))
+
+def format_dashboard_cells(display_df: pd.DataFrame) -> list:
+    """Teks tiap cell (angka '1,234', kosong jika 0) diformat sekali untuk seluruh tabel."""
+    numeric = display_df.iloc[:, 1:].apply(pd.to_numeric, errors='coerce')
+    return [
+        [label] + [f"{v:,.0f}" if pd.notna(v) and v > 0 else "" for v in values]
+        for label, values in zip(display_df['KATEGORI'], numeric.itertuples(index=False))
+    ]
+
+def dashboard_title(report_timestamp: datetime, witel: str = DEFAULT_WITEL) -> str:
+    return f"REPORT DAILY ENDSTATE {witel} - {report_timestamp.strftime('%d %B %Y %H:%M:%S').upper()}"
+
+# Konstanta layout matplotlib yang tidak ada di rcParams, ditiru renderer Pillow: pad default
+# tight_layout (x font.size) & tinggi teks cell Table (1.2 x Table.FONTSIZE 10pt, sebelum
+# scale). Kesamaan hasil dengan renderer matplotlib dijaga tests/test_render.py.
+MPL_TIGHT_LAYOUT_PAD = 1.08
+MPL_TABLE_TEXT_HEIGHT_PT = 1.2 * 10
+
+def _dashboard_font(filename: str, size_pt: float, dpi: int) -> tuple:
+    """
+    Font DejaVu bawaan matplotlib: (font Pillow, FT2Font untuk posisi glyph, ascent, descent,
+    line_gap). Metrik px diambil dari tabel OS/2, sama dengan layout teks matplotlib.
+    """
+    path = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', filename)
+    ft = font_manager.ft2font.FT2Font(path)
+    ft.set_size(size_pt, dpi)
+    os2, scale = ft.get_sfnt_table('OS/2'), size_pt * dpi / 72 / ft.get_sfnt_table('head')['unitsPerEm']
+    return ImageFont.truetype(path, size_pt * dpi / 72), ft, os2['sTypoAscender'] * scale, -os2['sTypoDescender'] * scale, os2['sTypoLineGap'] * scale
+
+def _draw_text(draw, x: float, baseline: float, text: str, font: tuple, fill, center: bool = False) -> None:
+    """
+    Gambar teks per glyph di posisi layout FT2Font (seperti matplotlib). Advance hinted Pillow
+    sedikit lebih lebar sehingga teks panjang akan bergeser jika digambar sekaligus.
+    """
+    pil_font, ft = font[0], font[1]
+    offsets = ft.set_text(text, 0.0, flags=backend_agg.get_hinting_flag())[:, 0] / 64
+    if center: x -= ft.get_width_height()[0] / 64 / 2
+    if len(offsets) != len(text):
+        draw.text((x, baseline), text, font=pil_font, fill=fill, anchor='ls')
+        return
+    for ch, dx in zip(text, offsets):
+        if ch != ' ': draw.text((x + dx, baseline), ch, font=pil_font, fill=fill, anchor='ls')
+
+def create_dashboard_pillow(display_df: pd.DataFrame, row_styles: dict, stos: list, report_timestamp: datetime, status_counts: pd.Series, witel: str = DEFAULT_WITEL):
+    """
+    Render dashboard langsung dengan Pillow, memakai geometri yang sama dengan versi
+    matplotlib (figsize, gridspec [1.5, n, 5], pad tight_layout, tabel center scale(1, 2)).
+    Return None jika tabel tidak muat di axes-nya (layout matplotlib berubah) -> fallback.
+    """
+    dpi, n, rc = DASHBOARD_DPI, len(display_df), matplotlib.rcParams
+    col_fracs = [0.35] + [0.08] * (len(stos) + 1)
+    width, height = 12 * dpi, (n * 0.5 + 4.5) * dpi
+    pad = MPL_TIGHT_LAYOUT_PAD * rc['font.size'] / 72 * dpi
+    axes_w = width - 2 * pad
+    unit = (height - 4 * pad) / (n + 6.5)          # tinggi per satuan rasio gridspec
+    # Tinggi baris dihitung terhadap total tinggi axes awal gridspec 3 baris (area subplot
+    # rcParams dikurangi 2 x hspace), lalu ikut diskalakan tight_layout
+    hspace = rc['figure.subplot.hspace']
+    initial_axes_h = height * (rc['figure.subplot.top'] - rc['figure.subplot.bottom']) * 3 / (3 + 2 * hspace)
+    row_h = 2 * MPL_TABLE_TEXT_HEIGHT_PT / 72 * dpi * (height - 4 * pad) / initial_axes_h
+    table_top, table_h = pad + 1.5 * unit + pad, n * unit
+    if sum(col_fracs) > 1 or (n + 1) * row_h > table_h: return None
+
+    img = Image.new('RGB', (round(width), round(height)), 'white')
+    draw = ImageDraw.Draw(img)
+    bold = _dashboard_font('DejaVuSans-Bold.ttf', 10, dpi)
+    italic = _dashboard_font('DejaVuSans-BoldOblique.ttf', 10, dpi)
+    title_font = _dashboard_font('DejaVuSans-Bold.ttf', 16, dpi)
+    mono = _dashboard_font('DejaVuSansMono.ttf', 10, dpi)
+
+    x_text = pad + 0.05 * axes_w
+    _draw_text(draw, x_text, pad + 0.05 * 1.5 * unit + title_font[2], dashboard_title(report_timestamp, witel), title_font, '#2F3E46')
+
+    # Tabel: cell diisi lalu diberi garis tepi (berpusat di batas cell) berurutan seperti matplotlib
+    col_w = [f * axes_w for f in col_fracs]
+    xs = [pad + (axes_w - sum(col_w)) / 2]
+    for w in col_w: xs.append(xs[-1] + w)
+    edge = max(1, round(0.8 * dpi / 72))
+    header = ['KATEGORI'] + stos + ['Grand Total']
+    rows = [(header, DASHBOARD_HEADER_COLORS, bold, True)]
+    for row_idx, texts in enumerate(format_dashboard_cells(display_df)):
+        style = row_styles.get(row_idx, {})
+        rows.append((texts, dashboard_row_colors(style), italic if style.get('level') == 3 else bold, False))
+
+    y = table_top + (table_h - (n + 1) * row_h) / 2
+    for texts, (bg_color, text_color), font, is_header in rows:
+        baseline = y + row_h / 2 + (font[2] - font[3]) / 2
+        for col, text in enumerate(texts):
+            x0, x1 = xs[col], xs[col + 1]
+            draw.rectangle([x0, y, x1, y + row_h], fill=bg_color)
+            draw.rectangle([x0 - edge / 2, y - edge / 2, x1 + edge / 2, y + row_h + edge / 2], outline=DASHBOARD_EDGE_COLOR, width=edge)
+            if not text: continue
+            if col == 0 and not is_header:
+                _draw_text(draw, x0 + 0.05 * (x1 - x0), baseline, text, font, text_color)
+            else:
+                _draw_text(draw, (x0 + x1) / 2, baseline, text, font, text_color, center=True)
+        y += row_h
+
+    _, _, mono_asc, mono_desc, mono_gap = mono
+    y = table_top + table_h + pad + 0.1 * 5 * unit + mono_asc + mono_gap / 2
+    for line in create_summary_text(status_counts).split("\n"):
+        _draw_text(draw, x_text, y, line, mono, 'black')
+        y += mono_asc + mono_desc + mono_gap
+
+    image_buffer = io.BytesIO()
+    img.save(image_buffer, format='png'); image_buffer.seek(0)
+    return image_buffer
+
+def create_integrated_dashboard(daily_df: pd.DataFrame, report_timestamp: datetime, status_counts: pd.Series, counts: pd.Series = None, witel: str = DEFAULT_WITEL) -> io.BytesIO:
+    # --- 1. Persiapan Data ---
+    if counts is None: counts = aggregate_dashboard_counts(daily_df)
+    table = build_dashboard_table(counts)
+    if table is None: return create_empty_dashboard(report_timestamp, witel)
+    display_df, row_styles, stos = table
+
+    if DASHBOARD_RENDERER == 'pillow' and HAS_PIL:
+        try:
+            image_buffer = create_dashboard_pillow(display_df, row_styles, stos, report_timestamp, status_counts, witel)
+        except Exception as e:
+            # API font/hinting matplotlib berubah: tetap kirim dashboard lewat renderer matplotlib
+            logger.warning(f"⚠️ Renderer Pillow gagal ({e}), fallback ke matplotlib")
+            image_buffer = None
+        if image_buffer is not None: return image_buffer
 
     # --- 2. Visualisasi (Fixed Layout & Sizing) ---
     num_rows = len(display_df)
@@ -308,7 +747,7 @@ def create_integrated_dashboard(daily_df: pd.DataFrame, report_timestamp: dateti
     ax_table = fig.add_subplot(gs[1]); ax_table.axis('off')
     ax_text = fig.add_subplot(gs[2]); ax_text.axis('off')
     
-    ax_title.text(0.05, 0.95, f"REPORT DAILY ENDSTATE JAKPUS - {report_timestamp.strftime('%d %B %Y %H:%M:%S').upper()}", 
+    ax_title.text(0.05, 0.95, dashboard_title(report_timestamp, witel), 
                   ha='left', va='top', fontsize=16, weight='bold', color='#2F3E46')
     
     col_widths = [0.35] + [0.08] * (len(stos) + 1)
@@ -316,33 +755,21 @@ def create_integrated_dashboard(daily_df: pd.DataFrame, report_timestamp: dateti
                            loc='center', cellLoc='center', colWidths=col_widths)
     table.auto_set_font_size(False); table.set_fontsize(10); table.scale(1, 2)
 
-    color_map = {
-        'COMPWORK': ('#556B2F', 'white'), 'ACOMP': ('#9ACD32', 'black'), 'ACTCOMP': ('#9ACD32', 'black'), 'VALCOMP': ('#9ACD32', 'black'),  
-        'VALSTART': ('#9ACD32', 'black'), 'WORKFAIL': ('#FF8C00', 'white'), 'KENDALA_ERROR': ('#FFDAB9', 'black'), 
-        'STARTWORK': ('#FFFACD', 'black'), 'CANCLWORK': ('#DC143C', 'white'), 'Total': ('#F5F5F5', 'black')
-    }
-    
+    cell_text = format_dashboard_cells(display_df)
     for (row_idx, col_idx), cell in table.get_celld().items():
-        cell.set_edgecolor('#D3D3D3'); cell.set_linewidth(0.8)
+        cell.set_edgecolor(DASHBOARD_EDGE_COLOR); cell.set_linewidth(0.8)
         if row_idx == 0:
-            cell.set_facecolor('#404040'); cell.set_text_props(color='white', weight='bold')
+            cell.set_facecolor(DASHBOARD_HEADER_COLORS[0]); cell.set_text_props(color=DASHBOARD_HEADER_COLORS[1], weight='bold')
             continue
         
-        style = row_styles.get(row_idx - 1, {}); data_row = display_df.iloc[row_idx - 1]
-        
-        bg_color, text_color = 'white', 'black'
-        status_key = style.get('status')
-        if style.get('level') == 2 and status_key == 'WORKFAIL': status_key = 'KENDALA_ERROR'
-        if status_key in color_map: bg_color, text_color = color_map[status_key]
-        
+        style = row_styles.get(row_idx - 1, {})
+        bg_color, text_color = dashboard_row_colors(style)
         cell.set_facecolor(bg_color); cell.get_text().set_color(text_color)
 
+        cell.get_text().set_text(cell_text[row_idx - 1][col_idx])
         if col_idx > 0:
-            numeric_value = pd.to_numeric(data_row.iloc[col_idx], errors='coerce')
-            cell.get_text().set_text(f"{numeric_value:,.0f}" if pd.notna(numeric_value) and numeric_value > 0 else "")
             cell.set_text_props(ha='center', va='center', weight='bold')
         else:
-            cell.get_text().set_text(data_row.iloc[col_idx])
             cell.set_text_props(ha='left', va='center', weight='bold'); cell.PAD = 0.05
         
         if style.get('level') == 3: cell.get_text().set_style('italic')
@@ -351,160 +778,1659 @@ def create_integrated_dashboard(daily_df: pd.DataFrame, report_timestamp: dateti
     
     plt.tight_layout()
     image_buffer = io.BytesIO()
-    plt.savefig(image_buffer, format='png', dpi=200); image_buffer.seek(0); plt.close(fig)
+    plt.savefig(image_buffer, format='png', dpi=DASHBOARD_DPI); image_buffer.seek(0); plt.close(fig)
     return image_buffer
 
-def create_empty_dashboard(report_timestamp: datetime) -> io.BytesIO:
+def create_empty_dashboard(report_timestamp: datetime, witel: str = DEFAULT_WITEL) -> io.BytesIO:
     fig, ax = plt.subplots(figsize=(10, 3))
     ax.axis('off')
-    fig.suptitle(f"NO DATA - {report_timestamp.strftime('%d %b %Y')}", fontsize=16)
+    fig.suptitle(f"NO DATA {witel} - {report_timestamp.strftime('%d %b %Y')}", fontsize=16)
+    plt.tight_layout()
+    image_buffer = io.BytesIO()
+    plt.savefig(image_buffer, format='png', dpi=150); image_buffer.seek(0); plt.close(fig)
+    return image_buffer
+
+# Metrik trend: jumlah baris per STATUS pada hari STATUSDATE (sama dengan ringkasan dashboard)
+TREND_METRICS = {'PS': ['COMPWORK'], 'ACOM': ACOM_STATUSES, 'PI': ['STARTWORK'], 'KENDALA': ['WORKFAIL']}
+
+def create_trend_chart(table: pd.DataFrame, label: str, intraday: bool = False, witel: str = DEFAULT_WITEL) -> io.BytesIO:
+    """Grafik 2x2 (PS, ACOM, PI, KENDALA): satu garis per STO + total, dari hasil load_trend."""
+    periods = table.index.get_level_values('PERIODE').unique().sort_values()
+    stos = sorted(table.index.get_level_values('STO').unique())
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8), sharex=True)
+    fig.suptitle(f"TREND {label.upper()} - {witel}", fontsize=16, weight='bold', color='#2F3E46')
+
+    for ax, metric in zip(axes.flat, TREND_METRICS):
+        grid = table[metric].unstack('STO', fill_value=0).reindex(periods, fill_value=0)
+        for sto in stos:
+            ax.plot(grid.index, grid[sto], marker='o', linewidth=1.5, markersize=3, label=sto)
+        ax.plot(grid.index, grid.sum(axis=1), color='#404040', linestyle='--', linewidth=1.5, label='TOTAL')
+        ax.set_title(metric, fontsize=12, weight='bold')
+        ax.grid(True, color='#D3D3D3', linewidth=0.6)
+        ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%H:%M' if intraday else '%d/%m'))
+    axes.flat[0].legend(fontsize=8, ncol=2)
+    fig.autofmt_xdate()
+
     plt.tight_layout()
     image_buffer = io.BytesIO()
     plt.savefig(image_buffer, format='png', dpi=150); image_buffer.seek(0); plt.close(fig)
     return image_buffer
 
 # ==========================================
-# 4. LOGIKA INTEGRASI KPRO (Google Sheet)
+# 5. LOGIKA INTEGRASI KPRO (Google Sheet)
 # ==========================================
-async def process_kpro_logic(raw_df):
+def collect_wonum_details(df: pd.DataFrame, today) -> dict:
+    """Daftar WONUM hari ini per STO -> STATUS (hanya status micro)."""
+    details = {sto: {} for sto in WONUM_DETAIL_STOS}
+    if 'WONUM' not in df.columns: return details
+    normalize_date_columns(df)
+    mask = (
+        (df['STATUSDATE'].dt.normalize() == pd.Timestamp(today))
+        & df['STO'].isin(WONUM_DETAIL_STOS) & df['STATUS'].isin(MICRO_STATUSES)
+    )
+    grouped = {key: wonums.tolist() for key, wonums in df.loc[mask].groupby(['STO', 'STATUS'], observed=True)['WONUM']}
+    for sto in details:
+        for status in MICRO_STATUSES:
+            if (sto, status) in grouped: details[sto][status] = grouped[(sto, status)]
+    return details
+
+# --- Session Google Sheets jangka panjang (dibuka di lifespan) ---
+# Kredensial (+ token OAuth) & koneksi httpx dipakai ulang antar upload. Semua request
+# async: request lambat ke Google tidak menahan update Telegram lain.
+_google_credentials = None
+_sheets_http = None
+_sheets_semaphore = None
+
+def sheets_login_ok() -> bool:
+    global _google_credentials
+    if SHEETS_ACCESS_TOKEN: return True
+    if _google_credentials is None: _google_credentials = get_google_credentials()
+    return _google_credentials is not None
+
+async def get_sheets_access_token() -> str:
+    """Bearer token; refresh (HTTP blocking milik google-auth) dijalankan di thread."""
+    if SHEETS_ACCESS_TOKEN: return SHEETS_ACCESS_TOKEN
+    if not sheets_login_ok(): raise RuntimeError("Gagal Login Google")
+    if not _google_credentials.valid:
+        await asyncio.to_thread(_google_credentials.refresh, google_auth_requests.Request())
+    return _google_credentials.token
+
+def get_sheets_http() -> httpx.AsyncClient:
+    global _sheets_http, _sheets_semaphore
+    if _sheets_http is None:
+        _sheets_http = httpx.AsyncClient(base_url=SHEETS_API_BASE, timeout=SHEETS_REQUEST_TIMEOUT)
+        _sheets_semaphore = asyncio.Semaphore(SHEETS_MAX_CONCURRENCY)
+    return _sheets_http
+
+def invalidate_sheets_session() -> None:
+    """Buang kredensial/token (mis. setelah 401) agar request berikutnya login ulang."""
+    global _google_credentials
+    _google_credentials = None
+
+async def open_sheets_session() -> None:
+    """Login & buka koneksi Sheets lebih awal (dipanggil dari lifespan)."""
+    if not ENABLE_GOOGLE_SHEETS: return
+    # Modul google-auth lazy: jangan di-exec bersamaan dengan thread preload
+    await ensure_heavy_modules()
+    try:
+        get_sheets_http()
+        await get_sheets_access_token()
+        logger.info("✅ Session Google Sheets siap.")
+    except Exception as e:
+        invalidate_sheets_session()
+        logger.warning(f"⚠️ Gagal membuka session Google Sheets: {e}")
+
+async def close_sheets_session() -> None:
+    global _sheets_http
+    if _sheets_http is not None:
+        await _sheets_http.aclose()
+        _sheets_http = None
+
+def rowcol_to_a1(row: int, col: int) -> str:
+    """(9, 24) -> 'X9'"""
+    label = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        label = chr(65 + rem) + label
+    return f"{label}{row}"
+
+async def batch_write_cells(sheet_id: str, cells: list) -> dict:
+    """
+    Tulis semua cell (nama_sheet, row, col, value) dalam SATU values:batchUpdate.
+    429/5xx/timeout dicoba ulang dengan exponential backoff (+ jitter, hormati Retry-After),
+    401 memaksa login ulang. Konkurensi dibatasi SHEETS_MAX_CONCURRENCY.
+    """
+    body = {
+        'valueInputOption': 'USER_ENTERED',
+        'data': [{'range': f"'{sheet_name}'!{rowcol_to_a1(row, col)}", 'values': [[value]]} for sheet_name, row, col, value in cells],
+    }
+    http = get_sheets_http()
+    async with _sheets_semaphore:
+        for attempt in range(SHEETS_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                token = await get_sheets_access_token()
+                resp = await http.post(f"/spreadsheets/{sheet_id}/values:batchUpdate", json=body, headers={'Authorization': f"Bearer {token}"})
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__} {e}".strip()
+            else:
+                if resp.status_code < 300: return resp.json()
+                if resp.status_code == 401:
+                    invalidate_sheets_session()
+                elif resp.status_code != 429 and resp.status_code < 500:
+                    raise RuntimeError(f"Sheets API {resp.status_code}: {resp.text[:200]}")
+                error, retry_after = f"HTTP {resp.status_code}", resp.headers.get('Retry-After')
+
+            if attempt == SHEETS_MAX_RETRIES:
+                raise RuntimeError(f"Sheets API gagal setelah {attempt + 1} percobaan ({error})")
+            # Retry-After dari server tetap dibatasi SHEETS_BACKOFF_MAX agar job tidak tertahan lama
+            if retry_after and retry_after.isdigit(): delay = min(float(retry_after), SHEETS_BACKOFF_MAX)
+            else: delay = min(SHEETS_BACKOFF_MAX, SHEETS_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"⚠️ Sheets API {error}, coba lagi dalam {delay:.1f}s ({attempt + 1}/{SHEETS_MAX_RETRIES})")
+            await asyncio.sleep(delay)
+
+# --- Writer diff + coalescing ---
+# (timestamp report, nilai) terakhir yang sukses ditulis per (sheet_id, nama_sheet, row, col);
+# hanya cell yang berubah dikirim dan export yang lebih lama tidak menimpa yang lebih baru.
+# Flush langsung jika sheet sedang sepi; upload dalam SHEETS_COALESCE_SECONDS setelah flush
+# terakhir (atau selama flush berjalan) digabung jadi satu flush berikutnya.
+_last_written = {}
+_last_full_write = {}
+_last_flush = {}
+_pending_cells = {}
+_pending_flush = {}
+_pending_uploads = {}
+_flush_locks = {}
+
+async def submit_sheet_cells(sheet_id: str, cells: list, report_timestamp: datetime = None) -> tuple:
+    """
+    Antrekan cell (nama_sheet, row, col, value) dari report pada report_timestamp (default:
+    sekarang). Semua upload dalam satu jendela menunggu flush yang sama.
+    Return (cell_ditulis, cell_dilewati).
+    """
+    if report_timestamp is None: report_timestamp = datetime.now(WIB_TZ)
+    pending = _pending_cells.setdefault(sheet_id, {})
+    for sheet_name, row, col, value in cells:
+        key = (sheet_name, row, col)
+        # Report terbaru menang, bukan yang paling akhir selesai diproses
+        if key not in pending or report_timestamp >= pending[key][0]:
+            pending[key] = (report_timestamp, value)
+    _pending_uploads[sheet_id] = _pending_uploads.get(sheet_id, 0) + 1
+    if sheet_id not in _pending_flush:
+        _pending_flush[sheet_id] = asyncio.create_task(_flush_sheet_cells(sheet_id))
+    return await asyncio.shield(_pending_flush[sheet_id])
+
+async def _flush_sheet_cells(sheet_id: str) -> tuple:
+    async with _flush_locks.setdefault(sheet_id, asyncio.Lock()):
+        # Tunggu sisa jendela sejak flush terakhir (0 jika sheet sepi), lalu ambil state
+        # terbaru; upload berikutnya membentuk jendela baru
+        wait = _last_flush.get(sheet_id, float('-inf')) + SHEETS_COALESCE_SECONDS - time.monotonic()
+        if wait > 0: await asyncio.sleep(wait)
+        pending = _pending_cells.pop(sheet_id, {})
+        uploads = _pending_uploads.pop(sheet_id, 0)
+        del _pending_flush[sheet_id]
+
+        last = _last_written.setdefault(sheet_id, {})
+        full_refresh = time.monotonic() - _last_full_write.get(sheet_id, float('-inf')) > SHEETS_FULL_REFRESH_MINUTES * 60
+        fresh = {key: entry for key, entry in pending.items() if key not in last or entry[0] >= last[key][0]}
+        changed = {key: entry for key, entry in fresh.items() if full_refresh or key not in last or last[key][1] != entry[1]}
+        stale, skipped = len(pending) - len(fresh), len(fresh) - len(changed)
+        try:
+            if changed:
+                await batch_write_cells(sheet_id, [(*key, value) for key, (_, value) in changed.items()])
+        except Exception:
+            # State sheet tidak pasti -> tulis penuh pada flush berikutnya
+            _last_full_write.pop(sheet_id, None)
+            raise
+        finally:
+            _last_flush[sheet_id] = time.monotonic()
+        last.update(changed)
+        if full_refresh: _last_full_write[sheet_id] = time.monotonic()
+    logger.info(f"📝 Sheet {sheet_id[:8]}: {len(changed)} cell ditulis, {skipped} dilewati (tidak berubah), {stale} dilewati (report lebih lama), {uploads} upload digabung")
+    return len(changed), skipped + stale
+
+def build_kpro_cells(metrics: pd.DataFrame, region: dict = None) -> list:
+    """Semua cell checkpoint + micro dari tabel metrik: list (nama_sheet, row, col, value)."""
+    region = region or REGIONS[0]
+    cells = []
+    checkpoint = metrics.reindex(list(region['sto_row_map']), fill_value=0)
+    for sto, row in region['sto_row_map'].items():
+        for col_name in KPRO_CHECKPOINT_METRICS:
+            if col_name in region['column_index_map']:
+                cells.append((region['target_sheet_name'], row, region['column_index_map'][col_name], int(checkpoint.at[sto, col_name])))
+
+    micro = metrics.reindex(list(region['micro_sto_row_map']), fill_value=0)
+    for sto, row in region['micro_sto_row_map'].items():
+        for status, col_idx in region['micro_column_index_map'].items():
+            cells.append((region['micro_sheet_name'], row, col_idx, int(micro.at[sto, status])))
+    return cells
+
+async def process_kpro_logic(raw_df, metrics: pd.DataFrame = None, today=None, wonum_details: dict = None, region: dict = None, report_timestamp: datetime = None):
+    """
+    Update sheet KPRO satu region (default: region pertama). raw_df boleh None jika
+    metrics & wonum_details sudah dihitung sebelumnya (mis. oleh analyze_upload di process pool).
+    report_timestamp menentukan urutan tulis antar upload (default: sekarang).
+    """
+    region = region or REGIONS[0]
     msg = []
-    wonum_details = {}
 
     if not ENABLE_GOOGLE_SHEETS: return False, "", {}
     
-    client = get_gspread_client()
-    if not client: return False, "⚠️ Gagal Login Google. Cek Env Var 'GOOGLE_PRIVATE_KEY'.", {}
+    if not sheets_login_ok(): return False, "⚠️ Gagal Login Google. Cek Env Var 'GOOGLE_PRIVATE_KEY'.", {}
 
-    wib_tz = timezone(timedelta(hours=7)); today = datetime.now(wib_tz).date()
-    yesterday = today - timedelta(days=1); seven_days = today - timedelta(days=6)
-    
-    raw_df['DATECREATED'] = pd.to_datetime(raw_df['DATECREATED'], errors='coerce')
-    raw_df['STATUSDATE'] = pd.to_datetime(raw_df['STATUSDATE'], errors='coerce')
-    raw_df['TGL_MANJA'] = pd.to_datetime(raw_df['TGL_MANJA'], errors='coerce')
+    if today is None: today = datetime.now(WIB_TZ).date()
+    if metrics is None: metrics = compute_metrics(raw_df, today)
     
     try:
-        sh = client.open_by_key(KPRO_SHEET_ID)
-        ws = sh.worksheet(KPRO_TARGET_SHEET_NAME)
-        updates = []
-        for sto, row in KPRO_STO_ROW_MAP.items():
-            sto_df = raw_df[raw_df['STO'] == sto]
-            is_today = sto_df['STATUSDATE'].dt.date == today
-            is_created_today = sto_df['DATECREATED'].dt.date == today
-            
-            val_map = {
-                'RE HI': len(sto_df[is_created_today]),
-                'PS ENDSTATE': len(sto_df[is_today & (sto_df['STATUS'] == 'COMPWORK')]),
-                'VALSTART ENDSATATE': len(sto_df[is_today & sto_df['STATUS'].isin(['INSTCOMP','ACTCOMP','VALCOMP','VALSTART'])]),
-                'EST PS H-1': len(sto_df[(sto_df['STATUSDATE'].dt.date == yesterday) & (sto_df['STATUS'] == 'COMPWORK')]),
-                'EST PS W-1': len(sto_df[(sto_df['STATUSDATE'].dt.date >= seven_days) & (sto_df['STATUSDATE'].dt.date <= today) & (sto_df['STATUS'] == 'COMPWORK')]),
-                'MANJA HI': len(sto_df[(sto_df['STATUS']=='STARTWORK') & (sto_df['TGL_MANJA'].dt.date == today)]),
-                'LEWAT MANJA': len(sto_df[(sto_df['STATUS']=='STARTWORK') & (sto_df['TGL_MANJA'].dt.date < today)]),
-                'KENDALA PELANGGAN': len(sto_df[(sto_df['STATUS']=='WORKFAIL') & (sto_df['ERRORCODE']=='KENDALA PELANGGAN')]),
-                'KENDALA JARINGAN': len(sto_df[(sto_df['STATUS']=='WORKFAIL') & (sto_df['ERRORCODE']=='KENDALA TEKNIK')])
-            }
-            for col_name, val in val_map.items():
-                if col_name in KPRO_COLUMN_INDEX_MAP:
-                    updates.append(gspread.Cell(row, KPRO_COLUMN_INDEX_MAP[col_name], int(val)))
-        if updates: ws.update_cells(updates, value_input_option='USER_ENTERED')
+        # Checkpoint (REPORT PS INDIHOME) + Micro (UPDATE PER 2JAM): hanya cell yang berubah, satu request
+        await submit_sheet_cells(region['sheet_id'], build_kpro_cells(metrics, region), report_timestamp)
         msg.append("✅ Checkpoint Updated.")
-
-        ws_micro = sh.worksheet(KPRO_MICRO_UPDATE_SHEET_NAME)
-        micro_updates = []
-        today_df = raw_df[raw_df['STATUSDATE'].dt.date == today]
-        
-        for sto, row in KPRO_MICRO_STO_ROW_MAP.items():
-            sto_data = today_df[today_df['STO'] == sto]
-            wonum_details[sto] = {}
-            total_wo = 0
-            for status, col_idx in KPRO_MICRO_COLUMN_INDEX_MAP.items():
-                if status == 'TOTAL WO': continue
-                subset = sto_data[sto_data['STATUS'] == status]
-                count = len(subset); total_wo += count
-                micro_updates.append(gspread.Cell(row, col_idx, count))
-                if count > 0: wonum_details[sto][status] = subset['WONUM'].tolist()
-            micro_updates.append(gspread.Cell(row, KPRO_MICRO_COLUMN_INDEX_MAP['TOTAL WO'], total_wo))
-            
-        if micro_updates: ws_micro.update_cells(micro_updates, value_input_option='USER_ENTERED')
         msg.append("✅ Micro Update Updated.")
+        if wonum_details is None: wonum_details = collect_wonum_details(raw_df, today)
 
     except Exception as e:
         msg.append(f"❌ Error Koneksi Sheet: {str(e)}")
 
-    return True, "\n".join(msg), wonum_details
+    return True, "\n".join(msg), wonum_details or {}
 
 # ==========================================
-# 5. HANDLER
+# 6. PIPELINE UPLOAD (PROCESS POOL)
+# ==========================================
+_process_pool = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Process pool global (dibuat saat pertama dipakai). Spawn agar aman dari thread event loop."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=PROCESS_POOL_MAX_TASKS,
+        )
+        logger.info(f"⚙️ Process pool aktif ({PROCESS_POOL_WORKERS} worker)")
+    return _process_pool
+
+def preload_heavy_modules() -> None:
+    """Exec semua modul lazy (dipanggil di thread / worker pool, bukan di event loop)."""
+    for name in list(_lazy_specs):
+        getattr(sys.modules[name], '__name__')
+
+async def warm_process_pool(workers: int = PROCESS_POOL_WARM_WORKERS) -> None:
+    """
+    Spawn `workers` worker & preload modul berat di sana agar upload pertama tidak menunggu.
+    Worker lain baru di-spawn saat dibutuhkan (pool spawn membuat worker satu per satu).
+    """
+    if workers <= 0: return
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_in_process_pool(preload_heavy_modules) for _ in range(workers)))
+    logger.info(f"🔥 {workers}/{PROCESS_POOL_WORKERS} worker pool siap dalam {time.perf_counter() - t0:.2f}s")
+
+def retire_process_pool() -> None:
+    """Lepas pool aktif tanpa membatalkan job yang masih jalan; job berikutnya dapat worker baru."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=False)
+        _process_pool = None
+        logger.info("♻️ Process pool dipensiunkan (worker melewati budget memori)")
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+async def run_in_process_pool(func, *args):
+    """Jalankan stage CPU-heavy di process pool tanpa memblokir event loop."""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_process_pool(), func, *args)
+    except BrokenProcessPool:
+        # Worker mati (mis. OOM) -> buang pool agar job berikutnya dapat pool baru
+        shutdown_process_pool()
+        raise
+
+def summarize_dataframe(df: pd.DataFrame, report_timestamp: datetime) -> dict:
+    """
+    Ringkas DataFrame upload menjadi agregat kecil yang dibutuhkan semua laporan:
+    tabel metrik, hitungan dashboard hari terakhir, dan daftar WONUM micro.
+    """
+    normalize_date_columns(df)
+    today = report_timestamp.date()
+    result = {
+        'rows': len(df),
+        'metrics': compute_metrics(df, today),
+        'wonum_details': collect_wonum_details(df, today),
+        'latest': None,
+        'dashboard_counts': None,
+    }
+    status_date = df['STATUSDATE']
+    if status_date.notna().any():
+        latest = status_date.max().date()
+        # Slice harian cukup 4 kolom kunci kategorikal (bukan copy DataFrame penuh)
+        is_latest = (status_date.dt.normalize() == pd.Timestamp(latest)).to_numpy()
+        result['latest'] = latest
+        result['dashboard_counts'] = aggregate_dashboard_counts(df.loc[is_latest, DASHBOARD_KEYS])
+    return result
+
+def partition_result(result: dict) -> list:
+    """
+    Pecah hasil satu upload per region: list (region, result_region). Cukup memfilter agregat
+    per STO (metrik, hitungan dashboard, WONUM), export tidak diparsing ulang per witel.
+    """
+    parts = []
+    for region in REGIONS:
+        if region['stos'] is None:
+            parts.append((region, result)); continue
+        stos = region['stos']
+        counts = result['dashboard_counts']
+        parts.append((region, {
+            **result,
+            'metrics': result['metrics'][result['metrics'].index.isin(stos)],
+            'dashboard_counts': None if counts is None else counts[counts.index.get_level_values('STO').isin(stos)],
+            'wonum_details': {sto: v for sto, v in result['wonum_details'].items() if sto in stos},
+        }))
+    return parts
+
+def to_normalized_category(s: pd.Series) -> pd.Series:
+    """Upper + strip dikerjakan pada nilai unik saja; hasil dtype category (kategori terurut)."""
+    cat = s.astype('category')
+    normalized = cat.cat.categories.astype(str).str.upper().str.strip()
+    uniques = pd.Index(normalized).unique().sort_values()
+    remap = uniques.get_indexer(normalized)
+    old_codes = cat.cat.codes.to_numpy()
+    codes = np.where(old_codes >= 0, remap[old_codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=s.index, name=s.name)
+
+def reset_peak_rss() -> None:
+    """
+    Reset peak RSS proses ini (Linux: '5' ke /proc/self/clear_refs) di awal stage worker.
+    Worker pool dipakai ulang, jadi tanpa reset peak = high-water mark seumur worker.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh: fh.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    """Peak RSS sejak reset_peak_rss terakhir (VmHWM); fallback ru_maxrss (sejak proses start)."""
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def check_memory_budget(rows: int) -> bool:
+    """Bandingkan peak RSS stage dengan MEMORY_BUDGET_MB (jalur cache & CSV saja)."""
+    peak = peak_rss_mb()
+    within = peak <= MEMORY_BUDGET_MB
+    if not within:
+        logger.warning(f"⚠️ Peak memori {peak:.0f} MB melebihi budget {MEMORY_BUDGET_MB} MB ({rows} baris)")
+    return within
+
+def load_export(file_bytes: bytes) -> tuple:
+    """
+    Baca export BIMA: hanya REPORT_COLUMNS, dtype teks eksplisit, engine calamine jika
+    terpasang. Jika jalur cepat gagal, fallback ke read_excel standar.
+    Return (df, timings) dengan durasi tiap stage dalam detik.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    try:
+        df = pd.read_excel(io.BytesIO(file_bytes), engine=EXCEL_ENGINE, usecols=lambda c: c in REPORT_COLUMNS, dtype=EXPORT_TEXT_DTYPES)
+        timings['read_excel'] = time.perf_counter() - t0
+    except Exception as e:
+        logger.warning(f"⚠️ Fast ingestion ({EXCEL_ENGINE or 'default'}) gagal: {e}. Fallback ke read_excel standar.")
+        t0 = time.perf_counter()
+        df = pd.read_excel(io.BytesIO(file_bytes))
+        df = df[[c for c in df.columns if c in REPORT_COLUMNS]]
+        timings['read_excel_fallback'] = time.perf_counter() - t0
+
+    normalize_export(df, timings)
+    return df, timings
+
+def normalize_export(df: pd.DataFrame, timings: dict) -> pd.DataFrame:
+    """Normalisasi kolom teks (kategorikal upper/strip) & tanggal; durasi ditambahkan ke timings."""
+    t0 = time.perf_counter()
+    for c in NORMALIZED_COLUMNS: 
+        if c in df.columns: df[c] = to_normalized_category(df[c])
+    timings['normalize'] = timings.get('normalize', 0.0) + time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    normalize_date_columns(df)
+    timings['parse_dates'] = timings.get('parse_dates', 0.0) + time.perf_counter() - t0
+    return df
+
+# --- Cache upload di disk ---
+def upload_cache_path(content_hash: str) -> str:
+    ext = 'parquet' if HAS_PYARROW else 'pkl'
+    return os.path.join(UPLOAD_CACHE_DIR, f"{content_hash}-v{UPLOAD_CACHE_VERSION}.{ext}")
+
+def _upload_cache_index_path() -> str:
+    return os.path.join(UPLOAD_CACHE_DIR, "index.json")
+
+def _load_upload_cache_index() -> dict:
+    try:
+        with open(_upload_cache_index_path()) as fh: return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def upload_cache_lookup(file_unique_id: str):
+    """Path cache untuk file Telegram ini (tanpa download), atau None jika belum ada."""
+    content_hash = _load_upload_cache_index().get(file_unique_id)
+    if not content_hash: return None
+    path = upload_cache_path(content_hash)
+    try:
+        os.utime(path)  # tandai baru dipakai (LRU berdasar mtime)
+    except FileNotFoundError:
+        return None
+    return path
+
+def upload_cache_register(file_unique_id: str, content_hash: str) -> None:
+    """Catat file_unique_id -> hash, lalu buang file paling lama jika melebihi batas ukuran."""
+    os.makedirs(UPLOAD_CACHE_DIR, exist_ok=True)
+    index = _load_upload_cache_index()
+    index[file_unique_id] = content_hash
+
+    entries = []
+    for name in os.listdir(UPLOAD_CACHE_DIR):
+        path = os.path.join(UPLOAD_CACHE_DIR, name)
+        if name != "index.json" and os.path.isfile(path):
+            st = os.stat(path); entries.append((st.st_mtime, st.st_size, path))
+    total, budget = sum(e[1] for e in entries), UPLOAD_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= budget: break
+        os.remove(path); total -= size
+        logger.info(f"🧹 Cache upload evict: {os.path.basename(path)}")
+
+    live = {os.path.join(UPLOAD_CACHE_DIR, name) for name in os.listdir(UPLOAD_CACHE_DIR)}
+    index = {k: h for k, h in index.items() if upload_cache_path(h) in live}
+    tmp = _upload_cache_index_path() + ".tmp"
+    with open(tmp, "w") as fh: json.dump(index, fh)
+    os.replace(tmp, _upload_cache_index_path())
+
+def write_cached_frame(df: pd.DataFrame, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if HAS_PYARROW: df.to_parquet(tmp, index=False)
+    else: df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+def read_cached_frame(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+
+# --- Store state per WONUM (SQLite) ---
+# Tanggal disimpan sebagai epoch detik (waktu lokal naive) agar perbandingan range memakai index
+_WONUM_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wonum (
+    WONUM TEXT PRIMARY KEY,
+    STO TEXT, STATUS TEXT, ERRORCODE TEXT, SUBERRORCODE TEXT,
+    STATUSDATE INTEGER, DATECREATED INTEGER, TGL_MANJA INTEGER,
+    UPDATED_AT INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wonum_statusdate ON wonum (STATUSDATE);
+CREATE INDEX IF NOT EXISTS wonum_datecreated ON wonum (DATECREATED);
+CREATE INDEX IF NOT EXISTS wonum_status ON wonum (STATUS);
+CREATE INDEX IF NOT EXISTS wonum_updated_at ON wonum (UPDATED_AT);
+"""
+_WONUM_STORE_FIELDS = ['WONUM'] + NORMALIZED_COLUMNS + DATE_COLUMNS
+# Upload lebih lama (STATUSDATE lebih kecil) tidak menimpa state yang lebih baru
+_WONUM_STORE_UPSERT = f"""
+INSERT INTO wonum ({', '.join(_WONUM_STORE_FIELDS)}, UPDATED_AT)
+VALUES ({', '.join('?' * (len(_WONUM_STORE_FIELDS) + 1))})
+ON CONFLICT (WONUM) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in _WONUM_STORE_FIELDS[1:])}, UPDATED_AT = excluded.UPDATED_AT
+WHERE wonum.STATUSDATE IS NULL OR excluded.STATUSDATE >= wonum.STATUSDATE
+"""
+# Metrik tanpa filter tanggal (PI/Manja dari STARTWORK, Kendala dari WORKFAIL)
+_WONUM_STORE_UNDATED_STATUSES = ['STARTWORK', 'WORKFAIL']
+
+def _to_epoch(ts) -> int:
+    return int((pd.Timestamp(ts) - pd.Timestamp(0)) // pd.Timedelta(seconds=1))
+
+def _sql_values(s: pd.Series) -> np.ndarray:
+    """Kolom -> array object berisi tipe Python (None untuk kosong) untuk binding sqlite3."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        values = s.to_numpy(dtype='datetime64[s]').astype('int64').astype(object)
+    else:
+        values = s.astype(object).to_numpy(copy=True)
+    values[s.isna().to_numpy()] = None
+    return values
+
+def open_wonum_store() -> sqlite3.Connection:
+    """Koneksi ke store WONUM (dibuat jika belum ada). WAL: pembaca tidak diblok penulis."""
+    os.makedirs(os.path.dirname(WONUM_STORE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(WONUM_STORE_PATH, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_WONUM_STORE_SCHEMA)
+    return conn
+
+def wonum_store_upsert(conn: sqlite3.Connection, df: pd.DataFrame, report_timestamp: datetime) -> int:
+    """Upsert state terbaru tiap WONUM dari frame upload (ter-normalisasi). Return jumlah baris."""
+    if 'WONUM' not in df.columns:
+        raise ValueError("Kolom WONUM tidak ada, upload tidak bisa digabung ke store WONUM")
+    df = df[df['WONUM'].notna()]
+    columns = [_sql_values(df[c]) if c in df.columns else [None] * len(df) for c in _WONUM_STORE_FIELDS]
+    updated_at = [_to_epoch(report_timestamp.replace(tzinfo=None))] * len(df)
+    with conn:
+        conn.executemany(_WONUM_STORE_UPSERT, zip(*columns, updated_at))
+    return len(df)
+
+def wonum_store_prune(conn: sqlite3.Connection, report_timestamp: datetime) -> int:
+    cutoff = pd.Timestamp(report_timestamp.replace(tzinfo=None)) - pd.Timedelta(days=WONUM_STORE_RETENTION_DAYS)
+    with conn:
+        removed = conn.execute("DELETE FROM wonum WHERE UPDATED_AT < ?", (_to_epoch(cutoff),)).rowcount
+    if removed: logger.info(f"🧹 Store WONUM: {removed} WONUM lama dibuang")
+    return removed
+
+def _wonum_store_metric_cases(today) -> tuple:
+    """
+    (kolom, kondisi SQL) per kolom count_metrics + parameter bernama untuk hari `today`.
+    Harus sama dengan mask di count_metrics (dijaga tests/test_store.py).
+    """
+    today = pd.Timestamp(today)
+    month_start = today.replace(day=1)
+    params = {
+        'today': _to_epoch(today), 'tomorrow': _to_epoch(today + pd.Timedelta(days=1)),
+        'yesterday': _to_epoch(today - pd.Timedelta(days=1)), 'seven_days': _to_epoch(today - pd.Timedelta(days=6)),
+        'month_start': _to_epoch(month_start), 'next_month': _to_epoch(month_start + pd.offsets.MonthBegin(1)),
+    }
+    def status_in(statuses): return f"STATUS IN ({', '.join(repr(s) for s in statuses)})"
+    is_today = "STATUSDATE >= :today AND STATUSDATE < :tomorrow"
+    is_ps, is_pi = "STATUS = 'COMPWORK'", "STATUS = 'STARTWORK'"
+    kendala_today = f"{is_today} AND STATUS = 'WORKFAIL'"
+    # Epoch = waktu lokal naive, jadi sisa bagi per hari = jam di hari itu
+    sd_hour = "(STATUSDATE % 86400) / 3600"
+    cases = {
+        'RE HI': "DATECREATED >= :today AND DATECREATED < :tomorrow",
+        'WO MTD': "DATECREATED >= :month_start AND DATECREATED < :next_month",
+        'FO AKTIVASI': f"{is_today} AND {status_in(FO_AKTIVASI_STATUSES)}",
+        'ACOM': f"{is_today} AND {status_in(ACOM_STATUSES)}",
+        'PS ENDSTATE': f"{is_today} AND {is_ps}",
+        'VALSTART ENDSATATE': f"{is_today} AND {status_in(VALSTART_ENDSTATE_STATUSES)}",
+        'EST PS H-1': f"STATUSDATE >= :yesterday AND STATUSDATE < :today AND {is_ps}",
+        'EST PS W-1': f"STATUSDATE >= :seven_days AND STATUSDATE < :tomorrow AND {is_ps}",
+        'PS MTD': f"STATUSDATE >= :month_start AND STATUSDATE < :next_month AND {is_ps}",
+        'PI': is_pi,
+        'PI OPS': f"{is_pi} AND {sd_hour} < 17",
+        'PI NON OPS': f"{is_pi} AND {sd_hour} >= 17",
+        'LEWAT MANJA': f"{is_pi} AND TGL_MANJA < :today",
+        'MANJA HI': f"{is_pi} AND TGL_MANJA >= :today AND TGL_MANJA < :tomorrow",
+        'MANJA SETELAH HI': f"{is_pi} AND TGL_MANJA >= :tomorrow",
+        'KENDALA HI': kendala_today,
+        'KENDALA TEKNIK HI': f"{kendala_today} AND instr(ERRORCODE, 'TEKNIK') > 0",
+        'KENDALA NON TEKNIK HI': f"{kendala_today} AND instr(ERRORCODE, 'PELANGGAN') > 0",
+        'KENDALA PELANGGAN': "STATUS = 'WORKFAIL' AND ERRORCODE = 'KENDALA PELANGGAN'",
+        'KENDALA JARINGAN': "STATUS = 'WORKFAIL' AND ERRORCODE = 'KENDALA TEKNIK'",
+        **{st: f"{is_today} AND STATUS = '{st}'" for st in MICRO_STATUSES},
+    }
+    return cases, params
+
+def wonum_store_metrics(conn: sqlite3.Connection, today) -> pd.DataFrame:
+    """
+    Hitungan per STO (kolom count_metrics) langsung di SQLite: GROUP BY STO atas WONUM yang
+    bisa memengaruhi laporan hari ini (query ber-index): STATUSDATE sejak awal bulan/H-6,
+    DATECREATED bulan ini, atau status tanpa filter tanggal.
+    """
+    cases, params = _wonum_store_metric_cases(today)
+    today = pd.Timestamp(today)
+    params['since'] = _to_epoch(min(today.replace(day=1), today - pd.Timedelta(days=6)))
+    rows = conn.execute(
+        f"SELECT STO, {', '.join(f'SUM(CASE WHEN {cond} THEN 1 ELSE 0 END)' for cond in cases.values())} FROM wonum "
+        f"WHERE STATUSDATE >= :since OR DATECREATED >= :month_start OR STATUS IN ({', '.join(repr(s) for s in _WONUM_STORE_UNDATED_STATUSES)}) "
+        "GROUP BY STO ORDER BY STO IS NULL, STO",
+        params,
+    ).fetchall()
+    counts = pd.DataFrame(rows, columns=['STO', *cases]).set_index('STO')
+    counts.index = counts.index.astype(object).where(counts.index.notna(), np.nan)
+    return counts.astype('int64')
+
+def wonum_store_day_frame(conn: sqlite3.Connection, day) -> pd.DataFrame:
+    """WONUM dengan STATUSDATE di hari `day` (query ber-index), urut saat pertama masuk store."""
+    start = pd.Timestamp(day)
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(_WONUM_STORE_FIELDS)} FROM wonum WHERE STATUSDATE >= ? AND STATUSDATE < ? ORDER BY rowid",
+        conn, params=(_to_epoch(start), _to_epoch(start + pd.Timedelta(days=1))),
+    )
+    for c in DATE_COLUMNS: df[c] = pd.to_datetime(df[c], unit='s')
+    for c in NORMALIZED_COLUMNS: df[c] = df[c].astype('category')
+    return df
+
+def summarize_with_store(frames, report_timestamp: datetime, timings: dict) -> dict:
+    """
+    Upsert frame/chunk upload ke store WONUM, lalu ringkas dari query store (bukan dari
+    upload saja): metrik per STO di-agregasi SQLite, pandas hanya memegang WONUM hari ini
+    (daftar WONUM) & hari STATUSDATE terakhir (dashboard). Biaya sebanding ukuran delta.
+    """
+    rows = 0
+    today = report_timestamp.date()
+    with closing(open_wonum_store()) as conn:
+        for frame in frames:
+            t0 = time.perf_counter()
+            rows += wonum_store_upsert(conn, frame, report_timestamp)
+            timings['store_upsert'] = timings.get('store_upsert', 0.0) + time.perf_counter() - t0
+        t0 = time.perf_counter()
+        wonum_store_prune(conn, report_timestamp)
+        counts = wonum_store_metrics(conn, today)
+        daily = wonum_store_day_frame(conn, today)
+        latest = conn.execute("SELECT MAX(STATUSDATE) FROM wonum").fetchone()[0]
+        latest = pd.Timestamp(latest, unit='s').date() if latest is not None else None
+        latest_frame = daily if latest in (None, today) else wonum_store_day_frame(conn, latest)
+        timings['store_query'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = {
+        'rows': rows,
+        'metrics': add_metric_ratios(counts),
+        'wonum_details': collect_wonum_details(daily, today),
+        'latest': latest,
+        'dashboard_counts': aggregate_dashboard_counts(latest_frame[DASHBOARD_KEYS]) if latest is not None else None,
+    }
+    timings['aggregate'] = time.perf_counter() - t0
+    logger.info(f"🗄️ Store WONUM: {rows} baris di-upsert, {len(counts)} STO, {len(daily)} WONUM hari ini")
+    return result
+
+# --- Snapshot agregat (1 file kecil per hari STATUSDATE, berisi semua slot 2 jam) ---
+SNAPSHOT_KEYS = ['STO', 'STATUS', 'ERRORCODE']
+_snapshot_lock = asyncio.Lock()
+
+def snapshot_path(day) -> str:
+    ext = 'parquet' if HAS_PYARROW else 'pkl'
+    return os.path.join(SNAPSHOT_DIR, f"{pd.Timestamp(day):%Y-%m-%d}.{ext}")
+
+def snapshot_slot(report_timestamp: datetime, day) -> pd.Timestamp:
+    """
+    Awal slot SNAPSHOT_SLOT_HOURS jam (WIB, naive) tempat upload ini jatuh, di dalam hari
+    `day` (STATUSDATE terbaru export). Export yang hari terakhirnya sudah lewat masuk slot
+    terakhir hari itu, agar satu file snapshot tidak berisi slot dari hari lain.
+    """
+    ts = pd.Timestamp(report_timestamp.astimezone(WIB_TZ).replace(tzinfo=None))
+    day = pd.Timestamp(day)
+    last_slot = day + pd.Timedelta(days=1) - pd.Timedelta(hours=SNAPSHOT_SLOT_HOURS)
+    return min(max(ts.floor(f"{SNAPSHOT_SLOT_HOURS}h"), day), last_slot)
+
+def write_snapshot(counts: pd.Series, day, report_timestamp: datetime) -> None:
+    """Simpan hitungan STO x STATUS x ERRORCODE hari `day` untuk slot upload ini (slot sama ditimpa)."""
+    snap = counts.groupby(level=SNAPSHOT_KEYS, dropna=False, observed=True).sum().rename('N').reset_index()
+    for c in SNAPSHOT_KEYS: snap[c] = snap[c].astype(object).where(snap[c].notna(), None)
+    snap.insert(0, 'SLOT', snapshot_slot(report_timestamp, day))
+    path = snapshot_path(day)
+    if os.path.exists(path):
+        old = read_cached_frame(path)
+        snap = pd.concat([old[old['SLOT'] != snap['SLOT'].iloc[0]], snap], ignore_index=True)
+    write_cached_frame(snap, path)
+
+async def record_snapshot(result: dict, report_timestamp: datetime) -> None:
+    """Tambahkan hitungan dashboard hari terakhir ke snapshot store (tulis kecil, di thread)."""
+    if result['latest'] is None: return
+    try:
+        async with _snapshot_lock:
+            await asyncio.to_thread(write_snapshot, result['dashboard_counts'], result['latest'], report_timestamp)
+    except Exception as e:
+        logger.warning(f"⚠️ Gagal menyimpan snapshot: {e}")
+
+def load_trend(start, end, intraday: bool = False):
+    """
+    Baca snapshot hari start..end. Harian: slot terakhir tiap hari; intraday: semua slot.
+    Return tabel index (PERIODE, STO) x TREND_METRICS, atau None jika belum ada snapshot.
+    """
+    frames = []
+    for day in pd.date_range(start, end, freq='D'):
+        path = snapshot_path(day)
+        if not os.path.exists(path): continue
+        snap = read_cached_frame(path)
+        if intraday:
+            snap['PERIODE'] = snap['SLOT']
+        else:
+            snap = snap[snap['SLOT'] == snap['SLOT'].max()].assign(PERIODE=day)
+        frames.append(snap)
+    if not frames: return None
+    snap = pd.concat(frames, ignore_index=True)
+    table = pd.DataFrame({name: snap['N'].where(snap['STATUS'].isin(statuses), 0) for name, statuses in TREND_METRICS.items()})
+    return table.groupby([snap['PERIODE'], snap['STO'].fillna('NAN')]).sum().rename_axis(['PERIODE', 'STO'])
+
+def trend_period(arg: str, today):
+    """'7d' / 'Nd' = N hari terakhir, 'mtd' = awal bulan s/d hari ini, '2jam' = slot hari ini."""
+    today = pd.Timestamp(today)
+    if arg == 'mtd': return 'MTD', today.replace(day=1), today, False
+    if arg == '2jam': return 'per 2 jam', today, today, True
+    if arg.endswith('d') and arg[:-1].isdigit() and 0 < int(arg[:-1]) <= 92:
+        return arg.upper(), today - pd.Timedelta(days=int(arg[:-1]) - 1), today, False
+    return None
+
+def render_trend_png(label: str, start, end, intraday: bool = False, witel: str = None):
+    """
+    Stage CPU (process pool): baca snapshot + render grafik trend satu witel (None = semua
+    region, tanpa filter STO). None jika belum ada data.
+    """
+    t0 = time.perf_counter()
+    table = load_trend(start, end, intraday)
+    read_sec = time.perf_counter() - t0
+    if table is None: return None
+    region = find_region(witel) if witel else None
+    if region and region['stos'] is not None:
+        table = table[table.index.get_level_values('STO').isin(region['stos'])]
+        if table.empty: return None
+    t0 = time.perf_counter()
+    png = create_trend_chart(table, label, intraday, witel or " / ".join(r['name'] for r in REGIONS)).getvalue()
+    logger.info(f"⏱️ Trend {label}: baca snapshot {read_sec * 1000:.0f} ms, render {time.perf_counter() - t0:.2f}s")
+    return png
+
+def format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage}={sec:.2f}s" for stage, sec in timings.items())
+
+def analyze_upload(file_bytes: bytes, report_timestamp: datetime, cache_path: str = None) -> dict:
+    """Stage CPU (process pool): parse Excel + normalisasi + agregasi (+ simpan ke cache)."""
+    reset_peak_rss()
+    df, timings = load_export(file_bytes)
+    if cache_path:
+        t0 = time.perf_counter()
+        try:
+            write_cached_frame(df, cache_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Gagal menulis cache upload: {e}")
+        timings['cache_write'] = time.perf_counter() - t0
+    if ENABLE_WONUM_STORE:
+        result = summarize_with_store([df], report_timestamp, timings)
+    else:
+        t0 = time.perf_counter()
+        result = summarize_dataframe(df, report_timestamp)
+        timings['aggregate'] = time.perf_counter() - t0
+    result['timings'] = timings
+    result['peak_rss_mb'] = peak_rss_mb()
+    logger.info(f"⏱️ Ingestion {len(df)} baris: {format_timings(timings)}, peak {result['peak_rss_mb']:.0f} MB")
+    # Reader Excel di luar budget memori (lihat MEMORY_BUDGET_MB)
+    result['memory_budget_ok'] = None
+    return result
+
+def iter_csv_chunks(file_bytes: bytes, compression: str, timings: dict):
+    """Baca CSV per CSV_CHUNK_ROWS baris; tiap chunk sudah ter-normalisasi (durasi masuk timings)."""
+    reader = pd.read_csv(
+        io.BytesIO(file_bytes), compression=compression, chunksize=CSV_CHUNK_ROWS,
+        usecols=lambda c: c in REPORT_COLUMNS, dtype=EXPORT_TEXT_DTYPES,
+    )
+    t0 = time.perf_counter()
+    for chunk in reader:
+        timings['read_csv'] = timings.get('read_csv', 0.0) + time.perf_counter() - t0
+        yield normalize_export(chunk, timings)
+        t0 = time.perf_counter()
+
+def analyze_csv_upload(file_bytes: bytes, report_timestamp: datetime, compression: str = None) -> dict:
+    """
+    Stage CPU (process pool): baca CSV/CSV.gz per chunk. Tiap chunk langsung dilipat ke
+    counter berjalan (metrik per STO, hitungan dashboard hari terakhir, WONUM micro)
+    sehingga DataFrame penuh tidak pernah dibentuk. Hasil sama dengan summarize_dataframe.
+    Dengan ENABLE_WONUM_STORE tiap chunk di-upsert ke store WONUM lalu diringkas dari store.
+    """
+    reset_peak_rss()
+    today = report_timestamp.date()
+    timings = {'read_csv': 0.0}
+    if ENABLE_WONUM_STORE:
+        result = summarize_with_store(iter_csv_chunks(file_bytes, compression, timings), report_timestamp, timings)
+        result['timings'] = timings
+        result['peak_rss_mb'] = peak_rss_mb()
+        logger.info(f"⏱️ CSV {result['rows']} baris: {format_timings(timings)}, peak {result['peak_rss_mb']:.0f} MB")
+        result['memory_budget_ok'] = check_memory_budget(result['rows'])
+        return result
+
+    rows, metric_parts, daily_parts, latest_day = 0, [], [], None
+    wonum_details = {sto: {} for sto in WONUM_DETAIL_STOS}
+
+    for chunk in iter_csv_chunks(file_bytes, compression, timings):
+        t0 = time.perf_counter()
+        rows += len(chunk)
+        metric_parts.append(count_metrics(chunk, today))
+        for sto, statuses in collect_wonum_details(chunk, today).items():
+            for status, wonums in statuses.items():
+                wonum_details[sto].setdefault(status, []).extend(wonums)
+
+        # Hitungan dashboard hanya disimpan untuk tanggal STATUSDATE terbaru sejauh ini
+        status_day = chunk['STATUSDATE'].dt.normalize()
+        chunk_latest = status_day.max()
+        if pd.notna(chunk_latest):
+            if latest_day is None or chunk_latest > latest_day:
+                latest_day, daily_parts = chunk_latest, []
+            is_latest = (status_day == latest_day).to_numpy()
+            if is_latest.any():
+                daily_parts.append(aggregate_dashboard_counts(chunk.loc[is_latest, DASHBOARD_KEYS]))
+        timings['aggregate'] = timings.get('aggregate', 0.0) + time.perf_counter() - t0
+
+    # Urutan status per STO mengikuti MICRO_STATUSES seperti collect_wonum_details
+    wonum_details = {sto: {s: statuses[s] for s in MICRO_STATUSES if s in statuses} for sto, statuses in wonum_details.items()}
+    result = {
+        'rows': rows,
+        'metrics': add_metric_ratios(merge_metric_counts(metric_parts)) if metric_parts else compute_metrics(pd.DataFrame(columns=REPORT_COLUMNS), today),
+        'wonum_details': wonum_details,
+        'latest': latest_day.date() if latest_day is not None else None,
+        'dashboard_counts': pd.concat(daily_parts).groupby(level=list(range(len(DASHBOARD_KEYS))), dropna=False).sum() if daily_parts else None,
+        'timings': timings,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    logger.info(f"⏱️ CSV {rows} baris: {format_timings(timings)}, peak {result['peak_rss_mb']:.0f} MB")
+    result['memory_budget_ok'] = check_memory_budget(rows)
+    return result
+
+def analyze_cached(cache_path: str, report_timestamp: datetime) -> dict:
+    """Stage CPU (process pool): baca DataFrame ter-normalisasi dari cache + agregasi."""
+    reset_peak_rss()
+    t0 = time.perf_counter()
+    df = read_cached_frame(cache_path)
+    timings = {'cache_read': time.perf_counter() - t0}
+    if ENABLE_WONUM_STORE:
+        result = summarize_with_store([df], report_timestamp, timings)
+    else:
+        t0 = time.perf_counter()
+        result = summarize_dataframe(df, report_timestamp)
+        timings['aggregate'] = time.perf_counter() - t0
+    result['timings'] = timings
+    result['peak_rss_mb'] = peak_rss_mb()
+    logger.info(f"⏱️ Cache {len(df)} baris: {format_timings(timings)}, peak {result['peak_rss_mb']:.0f} MB")
+    result['memory_budget_ok'] = check_memory_budget(len(df))
+    return result
+
+def fit_png_budget(png: bytes) -> bytes:
+    """PNG di atas DASHBOARD_MAX_KB: konversi ke palet 256 warna, lalu perkecil bertahap sampai muat."""
+    budget = DASHBOARD_MAX_KB * 1024
+    if len(png) <= budget or not HAS_PIL: return png
+    img = Image.open(io.BytesIO(png)).convert('RGB')
+    scale = 1.0
+    while True:
+        frame = img if scale == 1.0 else img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+        buf = io.BytesIO(); frame.quantize(256).save(buf, format='png')
+        if buf.tell() <= budget or scale < 0.3:
+            logger.info(f"🗜️ Dashboard {len(png) // 1024} KB -> {buf.tell() // 1024} KB (skala {scale:.2f})")
+            return buf.getvalue()
+        scale *= 0.8
+
+def _render_cache_store(path: str, png: bytes) -> None:
+    """Simpan PNG (atomic) lalu sisakan DASHBOARD_RENDER_CACHE_ENTRIES file terbaru."""
+    os.makedirs(DASHBOARD_RENDER_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh: fh.write(png)
+    os.replace(tmp, path)
+    entries = sorted(
+        (os.path.join(DASHBOARD_RENDER_CACHE_DIR, name) for name in os.listdir(DASHBOARD_RENDER_CACHE_DIR) if name.endswith('.png')),
+        key=os.path.getmtime, reverse=True,
+    )
+    for old in entries[DASHBOARD_RENDER_CACHE_ENTRIES:]: os.remove(old)
+
+def render_dashboard_png(counts: pd.Series, report_timestamp: datetime, witel: str = DEFAULT_WITEL) -> dict:
+    """
+    Stage CPU (process pool): render dashboard dari hasil aggregate_dashboard_counts.
+    PNG di-cache dengan key hash tabel agregat + witel + timestamp + setting render.
+    Return {'png', 'peak_rss_mb'} (peak worker selama stage ini).
+    """
+    reset_peak_rss()
+    key = hashlib.sha256(
+        f"{counts.to_csv()}|{witel}|{report_timestamp.isoformat()}|{DASHBOARD_RENDERER}|{DASHBOARD_DPI}|{DASHBOARD_MAX_KB}".encode()
+    ).hexdigest()
+    path = os.path.join(DASHBOARD_RENDER_CACHE_DIR, f"{key}.png")
+    try:
+        with open(path, "rb") as fh: png = fh.read()
+        os.utime(path)
+        logger.info(f"♻️ Render cache HIT ({key[:12]})")
+        return {'png': png, 'peak_rss_mb': peak_rss_mb()}
+    except OSError:
+        pass
+
+    t0 = time.perf_counter()
+    status_counts = counts.groupby(level='STATUS', observed=True).sum()
+    png = fit_png_budget(create_integrated_dashboard(None, report_timestamp, status_counts, counts, witel).getvalue())
+    logger.info(f"⏱️ Render dashboard {witel} ({DASHBOARD_RENDERER}, {DASHBOARD_DPI} dpi): {time.perf_counter() - t0:.2f}s, {len(png) // 1024} KB")
+    try:
+        _render_cache_store(path, png)
+    except OSError as e:
+        logger.warning(f"⚠️ Gagal menulis cache render: {e}")
+    return {'png': png, 'peak_rss_mb': peak_rss_mb()}
+
+async def edit_progress(proc_msg, done: list, current: str = None) -> None:
+    """Update pesan progress: stage selesai dicentang, stage berjalan ditandai ⏳."""
+    lines = [f"✅ {stage}" for stage in done]
+    if current: lines.append(f"⏳ {current}...")
+    try:
+        await proc_msg.edit_text("\n".join(lines))
+    except Exception as e:
+        logger.warning(f"Gagal update pesan progress: {e}")
+
+_background_tasks = set()
+
+# --- Cold start: modul berat & waktu startup ---
+# Detik sejak import modul dimulai; diekspos di /metrics
+_startup = {'import': None, 'lifespan': None, 'first_response': None, 'preload': None, 'bot_ready': None}
+_preload_task = None
+_first_response = None
+
+def mark_startup(phase: str) -> None:
+    if _startup[phase] is None:
+        _startup[phase] = time.perf_counter() - _IMPORT_T0
+        logger.info(f"🚀 Startup {phase}: {_startup[phase]:.3f}s sejak import")
+    if phase == 'first_response' and _first_response is not None: _first_response.set()
+
+async def preload_after_first_response() -> None:
+    """Preload modul berat & worker pool setelah respon pertama terkirim (maks. PRELOAD_DELAY_SECONDS)."""
+    global _first_response
+    _first_response = asyncio.Event()
+    if _startup['first_response'] is None:
+        try: await asyncio.wait_for(_first_response.wait(), PRELOAD_DELAY_SECONDS)
+        except asyncio.TimeoutError: pass
+    await ensure_heavy_modules()
+    await warm_process_pool()
+
+async def _preload_heavy_modules() -> None:
+    await asyncio.to_thread(preload_heavy_modules)
+    mark_startup('preload')
+
+async def ensure_heavy_modules() -> None:
+    """
+    Tunggu preload (dimulai jika belum) sebelum event loop memakai pandas/numpy/matplotlib.
+    LazyLoader di 3.11 tidak memakai lock, jadi setiap handler yang menyentuh modul berat
+    wajib menunggu ini agar tidak exec modul bersamaan dengan thread preload.
+    """
+    global _preload_task
+    if _preload_task is None: _preload_task = asyncio.create_task(_preload_heavy_modules())
+    await asyncio.shield(_preload_task)
+
+def run_in_background(coro) -> asyncio.Task:
+    """Jalankan coroutine tanpa ditunggu; referensi disimpan agar task tidak di-GC."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# --- Antrian upload ---
+# Job menunggu per chat (urutan FIFO); upload baru dari chat yang sama menggantikan job
+# yang masih antri tanpa kehilangan posisinya. Tulis ke Sheet sudah berurutan per
+# spreadsheet lewat submit_sheet_cells, jadi antrian cukup membatasi per chat & global.
+_upload_queue = OrderedDict()
+_running_chats = set()
+_upload_waits = deque(maxlen=100)
+_upload_stats = {'processed': 0, 'superseded': 0, 'rejected': 0}
+
+def upload_queue_position(chat_id) -> int:
+    """Posisi (1-based) job chat di antrian, 0 jika tidak sedang antri."""
+    for pos, key in enumerate(_upload_queue, 1):
+        if key == chat_id: return pos
+    return 0
+
+def upload_queue_stats() -> dict:
+    """Kedalaman antrian & waktu tunggu (100 job terakhir) untuk monitoring."""
+    now = time.monotonic()
+    waits = sorted(_upload_waits)
+    return {
+        'queued': len(_upload_queue),
+        'running': len(_running_chats),
+        'max_concurrency': UPLOAD_MAX_CONCURRENCY,
+        'queue_max': UPLOAD_QUEUE_MAX,
+        'oldest_wait_s': round(max((now - job['enqueued'] for job in _upload_queue.values()), default=0.0), 2),
+        'wait_p50_s': round(waits[len(waits) // 2], 2) if waits else 0.0,
+        'wait_max_s': round(waits[-1], 2) if waits else 0.0,
+        **_upload_stats,
+    }
+
+def enqueue_upload(chat_id, job: dict):
+    """Masukkan job ke antrian. Return job lama yang digantikan, atau False jika antrian penuh."""
+    old = _upload_queue.get(chat_id)
+    if old is None and len(_upload_queue) >= UPLOAD_QUEUE_MAX:
+        _upload_stats['rejected'] += 1
+        return False
+    job['enqueued'] = old['enqueued'] if old else time.monotonic()
+    _upload_queue[chat_id] = job
+    if old:
+        old['superseded'] = True
+        _upload_stats['superseded'] += 1
+    dispatch_uploads()
+    return old
+
+def dispatch_uploads() -> None:
+    """Jalankan job antrian (FIFO) selama slot global masih ada & chat-nya belum punya job berjalan."""
+    for chat_id in list(_upload_queue):
+        if len(_running_chats) >= UPLOAD_MAX_CONCURRENCY: break
+        if chat_id in _running_chats: continue
+        job = _upload_queue.pop(chat_id)
+        job['started'] = True
+        _running_chats.add(chat_id)
+        _upload_waits.append(time.monotonic() - job['enqueued'])
+        run_in_background(_run_upload_job(chat_id, job))
+
+# --- Metrik per stage & per job (diekspos di /metrics) ---
+# stage -> [jumlah, total detik, maks detik]. Stage parsing/agregasi berasal dari
+# result['timings'] worker, sisanya (download, render, kirim, sheets) diukur di event loop.
+# Baris input per stage: stage -> [total, terakhir]; peak RSS stage worker: stage -> [terakhir, maks].
+_stage_metrics = {}
+_stage_rows = {}
+_stage_peaks = {}
+_job_metrics = {'ok': 0, 'error': 0, 'rows': 0, 'last_rows': 0, 'last_seconds': 0.0, 'worker_peak_rss_mb': 0.0, 'last_worker_peak_rss_mb': 0.0}
+# Chat yang upload berikutnya diprofil (diaktifkan admin lewat /profile)
+_profile_armed = set()
+
+def record_stage(stage: str, seconds: float) -> None:
+    m = _stage_metrics.setdefault(stage, [0, 0.0, 0.0])
+    m[0] += 1; m[1] += seconds; m[2] = max(m[2], seconds)
+
+def record_job(summary: dict) -> None:
+    """Masukkan ringkasan satu job ke metrik & tulis satu baris log terstruktur (JSON)."""
+    for stage, seconds in summary['timings'].items(): record_stage(stage, seconds)
+    for stage, rows in summary['stage_rows'].items():
+        m = _stage_rows.setdefault(stage, [0, 0])
+        m[0] += rows; m[1] = rows
+    for stage, peak in summary['stage_peak_rss_mb'].items():
+        m = _stage_peaks.setdefault(stage, [0.0, 0.0])
+        m[0] = peak; m[1] = max(m[1], peak)
+    _job_metrics[summary['status']] += 1
+    _job_metrics['rows'] += summary['rows']
+    _job_metrics['last_rows'] = summary['rows']
+    _job_metrics['last_seconds'] = summary['seconds']
+    _job_metrics['last_worker_peak_rss_mb'] = summary['worker_peak_rss_mb']
+    _job_metrics['worker_peak_rss_mb'] = max(_job_metrics['worker_peak_rss_mb'], summary['worker_peak_rss_mb'])
+    logger.info(f"📊 job {json.dumps(summary, default=str)}")
+
+def render_metrics() -> str:
+    """Metrik dalam format teks Prometheus (exposition 0.0.4)."""
+    lines = [
+        "# HELP smokeweed_stage_seconds Durasi stage pemrosesan upload.",
+        "# TYPE smokeweed_stage_seconds summary",
+    ]
+    for stage, (count, total, _) in sorted(_stage_metrics.items()):
+        lines.append(f'smokeweed_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines.append(f'smokeweed_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+    lines += ["# HELP smokeweed_stage_seconds_max Durasi stage terlama sejak start.", "# TYPE smokeweed_stage_seconds_max gauge"]
+    lines += [f'smokeweed_stage_seconds_max{{stage="{stage}"}} {m[2]:.6f}' for stage, m in sorted(_stage_metrics.items())]
+    lines += ["# HELP smokeweed_stage_rows_total Baris input stage (export untuk parsing, agregat untuk render/report).", "# TYPE smokeweed_stage_rows_total counter"]
+    lines += [f'smokeweed_stage_rows_total{{stage="{stage}"}} {m[0]}' for stage, m in sorted(_stage_rows.items())]
+    lines += ["# HELP smokeweed_stage_last_rows Baris input stage pada job terakhir.", "# TYPE smokeweed_stage_last_rows gauge"]
+    lines += [f'smokeweed_stage_last_rows{{stage="{stage}"}} {m[1]}' for stage, m in sorted(_stage_rows.items())]
+    lines += ["# HELP smokeweed_stage_peak_rss_mb Peak RSS worker per stage, tertinggi dari semua job.", "# TYPE smokeweed_stage_peak_rss_mb gauge"]
+    lines += [f'smokeweed_stage_peak_rss_mb{{stage="{stage}"}} {m[1]:.1f}' for stage, m in sorted(_stage_peaks.items())]
+    lines += ["# HELP smokeweed_stage_last_peak_rss_mb Peak RSS worker per stage pada job terakhir.", "# TYPE smokeweed_stage_last_peak_rss_mb gauge"]
+    lines += [f'smokeweed_stage_last_peak_rss_mb{{stage="{stage}"}} {m[0]:.1f}' for stage, m in sorted(_stage_peaks.items())]
+    lines += [
+        "# HELP smokeweed_jobs_total Job upload selesai per status.", "# TYPE smokeweed_jobs_total counter",
+        f'smokeweed_jobs_total{{status="ok"}} {_job_metrics["ok"]}',
+        f'smokeweed_jobs_total{{status="error"}} {_job_metrics["error"]}',
+        "# HELP smokeweed_rows_total Baris export yang diproses.", "# TYPE smokeweed_rows_total counter",
+        f"smokeweed_rows_total {_job_metrics['rows']}",
+        "# HELP smokeweed_last_job_rows Baris pada job terakhir.", "# TYPE smokeweed_last_job_rows gauge",
+        f"smokeweed_last_job_rows {_job_metrics['last_rows']}",
+        "# HELP smokeweed_last_job_seconds Durasi total job terakhir.", "# TYPE smokeweed_last_job_seconds gauge",
+        f"smokeweed_last_job_seconds {_job_metrics['last_seconds']:.6f}",
+        "# HELP smokeweed_worker_peak_rss_mb Peak RSS worker (stage terberat), tertinggi dari semua job.", "# TYPE smokeweed_worker_peak_rss_mb gauge",
+        f"smokeweed_worker_peak_rss_mb {_job_metrics['worker_peak_rss_mb']:.1f}",
+        "# HELP smokeweed_last_job_worker_peak_rss_mb Peak RSS worker (stage terberat) pada job terakhir.", "# TYPE smokeweed_last_job_worker_peak_rss_mb gauge",
+        f"smokeweed_last_job_worker_peak_rss_mb {_job_metrics['last_worker_peak_rss_mb']:.1f}",
+        "# HELP smokeweed_peak_rss_mb Peak RSS proses bot (event loop).", "# TYPE smokeweed_peak_rss_mb gauge",
+        f"smokeweed_peak_rss_mb {peak_rss_mb():.1f}",
+    ]
+    lines += ["# HELP smokeweed_startup_seconds Detik sejak import modul sampai fase startup tercapai.", "# TYPE smokeweed_startup_seconds gauge"]
+    lines += [f'smokeweed_startup_seconds{{phase="{phase}"}} {sec:.6f}' for phase, sec in _startup.items() if sec is not None]
+    q = upload_queue_stats()
+    for key, kind in [('queued', 'gauge'), ('running', 'gauge'), ('oldest_wait_s', 'gauge'), ('wait_p50_s', 'gauge'), ('wait_max_s', 'gauge'),
+                      ('processed', 'counter'), ('superseded', 'counter'), ('rejected', 'counter')]:
+        name = f"smokeweed_upload_queue_{key}" + ("_total" if kind == 'counter' else "")
+        lines += [f"# TYPE {name} {kind}", f"{name} {q[key]}"]
+    return "\n".join(lines) + "\n"
+
+def profiled_call(func, *args):
+    """Jalankan func di bawah cProfile (di worker), return (hasil, ringkasan pstats teks)."""
+    prof = cProfile.Profile()
+    result = prof.runcall(func, *args)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+    return result, out.getvalue()
+
+async def _run_upload_job(chat_id, job: dict) -> None:
+    try:
+        if job.get('queued_msg'):
+            try: await job['queued_msg'].delete()
+            except Exception: pass
+        await process_upload(job['update'], job['context'], time.monotonic() - job['enqueued'])
+    finally:
+        _running_chats.discard(chat_id)
+        _upload_stats['processed'] += 1
+        dispatch_uploads()
+
+async def send_kpro_update(message, parts: list, ts: datetime) -> None:
+    """Update Google Sheet semua region (`parts` = hasil partition_result) paralel lalu kirim log ke chat."""
+    try:
+        t0 = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            process_kpro_logic(None, part['metrics'], ts.date(), part['wonum_details'], region, ts) for region, part in parts
+        ))
+        record_stage('sheets', time.perf_counter() - t0)
+        logs = [log if len(parts) == 1 else f"[{region['name']}]\n{log}" for (region, _), (_, log, _) in zip(parts, outcomes) if log]
+        if logs: await message.reply_text("\n\n".join(logs))
+    except Exception as e:
+        logger.error(f"Error Sheet: {e}", exc_info=True)
+        await message.reply_text(f"❌ Error Sheet: {e}")
+
+# --- Drill-down WONUM: index per upload (LRU + TTL + batas memori) ---
+# Key: "chat_id:message_id" upload. Entry menyimpan STO -> STATUS -> WONUM beserta offset
+# halaman yang sudah dihitung, sehingga klik tombol tidak menyentuh file/DataFrame lagi.
+_wonum_index = OrderedDict()
+_wonum_index_bytes = 0
+# Cadangan karakter untuk judul halaman, sisanya untuk daftar WONUM
+_WONUM_PAGE_HEADER_RESERVE = 200
+
+def paginate_wonums(wonums: list) -> list:
+    """Offset awal tiap halaman: maks WONUM_PAGE_SIZE baris & teks di bawah batas pesan Telegram."""
+    limit = MessageLimit.MAX_TEXT_LENGTH - _WONUM_PAGE_HEADER_RESERVE
+    starts, used, count = [0], 0, 0
+    for i, wonum in enumerate(wonums):
+        line = len(f"{i + 1}. {wonum}\n")
+        if count and (count >= WONUM_PAGE_SIZE or used + line > limit):
+            starts.append(i); used, count = 0, 0
+        used += line; count += 1
+    return starts
+
+def _drop_wonum_index(key: str) -> None:
+    global _wonum_index_bytes
+    _wonum_index_bytes -= _wonum_index.pop(key)['bytes']
+
+def wonum_index_put(key: str, details: dict, report_timestamp: datetime) -> bool:
+    """Simpan index drill-down satu upload. False jika tidak ada WONUM (keyboard tidak perlu)."""
+    global _wonum_index_bytes
+    pages = {(sto, status): paginate_wonums(wonums) for sto, statuses in details.items() for status, wonums in statuses.items() if wonums}
+    if not pages: return False
+    size = sum(sys.getsizeof(w) + 8 for sto, status in pages for w in details[sto][status])
+    if key in _wonum_index: _drop_wonum_index(key)
+    _wonum_index[key] = {'created': time.monotonic(), 'bytes': size, 'date': report_timestamp, 'details': details, 'pages': pages}
+    _wonum_index_bytes += size
+
+    # Buang entry kadaluarsa, lalu yang paling lama tidak dipakai sampai di bawah batas
+    expired = [k for k, e in _wonum_index.items() if time.monotonic() - e['created'] > WONUM_INDEX_TTL_MINUTES * 60]
+    for k in expired: _drop_wonum_index(k)
+    while len(_wonum_index) > 1 and (len(_wonum_index) > WONUM_INDEX_MAX_UPLOADS or _wonum_index_bytes > WONUM_INDEX_MAX_MB * 1024 * 1024):
+        _drop_wonum_index(next(iter(_wonum_index)))
+    return True
+
+def wonum_index_get(key: str):
+    entry = _wonum_index.get(key)
+    if entry is None: return None
+    if time.monotonic() - entry['created'] > WONUM_INDEX_TTL_MINUTES * 60:
+        _drop_wonum_index(key)
+        return None
+    _wonum_index.move_to_end(key)
+    return entry
+
+def _keyboard_rows(buttons: list, per_row: int) -> list:
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+
+def wonum_sto_keyboard(key: str, entry: dict) -> InlineKeyboardMarkup:
+    """Tombol STO (jumlah WONUM micro hari ini) untuk pesan dashboard."""
+    totals = {}
+    for sto, status in entry['pages']: totals[sto] = totals.get(sto, 0) + len(entry['details'][sto][status])
+    buttons = [InlineKeyboardButton(f"{sto} ({n})", callback_data=('wonum', key, sto, None, 0)) for sto, n in totals.items()]
+    return InlineKeyboardMarkup(_keyboard_rows(buttons, 3))
+
+def wonum_status_view(key: str, entry: dict, sto: str) -> tuple:
+    statuses = entry['details'].get(sto, {})
+    buttons = [
+        InlineKeyboardButton(f"{status} ({len(wonums)})", callback_data=('wonum', key, sto, status, 0))
+        for status, wonums in statuses.items() if wonums
+    ]
+    rows = _keyboard_rows(buttons, 2) + [[InlineKeyboardButton("⬅️ STO", callback_data=('wonum', key, None, None, 0))]]
+    return f"📋 WONUM {sto} - {entry['date'].strftime('%d/%m/%Y')}\nPilih status:", InlineKeyboardMarkup(rows)
+
+def wonum_page_view(key: str, entry: dict, sto: str, status: str, page: int) -> tuple:
+    wonums, starts = entry['details'][sto][status], entry['pages'][(sto, status)]
+    page = max(0, min(page, len(starts) - 1))
+    end = starts[page + 1] if page + 1 < len(starts) else len(wonums)
+    lines = [f"{i + 1}. {wonums[i]}" for i in range(starts[page], end)]
+    header = f"📋 {sto} · {status} ({len(wonums)} WO) - hal {page + 1}/{len(starts)}"
+
+    nav = []
+    if page > 0: nav.append(InlineKeyboardButton("◀️", callback_data=('wonum', key, sto, status, page - 1)))
+    if page + 1 < len(starts): nav.append(InlineKeyboardButton("▶️", callback_data=('wonum', key, sto, status, page + 1)))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(f"⬅️ {sto}", callback_data=('wonum', key, sto, None, 0))])
+    return header + "\n\n" + "\n".join(lines), InlineKeyboardMarkup(rows)
+
+# --- Angka upload terakhir per chat (command query tanpa scan pandas) ---
+# Disimpan sebagai dict biasa per region (hasil partition_result) saat upload selesai; upload
+# lebih baru di chat yang sama menggantikan entry lama, chat paling lama tidak aktif dibuang
+# di atas CHAT_REPORT_MAX_CHATS.
+_chat_reports = OrderedDict()
+
+PS_QUERY_ITEMS = {
+    'hi': [('PS HI', 'PS ENDSTATE', False), ('RE HI', 'RE HI', False), ('PS/RE HI', 'PS/RE HI', True), ('Estimasi PS', 'ESTIMASI PS', False)],
+    'mtd': [('PS MTD', 'PS MTD', False), ('WO MTD', 'WO MTD', False), ('PS/RE MTD', 'PS/RE MTD', True)],
+}
+NO_REPORT_TEXT = "ℹ️ Belum ada data di chat ini. Kirim file Excel/CSV dulu."
+
+def summarize_chat_report(result: dict) -> dict:
+    metrics, counts = result['metrics'], result['dashboard_counts']
+    return {
+        'total': metrics_total(metrics).to_dict(),
+        'sto': {str(sto): row.to_dict() for sto, row in metrics.iterrows() if pd.notna(sto)},
+        'status_counts': {str(k): int(v) for k, v in counts.groupby(level='STATUS', observed=True).sum().items()} if counts is not None else {},
+    }
+
+def remember_chat_report(chat_id: int, parts: list, report_timestamp: datetime) -> None:
+    """Simpan angka upload per region; `parts` = hasil partition_result (urutan REGIONS)."""
+    old = _chat_reports.get(chat_id)
+    if old is not None and old['ts'] > report_timestamp: return
+    _chat_reports[chat_id] = {
+        'ts': report_timestamp,
+        'regions': {region['name']: summarize_chat_report(part) for region, part in parts},
+    }
+    _chat_reports.move_to_end(chat_id)
+    while len(_chat_reports) > CHAT_REPORT_MAX_CHATS: _chat_reports.popitem(last=False)
+
+def get_chat_report(chat_id: int):
+    entry = _chat_reports.get(chat_id)
+    if entry is not None: _chat_reports.move_to_end(chat_id)
+    return entry
+
+async def get_query_regions(update: Update, witel: str = None):
+    """
+    (entry, [(witel, angka)]) untuk command query: satu witel jika diminta, default semua
+    region. None jika chat belum punya data / witel tidak dikenal (pesan sudah dibalas).
+    """
+    entry = get_chat_report(update.effective_chat.id)
+    if entry is None:
+        await update.message.reply_text(NO_REPORT_TEXT)
+        return None
+    if witel is None: return entry, list(entry['regions'].items())
+    name = witel.upper()
+    if name not in entry['regions']:
+        await update.message.reply_text(f"❌ Witel tidak dikenal. Pilihan: {' | '.join(entry['regions'])}")
+        return None
+    return entry, [(name, entry['regions'][name])]
+
+def query_header(entry: dict, title: str) -> str:
+    return f"{title} - Last Update BIMA: {entry['ts'].strftime('%d/%m/%y %H:%M')}\n--------------------\n"
+
+def format_regions_reply(entry: dict, regions: list, title: str, body) -> str:
+    """Header + body(angka) per region; label [WITEL] hanya jika ada lebih dari satu region."""
+    blocks = [body(report) if len(entry['regions']) == 1 else f"[{name}]\n{body(report)}" for name, report in regions]
+    return query_header(entry, title) + "\n\n".join(blocks)
+
+def format_query_reply(entry: dict, regions: list, title: str, items: list) -> str:
+    """Total + satu baris per STO untuk kolom `items` (format sama dengan REPORT_SECTIONS)."""
+    def row(m): return " | ".join(f"{label} {format_metric_value(m[col], pct)}" for label, col, pct in items)
+    def body(report):
+        return "\n".join([f"Total: {row(report['total'])}"] + [f"* {sto}: {row(m)}" for sto, m in sorted(report['sto'].items())])
+    return format_regions_reply(entry, regions, title, body)
+
+# ==========================================
+# 7. HANDLER
 # ==========================================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Halo! Kirim file Excel (.xls/.xlsx) untuk update Dashboard & Sheet.")
+    await update.message.reply_text("Halo! Kirim file Excel (.xls/.xlsx) atau CSV (.csv/.csv.gz) untuk update Dashboard & Sheet.\nTrend: /trend 7d | /trend mtd | /trend 2jam (opsional + nama witel)\nQuery upload terakhir: /sto CPP | /kendala | /manja | /ps | /ps mtd | /ringkasan (opsional + nama witel)")
+
+async def trend(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/trend 7d [WITEL] | /trend mtd | /trend 2jam — grafik PS, ACOM, PI, KENDALA per STO dari snapshot (default semua witel)."""
+    await ensure_heavy_modules()
+    arg = (context.args[0] if context.args else '7d').lower()
+    period = trend_period(arg, update.message.date.astimezone(WIB_TZ).date())
+    witel = context.args[1] if len(context.args or []) > 1 else None
+    region = find_region(witel) if witel else None
+    if period is None or (witel and region is None):
+        await update.message.reply_text(f"❌ Format: /trend 7d | /trend 30d | /trend mtd | /trend 2jam, opsional witel: {' | '.join(r['name'] for r in REGIONS)}")
+        return
+    try:
+        png = await run_in_process_pool(render_trend_png, *period, region['name'] if region else None)
+        if png is None:
+            await update.message.reply_text(f"ℹ️ Belum ada snapshot untuk periode {period[0]}. Upload file dulu.")
+            return
+        await update.message.reply_photo(InputFile(io.BytesIO(png), filename="trend.png"), caption=f"Trend {period[0]}")
+    except Exception as e:
+        logger.error(f"Error Trend: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Error: {e}")
+
+async def query_sto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/sto CPP — seluruh blok Text Report untuk satu STO (dicari di semua region)."""
+    await ensure_heavy_modules()
+    found = await get_query_regions(update)
+    if found is None: return
+    entry, regions = found
+    sto = context.args[0].upper() if context.args else None
+    m = next((report['sto'][sto] for _, report in regions if sto in report['sto']), None)
+    if m is None:
+        available = sorted(s for _, report in regions for s in report['sto'])
+        await update.message.reply_text(f"❌ Format: /sto <STO>. STO tersedia: {', '.join(available)}")
+        return
+    sections = "\n\n".join(format_report_section(title, m) for title in REPORT_SECTIONS)
+    await update.message.reply_text(f"{query_header(entry, f'STO {sto}')}Total WO: {int(m['RE HI'])}\n\n{sections}")
+
+async def query_kendala(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/kendala [WITEL]"""
+    await ensure_heavy_modules()
+    found = await get_query_regions(update, context.args[0] if context.args else None)
+    if found is None: return
+    await update.message.reply_text(format_query_reply(*found, "WO Kendala HI", REPORT_SECTIONS['WO Kendala HI']))
+
+async def query_manja(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/manja [WITEL]"""
+    await ensure_heavy_modules()
+    found = await get_query_regions(update, context.args[0] if context.args else None)
+    if found is None: return
+    await update.message.reply_text(format_query_reply(*found, "Manja", REPORT_SECTIONS['Manja']))
+
+async def query_ps(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/ps [WITEL] (hari ini) atau /ps mtd [WITEL]."""
+    await ensure_heavy_modules()
+    args = list(context.args or [])
+    period = args.pop(0).lower() if args and args[0].lower() in PS_QUERY_ITEMS else 'hi'
+    if len(args) > 1:
+        await update.message.reply_text("❌ Format: /ps [WITEL] | /ps mtd [WITEL]")
+        return
+    found = await get_query_regions(update, args[0] if args else None)
+    if found is None: return
+    await update.message.reply_text(format_query_reply(*found, f"PS {period.upper()}", PS_QUERY_ITEMS[period]))
+
+async def query_ringkasan(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/ringkasan [WITEL] — ringkasan metrik harian (teks yang sama dengan di gambar dashboard)."""
+    await ensure_heavy_modules()
+    found = await get_query_regions(update, context.args[0] if context.args else None)
+    if found is None: return
+    await update.message.reply_text(format_regions_reply(*found, "Ringkasan", lambda report: create_summary_text(report['status_counts'])))
+
+def is_wonum_callback(data) -> bool:
+    return isinstance(data, tuple) and len(data) == 5 and data[0] == 'wonum'
+
+async def wonum_drilldown(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tombol drill-down: STO -> status -> halaman WONUM, dijawab dari index in-memory."""
+    await ensure_heavy_modules()
+    query = update.callback_query
+    _, key, sto, status, page = query.data
+    entry = wonum_index_get(key)
+    if entry is None or (sto is not None and sto not in entry['details']):
+        await query.answer("⌛ Data drill-down sudah kadaluarsa. Kirim ulang file.", show_alert=True)
+        return
+    await query.answer()
+
+    if sto is None:
+        text, markup = f"📋 WONUM {entry['date'].strftime('%d/%m/%Y')}\nPilih STO:", wonum_sto_keyboard(key, entry)
+    elif status is None or (sto, status) not in entry['pages']:
+        text, markup = wonum_status_view(key, entry, sto)
+    else:
+        text, markup = wonum_page_view(key, entry, sto, status, page)
+
+    # Klik dari foto dashboard membuka pesan teks baru; navigasi berikutnya mengedit pesan itu
+    if query.message.photo:
+        await query.message.reply_text(text, reply_markup=markup)
+    else:
+        await query.edit_message_text(text, reply_markup=markup)
+
+async def profile_next_upload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/profile (admin): upload berikutnya di chat ini dijalankan di bawah cProfile."""
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        await update.message.reply_text("⛔ Command ini khusus admin.")
+        return
+    _profile_armed.add(update.effective_chat.id)
+    await update.message.reply_text("🔬 Upload berikutnya di chat ini akan diprofil (cProfile), hasilnya dikirim sebagai profile.txt.")
+
+async def expired_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Data tombol sudah hilang dari cache callback (mis. bot restart)
+    await update.callback_query.answer("⌛ Tombol sudah kadaluarsa. Kirim ulang file.", show_alert=True)
+
+async def mark_superseded(send) -> None:
+    """Kirim / edit pesan penanda upload antri yang digantikan upload lebih baru."""
+    try:
+        await send("⏭️ Digantikan upload yang lebih baru.")
+    except Exception as e:
+        logger.warning(f"Gagal update pesan antrian: {e}")
 
 async def handle_excel_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     doc = update.message.document
-    if not (doc.file_name.endswith('.xls') or doc.file_name.endswith('.xlsx')):
-        await update.message.reply_text("❌ Format file harus Excel.")
+    file_name = (doc.file_name or "").lower()
+    is_csv = file_name.endswith(CSV_EXTENSIONS)
+    if not (is_csv or file_name.endswith(EXCEL_EXTENSIONS)):
+        await update.message.reply_text("❌ Format file harus Excel (.xls/.xlsx) atau CSV (.csv/.csv.gz).")
+        return
+
+    chat_id = update.effective_chat.id
+    job = {'update': update, 'context': context, 'started': False, 'superseded': False, 'queued_msg': None}
+    old = enqueue_upload(chat_id, job)
+    if old is False:
+        stats = upload_queue_stats()
+        logger.warning(f"⛔ Antrian upload penuh ({stats['queued']}/{UPLOAD_QUEUE_MAX}), upload chat {chat_id} ditolak")
+        await update.message.reply_text("⛔ Antrian upload sedang penuh. Coba kirim ulang beberapa menit lagi.")
+        return
+    if old:
+        logger.info(f"⏭️ Upload antri chat {chat_id} digantikan upload terbaru")
+        # Pesan antrian job lama belum terkirim -> handler job lama yang menandainya
+        if old['queued_msg']: await mark_superseded(old['queued_msg'].edit_text)
+    # Status job bisa berubah di setiap await: mulai diproses atau digantikan upload lain
+    if job['started']: return
+    if job['superseded']:
+        await mark_superseded(update.message.reply_text)
         return
 
+    pos = upload_queue_position(chat_id)
+    logger.info(f"🕒 Upload chat {chat_id} antri di posisi {pos} ({upload_queue_stats()})")
+    queued_msg = await update.message.reply_text(f"🕒 Dalam antrian, posisi {pos}.")
+    if job['superseded']:
+        await mark_superseded(queued_msg.edit_text)
+    elif job['started']:
+        # Job sudah mulai selama pesan antrian dikirim
+        try: await queued_msg.delete()
+        except Exception: pass
+    else:
+        job['queued_msg'] = queued_msg
+
+async def process_upload(update: Update, context: ContextTypes.DEFAULT_TYPE, queue_wait: float = 0.0) -> None:
+    """Proses satu upload (dipanggil dari antrian): parsing, Sheet, dashboard & text report."""
+    doc = update.message.document
+    file_name = (doc.file_name or "").lower()
+    is_csv = file_name.endswith(CSV_EXTENSIONS)
+    chat_id = update.effective_chat.id
+    profiling = chat_id in _profile_armed
+    _profile_armed.discard(chat_id)
+    # Durasi stage event loop; stage worker digabung dari result['timings']
+    stages, profiles, t_job = {}, [], time.perf_counter()
+    summary = {'chat_id': chat_id, 'file': doc.file_name, 'size_kb': round((doc.file_size or 0) / 1024, 1),
+               'queue_wait_s': round(queue_wait, 3), 'status': 'error', 'rows': 0, 'worker_peak_rss_mb': 0.0,
+               'stage_rows': {}, 'stage_peak_rss_mb': {}}
+
+    async def pool(stage: str, func, *args):
+        # Jalankan di process pool (opsional di bawah cProfile) & catat durasinya termasuk IPC
+        t0 = time.perf_counter()
+        if profiling:
+            res, text = await run_in_process_pool(profiled_call, func, *args)
+            profiles.append(f"===== {func.__name__} =====\n{text}")
+        else:
+            res = await run_in_process_pool(func, *args)
+        if stage: stages[stage] = time.perf_counter() - t0
+        return res
+
     proc_msg = await update.message.reply_text("⏳ Memproses Dashboard & Sheet...")
+    done = []
     try:
-        f = await context.bot.get_file(doc.file_id)
-        f_bytes = io.BytesIO(); await f.download_to_memory(f_bytes); f_bytes.seek(0)
-        df = pd.read_excel(f_bytes)
-        
-        cols = ['STO', 'STATUS', 'ERRORCODE', 'SUBERRORCODE', 'SCORDERNO']
-        for c in cols: 
-            if c in df.columns: df[c] = df[c].astype(str).str.upper().str.strip()
+        await ensure_heavy_modules()
+        ts = update.message.date.astimezone(WIB_TZ)
+        # CSV selalu di-stream (tanpa DataFrame penuh), cache hanya untuk Excel
+        use_cache = ENABLE_UPLOAD_CACHE and not is_csv
+        # Index cache & utime = disk I/O, jalan di thread agar event loop tidak ter-block
+        cache_path = await asyncio.to_thread(upload_cache_lookup, doc.file_unique_id) if use_cache else None
+        result = None
+        if cache_path:
+            # File yang sama pernah diproses: lewati download & read_excel
+            logger.info(f"♻️ Cache upload HIT (file_unique_id={doc.file_unique_id})")
+            done.append("File dari cache")
+            await edit_progress(proc_msg, done, "Hitung metrik")
+            try:
+                result = await pool('analyze', analyze_cached, cache_path, ts)
+            except FileNotFoundError:
+                # Cache dievict antara lookup & baca: proses ulang dari file Telegram
+                logger.warning(f"⚠️ Cache upload hilang sebelum dibaca ({cache_path}), download ulang")
+                done.clear()
+        if result is None:
+            t0 = time.perf_counter()
+            f = await context.bot.get_file(doc.file_id)
+            f_bytes = io.BytesIO(); await f.download_to_memory(f_bytes)
+            file_bytes = f_bytes.getvalue(); del f_bytes
+            stages['download'] = time.perf_counter() - t0
+            done.append("Download file")
+            await edit_progress(proc_msg, done, "Parsing & hitung metrik")
 
-        df['STATUSDATE'] = pd.to_datetime(df['STATUSDATE'], errors='coerce')
-        valid = df.dropna(subset=['STATUSDATE'])
+            # Parsing + semua agregasi jalan di process pool, hasilnya agregat kecil
+            if is_csv:
+                compression = 'gzip' if file_name.endswith('.gz') else None
+                result = await pool('analyze', analyze_csv_upload, file_bytes, ts, compression)
+            elif use_cache:
+                content_hash = await asyncio.to_thread(lambda: hashlib.sha256(file_bytes).hexdigest())
+                cache_path = upload_cache_path(content_hash)
+                try:
+                    await asyncio.to_thread(os.utime, cache_path)
+                    logger.info(f"♻️ Cache upload HIT (hash={content_hash[:12]})")
+                    result = await pool('analyze', analyze_cached, cache_path, ts)
+                except FileNotFoundError:
+                    logger.info(f"📥 Cache upload MISS (file_unique_id={doc.file_unique_id})")
+                    result = await pool('analyze', analyze_upload, file_bytes, ts, cache_path)
+                await asyncio.to_thread(upload_cache_register, doc.file_unique_id, content_hash)
+            else:
+                result = await pool('analyze', analyze_upload, file_bytes, ts)
+            del file_bytes
+        summary['rows'] = result['rows']
+        summary['stage_rows'].update(dict.fromkeys([*result['timings'], 'analyze'], result['rows']))
+        summary['stage_peak_rss_mb']['analyze'] = round(result['peak_rss_mb'], 1)
+        summary['memory_budget_ok'] = result['memory_budget_ok']
+        if result['memory_budget_ok'] is False: retire_process_pool()
+        done.append(f"Parsing & hitung metrik ({result['rows']} baris, {sum(result['timings'].values()):.1f}s)")
+        # Dipecah per region sekali; dipakai query chat, Sheet & dashboard
+        parts = partition_result(result)
+        remember_chat_report(chat_id, parts, ts)
         
-        if not valid.empty:
-            latest = valid['STATUSDATE'].dt.date.max()
-            daily = valid[valid['STATUSDATE'].dt.date == latest].copy()
-            ts = update.message.date.astimezone(timezone(timedelta(hours=7)))
-            
-            # 1. Kirim Image Dashboard
-            img = create_integrated_dashboard(daily, ts, daily['STATUS'].value_counts())
-            await update.message.reply_photo(InputFile(img, filename="dash.png"), caption=f"Report {latest.strftime('%d/%m/%Y')}")
+        if ENABLE_SNAPSHOT_STORE:
+            run_in_background(record_snapshot(result, ts))
 
-            # 2. Kirim Text Report Detail (FITUR BARU)
-            detailed_text = create_detailed_text_report(df, ts)
-            await update.message.reply_text(detailed_text)
-        
-        # 3. Google Sheets
+        # Google Sheets jalan di background: dashboard & text report tidak menunggu
         if ENABLE_GOOGLE_SHEETS:
-            _, log, details = await process_kpro_logic(df)
-            if log: await update.message.reply_text(log)
-            
-            # (Opsional) Detail Micro Lama (List WO) bisa dikomentari jika tidak diperlukan lagi
-            # karena sudah ada Text Report baru. Saya biarkan aktif sebagai lampiran.
-            if details:
-                 # Jika ingin mematikan list panjang, comment block ini
-                 pass 
+            run_in_background(send_kpro_update(update.message, parts, ts))
+
+        if result['latest'] is not None:
+            latest = result['latest']
+            await edit_progress(proc_msg, done, "Render dashboard")
+
+            # Dashboard semua region dirender paralel di process pool dari satu hasil parsing
+            t0 = time.perf_counter()
+            renders = await asyncio.gather(*(pool(None, render_dashboard_png, part['dashboard_counts'], ts, region['name']) for region, part in parts))
+            stages['render_dashboard'] = time.perf_counter() - t0
+            pngs = [r['png'] for r in renders]
+            summary['stage_rows']['render_dashboard'] = sum(len(part['dashboard_counts']) for _, part in parts)
+            summary['stage_peak_rss_mb']['render_dashboard'] = round(max(r['peak_rss_mb'] for r in renders), 1)
+            summary['stage_rows']['text_report'] = sum(len(part['metrics']) for _, part in parts)
+            stages['send_dashboard'] = stages['text_report'] = stages['send_text_report'] = 0.0
+
+            for (region, part), png in zip(parts, pngs):
+                label = "" if len(parts) == 1 else f" {region['name']}"
+                # 1. Kirim Image Dashboard
+                t0 = time.perf_counter()
+                # Tombol drill-down WONUM (STO -> status -> daftar) langsung di pesan dashboard
+                wonum_key = f"{update.message.chat_id}:{update.message.message_id}" + (f":{region['name']}" if label else "")
+                markup = wonum_sto_keyboard(wonum_key, wonum_index_get(wonum_key)) if wonum_index_put(wonum_key, part['wonum_details'], ts) else None
+                await update.message.reply_photo(InputFile(io.BytesIO(png), filename="dash.png"), caption=f"Report{label} {latest.strftime('%d/%m/%Y')}", reply_markup=markup)
+                stages['send_dashboard'] += time.perf_counter() - t0
+
+                # 2. Kirim Text Report Detail
+                t0 = time.perf_counter()
+                detailed_text = create_detailed_text_report(None, ts, part['metrics'], region['name'])
+                stages['text_report'] += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                await update.message.reply_text(detailed_text)
+                stages['send_text_report'] += time.perf_counter() - t0
+            done.append("Dashboard")
+            done.append("Text report")
+        summary['status'] = 'ok'
+        stages = {**result['timings'], **stages}
 
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Error: {e}")
     finally:
-        await proc_msg.delete()
+        try: await proc_msg.delete()
+        except Exception as e: logger.warning(f"Gagal menghapus pesan progress: {e}")
+        summary['seconds'] = round(time.perf_counter() - t_job, 3)
+        summary['timings'] = {k: round(v, 4) for k, v in stages.items()}
+        summary['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        summary['worker_peak_rss_mb'] = max(summary['stage_peak_rss_mb'].values(), default=0.0)
+        record_job(summary)
+        if profiles:
+            report = f"Profil upload {doc.file_name} ({summary['rows']} baris, {summary['seconds']}s)\n\n" + "\n".join(profiles)
+            await update.message.reply_document(InputFile(io.BytesIO(report.encode()), filename="profile.txt"), caption="🔬 cProfile (top kumulatif per stage worker)")
 
 # ==========================================
-# 6. APP SETUP
+# 8. APP SETUP
 # ==========================================
-ptb = Application.builder().token(BOT_TOKEN).request(HTTPXRequest(read_timeout=60, connect_timeout=60)).build()
+# concurrent_updates: tiap update diproses sebagai task terpisah, upload besar tidak menahan update lain
+# arbitrary_callback_data: tombol inline membawa tuple Python (drill-down WONUM)
+ptb = Application.builder().token(BOT_TOKEN).request(HTTPXRequest(read_timeout=60, connect_timeout=60)).concurrent_updates(True).arbitrary_callback_data(True).build()
+
+async def ensure_webhook() -> bool:
+    """set_webhook hanya jika URL di getWebhookInfo berbeda. Return True jika webhook diubah."""
+    target = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
+    info = await ptb.bot.get_webhook_info()
+    if info.url == target:
+        logger.info("✅ Webhook sudah terdaftar, set_webhook dilewati.")
+        return False
+    await ptb.bot.set_webhook(target)
+    logger.info(f"🔗 Webhook di-set ke {target} (sebelumnya: {info.url or '-'})")
+    return True
+
+async def start_bot() -> None:
+    """Initialize/start ptb & cek webhook di background (dicoba ulang jika Telegram belum terjangkau)."""
+    attempt = 0
+    while True:
+        try:
+            await ptb.initialize()
+            if not ptb.running: await ptb.start()
+            await ensure_webhook()
+            break
+        except Exception as e:
+            delay = min(BOT_STARTUP_RETRY_MAX_SECONDS, 2 ** attempt)
+            logger.error(f"❌ Startup bot gagal: {e}. Coba lagi dalam {delay:.0f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+    mark_startup('bot_ready')
+    # Login Google & buka koneksi Sheets agar upload pertama tidak menunggu OAuth
+    await open_sheets_session()
+
+def register_handlers(application: Application) -> None:
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("trend", trend))
+    application.add_handler(CommandHandler("sto", query_sto))
+    application.add_handler(CommandHandler("kendala", query_kendala))
+    application.add_handler(CommandHandler("manja", query_manja))
+    application.add_handler(CommandHandler("ps", query_ps))
+    application.add_handler(CommandHandler("ringkasan", query_ringkasan))
+    application.add_handler(CommandHandler("profile", profile_next_upload))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_excel_file))
+    application.add_handler(CallbackQueryHandler(wonum_drilldown, pattern=is_wonum_callback))
+    application.add_handler(CallbackQueryHandler(expired_callback, pattern=InvalidCallbackData))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    ptb.add_handler(CommandHandler("start", start))
-    ptb.add_handler(MessageHandler(filters.Document.ALL, handle_excel_file))
-    await ptb.initialize(); await ptb.start()
-    await ptb.bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}")
+    register_handlers(ptb)
+    # Semua yang butuh jaringan / import berat jalan di background: / & webhook langsung dilayani,
+    # update yang masuk sebelum ptb start menunggu di update_queue
+    bot_startup = asyncio.create_task(start_bot())
+    if PRELOAD_HEAVY_MODULES: run_in_background(preload_after_first_response())
+    mark_startup('lifespan')
     yield
-    await ptb.stop(); await ptb.shutdown()
+    bot_startup.cancel()
+    await close_sheets_session()
+    if ptb.running: await ptb.stop()
+    await ptb.shutdown()
+    shutdown_process_pool()
 
 app = FastAPI(lifespan=lifespan)
 @app.post(WEBHOOK_PATH)
 async def webhook(req: Request):
-    await ptb.process_update(Update.de_json(await req.json(), ptb.bot))
+    # Ack langsung ke Telegram; update diproses di background oleh ptb (update_queue)
+    update = Update.de_json(await req.json(), ptb.bot)
+    # arbitrary_callback_data: UUID di callback_data diganti data aslinya (seperti webhook PTB)
+    ptb.bot.insert_callback_data(update)
+    await ptb.update_queue.put(update)
+    mark_startup('first_response')
     return Response(status_code=200)
 @app.get("/")
-async def root(): return {"status": "ok"}
+async def root():
+    mark_startup('first_response')
+    return {"status": "ok"}
+@app.get("/queue")
+async def queue_status(): return upload_queue_stats()
+@app.get("/metrics")
+async def metrics(): return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+if multiprocessing.parent_process() is None: mark_startup('import')
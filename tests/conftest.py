@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+
+# Diset sebelum import smokeweed: tanpa cache/store di disk & tanpa Google Sheets asli
+os.environ.setdefault("ENABLE_UPLOAD_CACHE", "0")
+os.environ.setdefault("ENABLE_SNAPSHOT_STORE", "0")
+os.environ.setdefault("SHEETS_ACCESS_TOKEN", "test")
+os.environ.setdefault("DASHBOARD_RENDER_CACHE_DIR", tempfile.mkdtemp(prefix="smokeweed-test-renders-"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import smokeweed as sw
+from benchmark import StubBot, StubMessage, generate_export
+
+REFERENCE = datetime(2026, 1, 15, 14, 0)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: export ukuran budget (ratusan ribu baris); lewati dengan -m 'not slow'")
+
+
+@pytest.fixture
+def inline_pool(monkeypatch):
+    """Stage process pool dijalankan langsung di proses test (tanpa spawn worker)."""
+    async def run_inline(func, *args): return func(*args)
+    monkeypatch.setattr(sw, "run_in_process_pool", run_inline)
+
+
+@pytest.fixture
+def export_file(tmp_path):
+    """Tulis export sintetis ke file, return path-nya."""
+    def write(rows: int = 300, fmt: str = "xlsx", seed: int = 1) -> str:
+        path = str(tmp_path / f"bima-{rows}-{seed}.{fmt}")
+        df = generate_export(rows, seed, REFERENCE)
+        if fmt == "xlsx": df.to_excel(path, index=False)
+        else: df.to_csv(path, index=False)
+        return path
+    return write
+
+
+class RecordingMessage(StubMessage):
+    """StubMessage yang juga menyimpan teks balasan."""
+    def __init__(self, path: str, reference: datetime):
+        super().__init__(path, reference)
+        self.texts = []
+
+    async def reply_text(self, text, **kwargs):
+        self.texts.append(text)
+        return await super().reply_text(text, **kwargs)
+
+
+@pytest.fixture
+def run_upload(inline_pool, monkeypatch):
+    """Jalankan process_upload untuk satu file dengan Telegram stub, return RecordingMessage."""
+    monkeypatch.setattr(sw, "ENABLE_GOOGLE_SHEETS", False)
+    def run(path: str, bot=None) -> RecordingMessage:
+        message = RecordingMessage(path, REFERENCE)
+        update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=1), effective_user=SimpleNamespace(id=1))
+        asyncio.run(sw.process_upload(update, SimpleNamespace(bot=bot or StubBot())))
+        return message
+    return run
+
+
+@pytest.fixture
+def sheets_server(monkeypatch):
+    """
+    Fake Sheets API (httpx.MockTransport). Isi server.responses dengan status / exception
+    yang dikembalikan berurutan; setelah habis semua request sukses. server.requests berisi
+    body tiap request.
+    """
+    import json
+    import httpx
+
+    server = SimpleNamespace(requests=[], responses=[])
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        server.requests.append(body)
+        if server.responses:
+            response = server.responses.pop(0)
+            if isinstance(response, Exception): raise response
+            return response
+        return httpx.Response(200, json={'totalUpdatedCells': len(body['data'])})
+
+    for name in ["_last_written", "_last_full_write", "_last_flush", "_pending_cells", "_pending_flush", "_pending_uploads", "_flush_locks"]:
+        monkeypatch.setattr(sw, name, {})
+    monkeypatch.setattr(sw, "_sheets_http", httpx.AsyncClient(base_url=sw.SHEETS_API_BASE, transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(sw, "_sheets_semaphore", asyncio.Semaphore(sw.SHEETS_MAX_CONCURRENCY))
+    return server
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+from benchmark import generate_export
+
+
+def baseline_table(daily_df: pd.DataFrame):
+    """Tabel dashboard versi awal (loop per status/STO di create_integrated_dashboard)."""
+    stos = sorted(daily_df['STO'].unique())
+    table_data, row_styles = [], {}
+    for status in sw.DASHBOARD_STATUS_ORDER:
+        if status not in daily_df['STATUS'].unique(): continue
+        status_df = daily_df[daily_df['STATUS'] == status]
+        table_data.append({'KATEGORI': status, **{sto: len(status_df[status_df['STO'] == sto]) for sto in stos}})
+        row_styles[len(table_data) - 1] = {'level': 1, 'status': status}
+        if status == 'WORKFAIL':
+            for error_code, error_group in status_df.groupby('ERRORCODE'):
+                if str(error_code).upper() in ['NAN', 'N/A']: continue
+                table_data.append({'KATEGORI': f"  ↳ {error_code}", **{sto: len(error_group[error_group['STO'] == sto]) for sto in stos}})
+                row_styles[len(table_data) - 1] = {'level': 2, 'status': status, 'error': error_code}
+                for sub_error_code, sub_group in error_group.groupby('SUBERRORCODE'):
+                    if str(sub_error_code).upper() in ['NAN', 'N/A']: continue
+                    row = {'KATEGORI': f"    → {sub_error_code}", **{sto: len(sub_group[sub_group['STO'] == sto]) for sto in stos}}
+                    if sum(list(row.values())[1:]) > 0:
+                        table_data.append(row)
+                        row_styles[len(table_data) - 1] = {'level': 3, 'status': status}
+    if not table_data: return None
+
+    display_df = pd.DataFrame(table_data, columns=['KATEGORI'] + stos).fillna(0)
+    display_df['Grand Total'] = display_df[stos].sum(axis=1)
+    total_source = daily_df[daily_df['STATUS'].isin([r['KATEGORI'] for i, r in enumerate(table_data) if row_styles[i]['level'] == 1])]
+    grand_total = {'KATEGORI': 'Grand Total', **{sto: len(total_source[total_source['STO'] == sto]) for sto in stos}, 'Grand Total': len(total_source)}
+    display_df = pd.concat([display_df, pd.DataFrame([grand_total])], ignore_index=True)
+    row_styles[len(display_df) - 1] = {'level': 0, 'status': 'Total'}
+    return display_df, row_styles, stos
+
+
+def daily_frame(rows: int, seed: int) -> pd.DataFrame:
+    """Export sintetis dinormalisasi seperti pipeline awal (str upper, NaN -> 'NAN')."""
+    df = generate_export(rows, seed)[sw.DASHBOARD_KEYS]
+    return df.apply(lambda col: col.astype(str).str.upper().str.strip().replace('NONE', 'NAN'))
+
+
+def assert_same_table(daily_df: pd.DataFrame):
+    expected = baseline_table(daily_df)
+    actual = sw.build_dashboard_table(sw.aggregate_dashboard_counts(daily_df))
+    if expected is None:
+        assert actual is None
+        return
+    pd.testing.assert_frame_equal(actual[0], expected[0], check_dtype=False)
+    assert actual[1] == expected[1]
+    assert actual[2] == expected[2]
+
+
+@pytest.mark.parametrize("rows,seed", [(3000, 1), (200, 2), (20, 3)])
+def test_table_matches_baseline(rows, seed):
+    assert_same_table(daily_frame(rows, seed))
+
+
+def test_sto_with_only_unlisted_status_keeps_zero_column():
+    daily = daily_frame(500, 4)
+    extra = pd.DataFrame({'STATUS': ['OTHER'] * 3, 'ERRORCODE': 'NAN', 'SUBERRORCODE': 'NAN', 'STO': 'ZZZ'})
+    daily = pd.concat([daily, extra], ignore_index=True)
+    assert_same_table(daily)
+    display_df, _, stos = sw.build_dashboard_table(sw.aggregate_dashboard_counts(daily))
+    assert 'ZZZ' in stos
+    assert (display_df['ZZZ'] == 0).all()
+
+
+def test_only_unlisted_statuses_gives_empty_table():
+    daily = pd.DataFrame({'STATUS': ['OTHER'], 'ERRORCODE': ['NAN'], 'SUBERRORCODE': ['NAN'], 'STO': ['CID']})
+    assert_same_table(daily)
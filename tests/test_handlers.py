@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import smokeweed as sw
+
+
+class PreloadAwaited(Exception):
+    pass
+
+
+@pytest.mark.parametrize("handler", [
+    sw.trend, sw.query_sto, sw.query_kendala, sw.query_manja, sw.query_ps, sw.query_ringkasan, sw.wonum_drilldown,
+])
+def test_handler_waits_for_heavy_modules_first(monkeypatch, handler):
+    # Handler yang memakai pandas/numpy/matplotlib tidak boleh jalan sebelum preload selesai
+    async def ensure(): raise PreloadAwaited
+    monkeypatch.setattr(sw, "ensure_heavy_modules", ensure)
+    update = SimpleNamespace(message=None, callback_query=None, effective_chat=SimpleNamespace(id=1))
+    with pytest.raises(PreloadAwaited):
+        asyncio.run(handler(update, SimpleNamespace(args=[])))
+
+
+def test_sheets_session_waits_for_heavy_modules_first(monkeypatch):
+    # Login Google memakai modul google-auth lazy yang juga di-exec thread preload
+    async def ensure(): raise PreloadAwaited
+    monkeypatch.setattr(sw, "ensure_heavy_modules", ensure)
+    monkeypatch.setattr(sw, "ENABLE_GOOGLE_SHEETS", True)
+    monkeypatch.setattr(sw, "get_sheets_access_token", lambda: pytest.fail("login sebelum preload"))
+    with pytest.raises(PreloadAwaited):
+        asyncio.run(sw.open_sheets_session())
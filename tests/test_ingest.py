@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+from benchmark import generate_export
+from conftest import REFERENCE
+
+TS = REFERENCE.replace(tzinfo=sw.WIB_TZ)
+
+
+def as_frame(counts: pd.Series) -> pd.DataFrame:
+    frame = counts.rename('N').reset_index()
+    return frame.astype({c: str for c in sw.DASHBOARD_KEYS}).sort_values(sw.DASHBOARD_KEYS, ignore_index=True)
+
+
+def metrics_frame(metrics: pd.DataFrame) -> pd.DataFrame:
+    return metrics.set_axis(metrics.index.astype(str)).sort_index()
+
+
+def assert_same_result(a: dict, b: dict):
+    assert a['rows'] == b['rows']
+    assert a['latest'] == b['latest']
+    pd.testing.assert_frame_equal(metrics_frame(a['metrics']), metrics_frame(b['metrics']), check_dtype=False)
+    pd.testing.assert_frame_equal(as_frame(a['dashboard_counts']), as_frame(b['dashboard_counts']), check_dtype=False)
+    assert a['wonum_details'] == b['wonum_details']
+
+
+def write_both(df: pd.DataFrame, tmp_path) -> tuple:
+    xlsx, csv = tmp_path / "export.xlsx", tmp_path / "export.csv"
+    df.to_excel(xlsx, index=False)
+    df.to_csv(csv, index=False)
+    return xlsx.read_bytes(), csv.read_bytes()
+
+
+@pytest.mark.parametrize("date_format", [None, "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M"])
+def test_csv_and_excel_give_same_result(date_format, tmp_path, monkeypatch):
+    # Chunk kecil: tiap chunk diawali tanggal yang berbeda (ambigu / tidak)
+    monkeypatch.setattr(sw, "CSV_CHUNK_ROWS", 37)
+    monkeypatch.setattr(sw, "EXPORT_DATE_DAYFIRST", date_format == "%d/%m/%Y %H:%M")
+    df = generate_export(400, 5, REFERENCE)
+    if date_format:
+        for col in ['STATUSDATE', 'DATECREATED']:
+            df[col] = pd.to_datetime(df[col]).dt.strftime(date_format)
+    xlsx, csv = write_both(df, tmp_path)
+    excel = sw.analyze_upload(xlsx, TS)
+    assert_same_result(sw.analyze_csv_upload(csv, TS), excel)
+    # Tanggal teks ambigu tetap dibaca sesuai EXPORT_DATE_DAYFIRST
+    assert excel['latest'] == REFERENCE.date()
+
+
+def test_csv_gzip_matches_plain_csv(tmp_path):
+    df = generate_export(300, 6, REFERENCE)
+    df.to_csv(tmp_path / "export.csv.gz", index=False)
+    df.to_csv(tmp_path / "export.csv", index=False)
+    assert_same_result(
+        sw.analyze_csv_upload((tmp_path / "export.csv.gz").read_bytes(), TS, 'gzip'),
+        sw.analyze_csv_upload((tmp_path / "export.csv").read_bytes(), TS),
+    )
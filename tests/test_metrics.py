@@ -0,0 +1,59 @@
+import smokeweed as sw
+from benchmark import StubMessage
+
+
+def test_peak_rss_is_reset_per_stage():
+    block = bytearray(300 * 1024 * 1024)
+    block[::4096] = b'x' * len(block[::4096])
+    del block
+    high = sw.peak_rss_mb()
+    sw.reset_peak_rss()
+    assert sw.peak_rss_mb() < high - 200
+
+
+def test_job_recorded_when_progress_delete_fails(run_upload, export_file, monkeypatch):
+    class FailingDelete(StubMessage.Sent):
+        async def delete(self): raise RuntimeError("message to delete not found")
+    async def reply_text(self, text, **kwargs):
+        self.sent.append('text')
+        return FailingDelete()
+    monkeypatch.setattr(StubMessage, "reply_text", reply_text)
+    jobs = []
+    monkeypatch.setattr(sw, "record_job", jobs.append)
+    run_upload(export_file())
+    assert [job['status'] for job in jobs] == ['ok']
+    assert jobs[0]['worker_peak_rss_mb'] > 0
+
+
+def test_metrics_expose_last_job_worker_peak(monkeypatch):
+    monkeypatch.setattr(sw, "_job_metrics", {**sw._job_metrics, 'last_worker_peak_rss_mb': 123.4})
+    assert "smokeweed_last_job_worker_peak_rss_mb 123.4" in sw.render_metrics()
+
+
+def test_peak_and_rows_recorded_per_stage(run_upload, export_file, monkeypatch):
+    jobs = []
+    monkeypatch.setattr(sw, "record_job", jobs.append)
+    run_upload(export_file())
+    job = jobs[0]
+    assert {'analyze', 'render_dashboard'} <= job['stage_peak_rss_mb'].keys()
+    assert all(peak > 0 for peak in job['stage_peak_rss_mb'].values())
+    assert job['worker_peak_rss_mb'] == max(job['stage_peak_rss_mb'].values())
+    assert job['stage_rows']['analyze'] == job['rows']
+    assert 0 < job['stage_rows']['render_dashboard'] < job['rows']
+    assert job['stage_rows']['text_report'] > 0
+
+
+def test_metrics_expose_stage_peak_and_rows(monkeypatch):
+    for name in ("_stage_metrics", "_stage_rows", "_stage_peaks"):
+        monkeypatch.setattr(sw, name, {})
+    monkeypatch.setattr(sw, "_job_metrics", dict(sw._job_metrics))
+    summary = {'status': 'ok', 'rows': 50, 'seconds': 1.0, 'timings': {'analyze': 0.5, 'render_dashboard': 0.2},
+               'worker_peak_rss_mb': 210.0, 'stage_rows': {'analyze': 50, 'render_dashboard': 7},
+               'stage_peak_rss_mb': {'analyze': 180.0, 'render_dashboard': 210.0}}
+    sw.record_job(summary)
+    sw.record_job({**summary, 'stage_peak_rss_mb': {'analyze': 150.0, 'render_dashboard': 190.0}})
+    text = sw.render_metrics()
+    assert 'smokeweed_stage_rows_total{stage="render_dashboard"} 14' in text
+    assert 'smokeweed_stage_last_rows{stage="analyze"} 50' in text
+    assert 'smokeweed_stage_peak_rss_mb{stage="render_dashboard"} 210.0' in text
+    assert 'smokeweed_stage_last_peak_rss_mb{stage="analyze"} 150.0' in text
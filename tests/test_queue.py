@@ -0,0 +1,60 @@
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+import smokeweed as sw
+
+
+class SentMessage:
+    def __init__(self, text): self.text, self.deleted = text, False
+    async def edit_text(self, text, **kwargs): self.text = text
+    async def delete(self): self.deleted = True
+
+
+class ChatMessage:
+    """Pesan dokumen dari user; reply_text butuh waktu (round-trip ke Telegram)."""
+    def __init__(self, delay: float = 0.02):
+        self.document, self.delay, self.replies = SimpleNamespace(file_name="export.xlsx"), delay, []
+    async def reply_text(self, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        sent = SentMessage(text)
+        self.replies.append(sent)
+        return sent
+
+
+def upload(message) -> SimpleNamespace:
+    return SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=1))
+
+
+@pytest.fixture
+def busy_chat(monkeypatch):
+    """Chat 1 sedang memproses upload lain, jadi upload baru masuk antrian."""
+    monkeypatch.setattr(sw, "_upload_queue", OrderedDict())
+    monkeypatch.setattr(sw, "_running_chats", {1})
+    monkeypatch.setattr(sw, "_upload_stats", {'processed': 0, 'superseded': 0, 'rejected': 0})
+
+
+def test_superseded_while_queue_message_in_flight(busy_chat):
+    first, second = ChatMessage(), ChatMessage()
+    async def later():
+        await asyncio.sleep(0.005)  # upload kedua tiba saat "Dalam antrian" pertama masih dikirim
+        await sw.handle_excel_file(upload(second), None)
+    async def main():
+        await asyncio.gather(sw.handle_excel_file(upload(first), None), later())
+    asyncio.run(main())
+    assert [m.text for m in first.replies] == ["⏭️ Digantikan upload yang lebih baru."]
+    assert [m.text for m in second.replies] == ["🕒 Dalam antrian, posisi 1."]
+    assert sw._upload_queue[1]['update'].message is second
+
+
+def test_superseded_after_queue_message_sent(busy_chat):
+    first, second = ChatMessage(delay=0), ChatMessage(delay=0)
+    async def main():
+        await sw.handle_excel_file(upload(first), None)
+        await sw.handle_excel_file(upload(second), None)
+    asyncio.run(main())
+    assert [m.text for m in first.replies] == ["⏭️ Digantikan upload yang lebih baru."]
+    assert [m.text for m in second.replies] == ["🕒 Dalam antrian, posisi 1."]
+    assert sw._upload_stats['superseded'] == 1
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import json
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+
+
+def region(name, stos, micro):
+    return {**sw.REGIONS[0], 'name': name, 'stos': stos, 'micro_sto_row_map': {sto: i for i, sto in enumerate(micro)}}
+
+
+TWO_REGIONS = [region('BARAT', ['CPP', 'KMY', 'TGR'], ['CPP']), region('TIMUR', ['BKS', 'CKG'], ['BKS', 'CKG'])]
+
+
+def test_partition_filters_wonum_by_region_stos(monkeypatch):
+    monkeypatch.setattr(sw, "REGIONS", TWO_REGIONS)
+    stos = ['BKS', 'CKG', 'CPP', 'KMY', 'TGR']
+    result = {
+        'metrics': pd.DataFrame({'RE HI': range(len(stos))}, index=pd.Index(stos, name='STO')),
+        'dashboard_counts': None,
+        'wonum_details': {sto: {'COMPWORK': [f"WO-{sto}"]} for sto in stos},
+    }
+    for reg, part in sw.partition_result(result):
+        # WONUM, metrik & hitungan dashboard memakai himpunan STO yang sama
+        assert set(part['wonum_details']) == set(reg['stos'])
+        assert set(part['metrics'].index) == set(reg['stos'])
+
+
+def query(handler, *args) -> list:
+    """Jalankan command query di chat 1, return teks balasannya."""
+    texts = []
+    async def reply_text(text, **kwargs): texts.append(text)
+    update = SimpleNamespace(message=SimpleNamespace(reply_text=reply_text), effective_chat=SimpleNamespace(id=1))
+    asyncio.run(handler(update, SimpleNamespace(args=list(args))))
+    return texts
+
+
+def sto_lines(text: str) -> set:
+    return {line[2:].split(':')[0] for line in text.splitlines() if line.startswith('* ')}
+
+
+def test_chat_queries_per_witel(run_upload, export_file, monkeypatch):
+    monkeypatch.setattr(sw, "REGIONS", [region('BARAT', ['CID', 'CPP', 'GBC'], ['CID', 'CPP', 'GBC']), region('TIMUR', ['GBI', 'KMY'], ['GBI', 'KMY'])])
+    monkeypatch.setattr(sw, "_chat_reports", OrderedDict())
+    run_upload(export_file())
+
+    # Default semua witel, satu blok berlabel per region
+    [text] = query(sw.query_kendala)
+    barat, timur = text.split("[BARAT]\n")[1].split("\n\n[TIMUR]\n")
+    assert sto_lines(barat) == {'CID', 'CPP', 'GBC'} and sto_lines(timur) == {'GBI', 'KMY'}
+
+    [text] = query(sw.query_ps, 'mtd', 'timur')
+    assert sto_lines(text) == {'GBI', 'KMY'} and "[BARAT]" not in text
+    [text] = query(sw.query_manja, 'BARAT')
+    assert sto_lines(text) == {'CID', 'CPP', 'GBC'}
+    [text] = query(sw.query_ringkasan, 'timur')
+    assert "Ringkasan Metrik Harian" in text and "[BARAT]" not in text
+    [text] = query(sw.query_sto, 'KMY')
+    assert text.startswith("STO KMY")
+    [text] = query(sw.query_kendala, 'SELATAN')
+    assert text.startswith("❌ Witel tidak dikenal")
+
+
+def test_trend_defaults_to_all_regions(inline_pool, monkeypatch):
+    monkeypatch.setattr(sw, "REGIONS", TWO_REGIONS)
+    index = pd.MultiIndex.from_product([[pd.Timestamp(2026, 1, 15)], ['BKS', 'CPP', 'TGR']], names=['PERIODE', 'STO'])
+    monkeypatch.setattr(sw, "load_trend", lambda start, end, intraday: pd.DataFrame({m: 1 for m in sw.TREND_METRICS}, index=index))
+    charts = []
+    def chart(table, label, intraday, witel):
+        charts.append((sorted(table.index.get_level_values('STO')), witel))
+        return io.BytesIO(b"png")
+    monkeypatch.setattr(sw, "create_trend_chart", chart)
+    async def reply_photo(photo, **kwargs): pass
+    def run(*args):
+        message = SimpleNamespace(date=datetime(2026, 1, 15, 14, 0, tzinfo=sw.WIB_TZ), reply_photo=reply_photo)
+        asyncio.run(sw.trend(SimpleNamespace(message=message), SimpleNamespace(args=list(args))))
+
+    run()
+    run('7d', 'timur')
+    assert charts == [(['BKS', 'CPP', 'TGR'], "BARAT / TIMUR"), (['BKS'], "TIMUR")]
+
+
+def write_regions(tmp_path, entries) -> str:
+    path = tmp_path / "regions.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def region_entry(name, rows, micro=None, **extra):
+    return {'name': name, 'sheet_id': f"sheet-{name}", 'sto_row_map': {sto: 10 + i for i, sto in enumerate(rows)},
+            'micro_sto_row_map': {sto: 5 + i for i, sto in enumerate(micro if micro is not None else rows)}, **extra}
+
+
+def test_load_regions_defaults_and_config(tmp_path):
+    [default] = sw.load_regions(str(tmp_path / "missing.json"))
+    assert default['name'] == sw.DEFAULT_WITEL and default['stos'] is None
+
+    barat, timur = sw.load_regions(write_regions(tmp_path, [
+        region_entry('barat', ['CPP', 'KMY'], ['CPP'], stos=['cpp', 'kmy', 'tgr']),
+        region_entry('timur', ['BKS'], ['BKS', 'CKG']),
+    ]))
+    assert (barat['name'], barat['stos']) == ('BARAT', ['CPP', 'KMY', 'TGR'])
+    assert (timur['name'], timur['stos']) == ('TIMUR', ['BKS', 'CKG'])
+    assert timur['column_index_map'] == sw.KPRO_COLUMN_INDEX_MAP
+
+
+@pytest.mark.parametrize("entries,error", [
+    ([{'name': 'BARAT', 'sheet_id': 'x', 'sto_row_map': {}}], "tanpa field micro_sto_row_map"),
+    ([region_entry('BARAT', ['CPP']), region_entry('TIMUR', ['CPP'])], "STO CPP ada di region BARAT dan TIMUR"),
+    ([region_entry('BARAT', ['CPP']), region_entry('barat', ['KMY'])], "nama region dobel"),
+    ([region_entry('BARAT', ['CPP', 'KMY'], stos=['CPP'])], "STO KMY ada di row map BARAT tapi tidak di stos"),
+    ([region_entry('BARAT', ['CPP'], micro_column_index_map={'FOO': 4})], "status micro tidak dikenal"),
+    ([], "tidak ada region"),
+])
+def test_load_regions_rejects_invalid_config(tmp_path, entries, error):
+    with pytest.raises(ValueError, match=error):
+        sw.load_regions(write_regions(tmp_path, entries))
+
+
+def test_upload_is_partitioned_once(run_upload, export_file, sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "REGIONS", TWO_REGIONS)
+    monkeypatch.setattr(sw, "ENABLE_GOOGLE_SHEETS", True)
+    calls = []
+    partition = sw.partition_result
+    monkeypatch.setattr(sw, "partition_result", lambda result: calls.append(1) or partition(result))
+    message = run_upload(export_file())
+    assert len(calls) == 1
+    assert message.sent.count('photo') == 2
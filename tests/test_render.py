@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+import smokeweed as sw
+from test_dashboard import daily_frame
+from conftest import REFERENCE
+
+TS = REFERENCE.replace(tzinfo=sw.WIB_TZ)
+# Beda piksel yang masih diterima (antialiasing glyph): rata-rata beda abu-abu & porsi
+# piksel yang bedanya jelas terlihat
+MAX_MEAN_DIFF = 2.0
+MAX_VISIBLE_DIFF_FRACTION = 0.01
+
+
+def render(renderer: str, counts: pd.Series, monkeypatch) -> np.ndarray:
+    monkeypatch.setattr(sw, "DASHBOARD_RENDERER", renderer)
+    status_counts = counts.groupby(level='STATUS', observed=True).sum()
+    png = sw.create_integrated_dashboard(None, TS, status_counts, counts).getvalue()
+    return np.asarray(Image.open(io.BytesIO(png)).convert('L'), dtype=float)
+
+
+@pytest.mark.parametrize("rows,seed", [(3000, 1), (60, 2)])
+def test_pillow_matches_matplotlib(rows, seed, monkeypatch):
+    counts = sw.aggregate_dashboard_counts(daily_frame(rows, seed))
+    expected = render('matplotlib', counts, monkeypatch)
+    actual = render('pillow', counts, monkeypatch)
+    assert actual.shape == expected.shape
+    diff = np.abs(actual - expected)
+    assert diff.mean() < MAX_MEAN_DIFF
+    assert (diff > 64).mean() < MAX_VISIBLE_DIFF_FRACTION
+
+
+def test_pillow_failure_falls_back_to_matplotlib(monkeypatch):
+    counts = sw.aggregate_dashboard_counts(daily_frame(300, 3))
+    expected = render('matplotlib', counts, monkeypatch)
+    def broken(*args): raise AttributeError("get_hinting_flag")
+    monkeypatch.setattr(sw, "create_dashboard_pillow", broken)
+    np.testing.assert_array_equal(render('pillow', counts, monkeypatch), expected)
+
+
+def test_matplotlib_flag_skips_pillow(monkeypatch):
+    counts = sw.aggregate_dashboard_counts(daily_frame(300, 3))
+    def unexpected(*args): raise AssertionError("renderer Pillow dipakai")
+    monkeypatch.setattr(sw, "create_dashboard_pillow", unexpected)
+    render('matplotlib', counts, monkeypatch)
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+from benchmark import generate_export
+
+
+def baseline_frame(export: pd.DataFrame) -> pd.DataFrame:
+    """Normalisasi versi awal (handle_excel_file): str upper/strip, tanggal to_datetime."""
+    df = export.copy()
+    for c in ['STO', 'STATUS', 'ERRORCODE', 'SUBERRORCODE', 'SCORDERNO']:
+        df[c] = df[c].astype(str).str.upper().str.strip()
+    for c in sw.DATE_COLUMNS: df[c] = pd.to_datetime(df[c], errors='coerce')
+    return df
+
+
+def baseline_text_report(df: pd.DataFrame, current_dt: datetime) -> str:
+    """create_detailed_text_report versi awal (satu filter len() per metrik)."""
+    today = current_dt.date()
+    df_today = df[df['STATUSDATE'].dt.date == today]
+    df_pi = df[df['STATUS'] == 'STARTWORK']
+    total_wo_hi = len(df[df['DATECREATED'].dt.date == today])
+    fo_aktivasi = len(df_today[df_today['STATUS'].isin(['CONTWORK', 'INSTCOMP', 'PENDWORK'])])
+    acom = len(df_today[df_today['STATUS'].isin(['VALSTART', 'ACOMP', 'ACTCOMP', 'VALCOMP'])])
+    ps_hi = len(df_today[df_today['STATUS'] == 'COMPWORK'])
+    df_kendala = df_today[df_today['STATUS'] == 'WORKFAIL']
+    total_wo_mtd = len(df[(df['DATECREATED'].dt.month == today.month) & (df['DATECREATED'].dt.year == today.year)])
+    ps_mtd = len(df[(df['STATUSDATE'].dt.month == today.month) & (df['STATUSDATE'].dt.year == today.year) & (df['STATUS'] == 'COMPWORK')])
+    ps_re_hi = ps_hi / total_wo_hi * 100 if total_wo_hi > 0 else 0.0
+    ps_re_mtd = ps_mtd / total_wo_mtd * 100 if total_wo_mtd > 0 else 0.0
+    return (
+        f"Fulfillment Endstate Witel JAKPUS\n{sw.format_indo_date(current_dt)}\n--------------------\n\n"
+        f"Total WO: {total_wo_hi}\n\n"
+        f"Aktivasi HI\n* FO AKTIVASI: {fo_aktivasi}\n* ACOM: {acom}\n* PS HI: {ps_hi}\n* Estimasi PS: {ps_hi + acom}\n\n"
+        f"Sisa WO\n* Sisa PI HI (Jam OPS): {len(df_pi[df_pi['STATUSDATE'].dt.hour < 17])}\n"
+        f"* Sisa PI HI (Diluar Jam OPS): {len(df_pi[df_pi['STATUSDATE'].dt.hour >= 17])}\n* PI HI: {len(df_pi)}\n\n"
+        f"Manja\n* H-: {len(df_pi[df_pi['TGL_MANJA'].dt.date < today])}\n* HI: {len(df_pi[df_pi['TGL_MANJA'].dt.date == today])}\n"
+        f"* H+: {len(df_pi[df_pi['TGL_MANJA'].dt.date > today])}\n\n"
+        f"WO Kendala HI\n* Kendala HI: {len(df_kendala)}\n"
+        f"* Teknik: {len(df_kendala[df_kendala['ERRORCODE'].str.contains('TEKNIK', na=False)])}\n"
+        f"* Non Teknik: {len(df_kendala[df_kendala['ERRORCODE'].str.contains('PELANGGAN', na=False)])}\n\n"
+        f"PS/RE\n* PS/RE HI: {ps_re_hi:.1f}%\n* PS/RE MTD: {ps_re_mtd:.1f}%\n\n"
+        f"Last Update BIMA: {current_dt.strftime('%d/%m/%y %H:%M')}"
+    )
+
+
+def baseline_kpro_cells(df: pd.DataFrame, today) -> list:
+    """Cell checkpoint + micro versi awal process_kpro_logic (filter per STO)."""
+    yesterday, seven_days = today - sw.timedelta(days=1), today - sw.timedelta(days=6)
+    cells = []
+    for sto, row in sw.KPRO_STO_ROW_MAP.items():
+        sto_df = df[df['STO'] == sto]
+        is_today = sto_df['STATUSDATE'].dt.date == today
+        val_map = {
+            'RE HI': len(sto_df[sto_df['DATECREATED'].dt.date == today]),
+            'PS ENDSTATE': len(sto_df[is_today & (sto_df['STATUS'] == 'COMPWORK')]),
+            'VALSTART ENDSATATE': len(sto_df[is_today & sto_df['STATUS'].isin(['INSTCOMP', 'ACTCOMP', 'VALCOMP', 'VALSTART'])]),
+            'EST PS H-1': len(sto_df[(sto_df['STATUSDATE'].dt.date == yesterday) & (sto_df['STATUS'] == 'COMPWORK')]),
+            'EST PS W-1': len(sto_df[(sto_df['STATUSDATE'].dt.date >= seven_days) & (sto_df['STATUSDATE'].dt.date <= today) & (sto_df['STATUS'] == 'COMPWORK')]),
+            'MANJA HI': len(sto_df[(sto_df['STATUS'] == 'STARTWORK') & (sto_df['TGL_MANJA'].dt.date == today)]),
+            'LEWAT MANJA': len(sto_df[(sto_df['STATUS'] == 'STARTWORK') & (sto_df['TGL_MANJA'].dt.date < today)]),
+            'KENDALA PELANGGAN': len(sto_df[(sto_df['STATUS'] == 'WORKFAIL') & (sto_df['ERRORCODE'] == 'KENDALA PELANGGAN')]),
+            'KENDALA JARINGAN': len(sto_df[(sto_df['STATUS'] == 'WORKFAIL') & (sto_df['ERRORCODE'] == 'KENDALA TEKNIK')]),
+        }
+        cells += [(sw.KPRO_TARGET_SHEET_NAME, row, sw.KPRO_COLUMN_INDEX_MAP[c], v) for c, v in val_map.items() if c in sw.KPRO_COLUMN_INDEX_MAP]
+
+    today_df = df[df['STATUSDATE'].dt.date == today]
+    for sto, row in sw.KPRO_MICRO_STO_ROW_MAP.items():
+        sto_data, total_wo = today_df[today_df['STO'] == sto], 0
+        for status, col_idx in sw.KPRO_MICRO_COLUMN_INDEX_MAP.items():
+            if status == 'TOTAL WO': continue
+            count = len(sto_data[sto_data['STATUS'] == status]); total_wo += count
+            cells.append((sw.KPRO_MICRO_UPDATE_SHEET_NAME, row, col_idx, count))
+        cells.append((sw.KPRO_MICRO_UPDATE_SHEET_NAME, row, sw.KPRO_MICRO_COLUMN_INDEX_MAP['TOTAL WO'], total_wo))
+    return cells
+
+
+# Tengah bulan, awal bulan (H-1 & W-1 di bulan lalu) dan malam hari (PI di luar jam OPS)
+CASES = [(3000, 1, datetime(2026, 1, 15, 14, 0)), (2000, 2, datetime(2026, 2, 1, 9, 30)), (1500, 3, datetime(2026, 3, 31, 21, 45)), (40, 4, datetime(2026, 1, 15, 14, 0))]
+
+
+@pytest.mark.parametrize("rows,seed,reference", CASES)
+def test_metrics_match_baseline(rows, seed, reference):
+    export = generate_export(rows, seed, reference)
+    current_dt = reference.replace(tzinfo=sw.WIB_TZ)
+    metrics = sw.compute_metrics(sw.normalize_export(export[sw.REPORT_COLUMNS].copy(), {}), current_dt.date())
+    baseline = baseline_frame(export)
+    assert sw.create_detailed_text_report(None, current_dt, metrics) == baseline_text_report(baseline, current_dt)
+    assert sw.build_kpro_cells(metrics) == baseline_kpro_cells(baseline, current_dt.date())
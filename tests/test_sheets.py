@@ -0,0 +1,114 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import httpx
+import pytest
+
+import smokeweed as sw
+from conftest import REFERENCE
+
+TS = REFERENCE.replace(tzinfo=sw.WIB_TZ)
+CELLS = [('REPORT PS INDIHOME', 9, 9, 10), ('REPORT PS INDIHOME', 10, 9, 20)]
+
+
+def written(body: dict) -> dict:
+    return {item['range']: item['values'][0][0] for item in body['data']}
+
+
+def test_lone_upload_is_written_without_waiting(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_COALESCE_SECONDS", 5)
+    t0 = time.perf_counter()
+    assert asyncio.run(sw.submit_sheet_cells("sheet", CELLS, TS)) == (2, 0)
+    assert time.perf_counter() - t0 < 1
+    assert len(sheets_server.requests) == 1
+
+
+def test_uploads_within_window_are_coalesced(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_COALESCE_SECONDS", 0.2)
+    async def main():
+        first = await sw.submit_sheet_cells("sheet", CELLS, TS)
+        later = [(name, row, col, value + 1) for name, row, col, value in CELLS]
+        newest = [(name, row, col, value + 2) for name, row, col, value in CELLS]
+        t0 = time.perf_counter()
+        rest = await asyncio.gather(
+            sw.submit_sheet_cells("sheet", later, TS + timedelta(hours=1)),
+            sw.submit_sheet_cells("sheet", newest, TS + timedelta(hours=2)),
+        )
+        return first, rest, time.perf_counter() - t0
+    first, rest, waited = asyncio.run(main())
+    assert first == (2, 0)
+    assert rest == [(2, 0), (2, 0)]
+    assert waited >= 0.15
+    assert len(sheets_server.requests) == 2
+    assert written(sheets_server.requests[1]) == {"'REPORT PS INDIHOME'!I9": 12, "'REPORT PS INDIHOME'!I10": 22}
+
+
+def test_older_export_finishing_late_does_not_overwrite(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_COALESCE_SECONDS", 0)
+    newer = [(name, row, col, 99) for name, row, col, _ in CELLS]
+    async def main():
+        await sw.submit_sheet_cells("sheet", newer, TS + timedelta(hours=2))
+        # Export lebih lama selesai diproses belakangan: flush terpisah
+        return await sw.submit_sheet_cells("sheet", CELLS, TS)
+    assert asyncio.run(main()) == (0, 2)
+    assert len(sheets_server.requests) == 1
+
+
+def test_older_export_in_same_window_loses_to_newer(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_COALESCE_SECONDS", 0.1)
+    newer = [(name, row, col, 99) for name, row, col, _ in CELLS]
+    async def main():
+        await sw.submit_sheet_cells("sheet", [('OTHER', 1, 1, 0)], TS)
+        await asyncio.gather(
+            sw.submit_sheet_cells("sheet", newer, TS + timedelta(hours=2)),
+            sw.submit_sheet_cells("sheet", CELLS, TS + timedelta(hours=1)),
+        )
+    asyncio.run(main())
+    assert written(sheets_server.requests[-1]) == {"'REPORT PS INDIHOME'!I9": 99, "'REPORT PS INDIHOME'!I10": 99}
+
+
+def test_unchanged_cells_are_skipped(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_COALESCE_SECONDS", 0)
+    async def main():
+        await sw.submit_sheet_cells("sheet", CELLS, TS)
+        return await sw.submit_sheet_cells("sheet", CELLS, TS + timedelta(hours=1))
+    assert asyncio.run(main()) == (0, 2)
+    assert len(sheets_server.requests) == 1
+
+
+def test_retries_429_5xx_and_timeout_then_succeeds(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_BACKOFF_BASE", 0.01)
+    sheets_server.responses = [
+        httpx.Response(429),
+        httpx.Response(503),
+        httpx.ReadTimeout("timeout"),
+        httpx.Response(500),
+    ]
+    result = asyncio.run(sw.batch_write_cells("sheet", CELLS))
+    assert result == {'totalUpdatedCells': 2}
+    assert len(sheets_server.requests) == 5
+
+
+def test_retry_after_is_capped(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_BACKOFF_MAX", 0.05)
+    sheets_server.responses = [httpx.Response(429, headers={'Retry-After': '3600'})]
+    t0 = time.perf_counter()
+    asyncio.run(sw.batch_write_cells("sheet", CELLS))
+    assert time.perf_counter() - t0 < 1
+    assert len(sheets_server.requests) == 2
+
+
+def test_gives_up_after_max_retries(sheets_server, monkeypatch):
+    monkeypatch.setattr(sw, "SHEETS_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(sw, "SHEETS_MAX_RETRIES", 2)
+    sheets_server.responses = [httpx.Response(503)] * 3
+    with pytest.raises(RuntimeError, match="3 percobaan"):
+        asyncio.run(sw.batch_write_cells("sheet", CELLS))
+
+
+def test_client_error_is_not_retried(sheets_server):
+    sheets_server.responses = [httpx.Response(400, text="bad range")]
+    with pytest.raises(RuntimeError, match="400"):
+        asyncio.run(sw.batch_write_cells("sheet", CELLS))
+    assert len(sheets_server.requests) == 1
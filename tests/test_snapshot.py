@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+
+DAY = date(2026, 1, 15)
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(sw, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+
+
+def counts(ps: int, pi: int = 0, sto: str = 'CPP') -> pd.Series:
+    rows = [{'STATUS': 'COMPWORK', 'STO': sto}] * ps + [{'STATUS': 'STARTWORK', 'STO': sto}] * pi
+    return sw.aggregate_dashboard_counts(pd.DataFrame(rows).assign(ERRORCODE=None, SUBERRORCODE=None)[sw.DASHBOARD_KEYS])
+
+
+def at(hour: int, minute: int = 0, day: date = DAY) -> datetime:
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=sw.WIB_TZ)
+
+
+def test_same_slot_is_overwritten():
+    sw.write_snapshot(counts(3), DAY, at(10, 5))
+    sw.write_snapshot(counts(7, pi=2), DAY, at(11, 55))
+    table = sw.load_trend(DAY, DAY, intraday=True)
+    assert list(table.index) == [(pd.Timestamp(2026, 1, 15, 10), 'CPP')]
+    assert table.loc[(pd.Timestamp(2026, 1, 15, 10), 'CPP'), ['PS', 'PI']].tolist() == [7, 2]
+
+
+def test_daily_trend_uses_last_slot_of_each_day():
+    sw.write_snapshot(counts(3), DAY, at(8))
+    sw.write_snapshot(counts(9), DAY, at(16))
+    sw.write_snapshot(counts(4), date(2026, 1, 14), at(20, day=date(2026, 1, 14)))
+    table = sw.load_trend(date(2026, 1, 13), DAY)
+    assert table['PS'].to_dict() == {(pd.Timestamp(2026, 1, 14), 'CPP'): 4, (pd.Timestamp(2026, 1, 15), 'CPP'): 9}
+    assert sw.load_trend(date(2026, 1, 1), date(2026, 1, 13)) is None
+
+
+def test_export_of_previous_day_stays_in_that_day():
+    # Upload pagi hari ini dengan STATUSDATE terbaru kemarin: slot terakhir kemarin
+    sw.write_snapshot(counts(5), date(2026, 1, 14), at(7))
+    slots = sw.load_trend(date(2026, 1, 14), date(2026, 1, 14), intraday=True).index.get_level_values('PERIODE')
+    assert list(slots) == [pd.Timestamp(2026, 1, 14, 22)]
+    assert sw.load_trend(DAY, DAY, intraday=True) is None
+
+
+@pytest.mark.parametrize("arg,expected", [
+    ('mtd', ('MTD', pd.Timestamp(2026, 1, 1), pd.Timestamp(DAY), False)),
+    ('7d', ('7D', pd.Timestamp(2026, 1, 9), pd.Timestamp(DAY), False)),
+    ('1d', ('1D', pd.Timestamp(DAY), pd.Timestamp(DAY), False)),
+    ('92d', ('92D', pd.Timestamp(2025, 10, 16), pd.Timestamp(DAY), False)),
+    ('2jam', ('per 2 jam', pd.Timestamp(DAY), pd.Timestamp(DAY), True)),
+    ('0d', None), ('93d', None), ('xd', None), ('minggu', None),
+])
+def test_trend_period(arg, expected):
+    assert sw.trend_period(arg, DAY) == expected
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import smokeweed as sw
+from benchmark import generate_export
+from conftest import REFERENCE
+
+TS = REFERENCE.replace(tzinfo=sw.WIB_TZ)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(sw, "WONUM_STORE_PATH", str(tmp_path / "wonum.sqlite3"))
+
+
+def export_frame(rows: int, seed: int = 1) -> pd.DataFrame:
+    df = generate_export(rows, seed, REFERENCE)[sw.REPORT_COLUMNS]
+    return df.astype({c: object for c in sw.EXPORT_TEXT_DTYPES}).where(df.notna(), None)
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    return sw.normalize_export(df.copy(), {})
+
+
+def summarize_store(*uploads) -> dict:
+    result = None
+    for df, ts in uploads:
+        result = sw.summarize_with_store([normalized(df)], ts, {})
+    return result
+
+
+def assert_same_result(got: dict, expected: dict):
+    # STO yang semua barisnya di luar jendela laporan tidak ikut query store (baris nol)
+    metrics = expected['metrics'][(expected['metrics'] != 0).any(axis=1)]
+    pd.testing.assert_frame_equal(got['metrics'].set_axis(got['metrics'].index.astype(str)), metrics.set_axis(metrics.index.astype(str)), check_dtype=False)
+    assert got['wonum_details'] == expected['wonum_details']
+    assert got['latest'] == expected['latest']
+    pd.testing.assert_frame_equal(sw.build_dashboard_table(got['dashboard_counts'])[0], sw.build_dashboard_table(expected['dashboard_counts'])[0])
+
+
+def test_upload_plus_delta_matches_full_export(store):
+    full = export_frame(2000)
+    first, delta = full.iloc[:1500], full.iloc[1500:].copy()
+    # Delta juga memperbarui WONUM lama: PS hari ini & kendala dengan STATUSDATE lebih baru
+    updated = full.iloc[:1500].sample(300, random_state=1).copy()
+    updated['STATUS'] = ['COMPWORK', 'WORKFAIL', 'STARTWORK'] * 100
+    updated['ERRORCODE'] = ['', 'KENDALA TEKNIK', ''] * 100
+    updated['STATUSDATE'] = '2026-01-15 14:00:00'  # lebih baru dari semua STATUSDATE export
+    expected_frame = full.copy()
+    expected_frame.loc[updated.index] = updated
+
+    got = summarize_store((first, TS - sw.timedelta(hours=2)), (pd.concat([delta, updated]), TS))
+    expected = sw.summarize_dataframe(normalized(expected_frame), TS)
+    assert_same_result(got, expected)
+
+
+def test_older_export_does_not_overwrite_newer_statusdate(store):
+    df = export_frame(50)
+    newer = df.assign(STATUS='COMPWORK', STATUSDATE='2026-01-15 12:00:00')
+    older = df.assign(STATUS='STARTWORK', STATUSDATE='2026-01-15 08:00:00')
+    got = summarize_store((newer, TS), (older, TS - sw.timedelta(hours=4)))
+    assert int(got['metrics']['PS ENDSTATE'].sum()) == 50
+    assert int(got['metrics']['PI'].sum()) == 0
+    assert got['rows'] == 50
@@ -0,0 +1,132 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import smokeweed as sw
+from benchmark import StubBot
+
+
+class CountingBot(StubBot):
+    def __init__(self): self.downloads = 0
+    async def get_file(self, file_id):
+        self.downloads += 1
+        return await super().get_file(file_id)
+
+
+def test_upload_sends_dashboard_and_text(run_upload, export_file):
+    message = run_upload(export_file())
+    assert message.sent == ['text', 'photo', 'text']
+    assert message.texts[-1].startswith("Fulfillment Endstate Witel JAKPUS")
+
+
+def test_evicted_cache_falls_back_to_download(run_upload, export_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(sw, "ENABLE_UPLOAD_CACHE", True)
+    monkeypatch.setattr(sw, "UPLOAD_CACHE_DIR", str(tmp_path / "cache"))
+    # Lookup menemukan entry, tapi file-nya sudah dievict sebelum worker membaca
+    monkeypatch.setattr(sw, "upload_cache_lookup", lambda file_unique_id: str(tmp_path / "cache" / "gone.parquet"))
+    bot = CountingBot()
+    message = run_upload(export_file(), bot)
+    assert bot.downloads == 1
+    assert message.sent == ['text', 'photo', 'text']
+    assert not any(text.startswith("❌") for text in message.texts)
+
+
+def test_cache_index_io_runs_off_event_loop(run_upload, export_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(sw, "ENABLE_UPLOAD_CACHE", True)
+    monkeypatch.setattr(sw, "UPLOAD_CACHE_DIR", str(tmp_path / "cache"))
+    loop_thread, calls = threading.get_ident(), []
+    for name in ("upload_cache_lookup", "upload_cache_register"):
+        def spy(*args, _fn=getattr(sw, name), _name=name):
+            calls.append((_name, threading.get_ident() != loop_thread))
+            return _fn(*args)
+        monkeypatch.setattr(sw, name, spy)
+    run_upload(export_file())
+    run_upload(export_file())
+    assert calls == [("upload_cache_lookup", True), ("upload_cache_register", True), ("upload_cache_lookup", True)]
+
+
+def test_over_budget_csv_upload_retires_worker_pool(run_upload, export_file, monkeypatch):
+    monkeypatch.setattr(sw, "MEMORY_BUDGET_MB", 1)
+    retired = []
+    monkeypatch.setattr(sw, "retire_process_pool", lambda: retired.append(True))
+    message = run_upload(export_file(fmt="csv"))
+    assert retired == [True]
+    assert message.sent == ['text', 'photo', 'text']
+
+
+def test_excel_upload_is_outside_memory_budget(run_upload, export_file, monkeypatch):
+    # Reader Excel memuat seluruh sheet: tidak dicek, worker tidak dipensiunkan
+    monkeypatch.setattr(sw, "MEMORY_BUDGET_MB", 1)
+    retired = []
+    monkeypatch.setattr(sw, "retire_process_pool", lambda: retired.append(True))
+    run_upload(export_file())
+    assert retired == []
+
+
+def test_within_budget_keeps_worker_pool(run_upload, export_file, monkeypatch):
+    retired = []
+    monkeypatch.setattr(sw, "retire_process_pool", lambda: retired.append(True))
+    run_upload(export_file(fmt="csv"))
+    assert retired == []
+
+
+def test_memory_budget_reported_by_covered_ingest_paths(export_file, tmp_path):
+    ts = sw.datetime(2026, 1, 15, 14, tzinfo=sw.WIB_TZ)
+    with open(export_file(fmt="xlsx"), "rb") as fh: xlsx = fh.read()
+    with open(export_file(fmt="csv"), "rb") as fh: csv = fh.read()
+    cache_path = str(tmp_path / "cache.parquet")
+    assert sw.analyze_upload(xlsx, ts, cache_path)['memory_budget_ok'] is None
+    assert sw.analyze_cached(cache_path, ts)['memory_budget_ok'] is True
+    assert sw.analyze_csv_upload(csv, ts)['memory_budget_ok'] is True
+
+
+# Tiap langkah di interpreter baru agar peak RSS tidak tercampur memori test / generator
+BUDGET_PREPARE = """
+import sys
+import pandas as pd
+import smokeweed as sw
+from benchmark import generate_export
+from conftest import REFERENCE
+csv_path, cache_path = sys.argv[1:]
+generate_export(sw.MEMORY_BUDGET_ROWS, 1, REFERENCE).to_csv(csv_path, index=False)
+df = pd.read_csv(csv_path, usecols=lambda c: c in sw.REPORT_COLUMNS, dtype=sw.EXPORT_TEXT_DTYPES)
+sw.write_cached_frame(sw.normalize_export(df, {}), cache_path)
+"""
+BUDGET_ANALYZE = """
+import sys, json
+import smokeweed as sw
+path, csv_path, cache_path = sys.argv[1:]
+ts = sw.datetime(2026, 1, 15, 14, tzinfo=sw.WIB_TZ)
+if path == "cached":
+    result = sw.analyze_cached(cache_path, ts)
+else:
+    with open(csv_path, "rb") as fh: data = fh.read()
+    result = sw.analyze_csv_upload(data, ts)
+print(json.dumps({'rows': result['rows'], 'peak': result['peak_rss_mb'], 'ok': result['memory_budget_ok']}))
+"""
+
+
+@pytest.fixture(scope="module")
+def budget_export(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("budget")
+    paths = [str(folder / "export.csv"), str(folder / "export.parquet")]
+    run_python(BUDGET_PREPARE, *paths)
+    return paths
+
+
+def run_python(code: str, *args) -> str:
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([os.path.dirname(tests_dir), tests_dir])}
+    return subprocess.run([sys.executable, "-c", code, *args], env=env, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("path", ["cached", "csv"])
+def test_memory_budget_holds_for_budget_rows(budget_export, path):
+    out = json.loads(run_python(BUDGET_ANALYZE, path, *budget_export).strip().splitlines()[-1])
+    assert out['rows'] == sw.MEMORY_BUDGET_ROWS
+    assert out['peak'] < sw.MEMORY_BUDGET_MB and out['ok'] is True
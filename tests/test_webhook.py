@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram import User
+from telegram.ext import Application
+
+import smokeweed as sw
+from conftest import REFERENCE
+
+
+@pytest.fixture
+def bot_app(monkeypatch):
+    """Application dengan arbitrary_callback_data seperti ptb, handler asli terdaftar."""
+    calls = []
+    async def drilldown(update, context): calls.append(update.callback_query.data)
+    monkeypatch.setattr(sw, "wonum_drilldown", drilldown)
+    app = Application.builder().token("0:test").arbitrary_callback_data(True).updater(None).build()
+    # Setara ExtBot.initialize() (get_me) tanpa jaringan
+    app.bot._bot_user = User(id=0, is_bot=True, first_name='Bot', username='test_bot')
+    sw.register_handlers(app)
+    monkeypatch.setattr(sw, "ptb", app)
+    return app, calls
+
+
+def callback_update_json(button, keyboard) -> dict:
+    """Update callback_query seperti yang dikirim Telegram: callback_data berupa string UUID."""
+    user = {'id': 7, 'is_bot': False, 'first_name': 'User'}
+    return {
+        'update_id': 1,
+        'callback_query': {
+            'id': '42', 'from': user, 'chat_instance': 'chat', 'data': button.callback_data,
+            'message': {
+                'message_id': 5, 'date': 0, 'chat': {'id': 7, 'type': 'private'},
+                'from': {'id': 0, 'is_bot': True, 'first_name': 'Bot'},
+                'photo': [], 'reply_markup': keyboard.to_dict(),
+            },
+        },
+    }
+
+
+async def post_webhook(payload: dict):
+    async def body(): return payload
+    return await sw.webhook(SimpleNamespace(json=body))
+
+
+def dispatch(app, update):
+    """Handler pertama yang cocok (urutan PTB) menerima update."""
+    handler = next((h for h in app.handlers[0] if h.check_update(update)), None)
+    assert handler is not None, f"tidak ada handler untuk callback_data {update.callback_query.data!r}"
+    return handler.callback(update, None)
+
+
+def test_webhook_callback_reaches_wonum_drilldown(bot_app):
+    app, calls = bot_app
+    ts = REFERENCE.replace(tzinfo=sw.WIB_TZ)
+    assert sw.wonum_index_put("7:5", {'CID': {'STARTWORK': ['WO1', 'WO2']}}, ts)
+    # Keyboard seperti terkirim ke Telegram: tuple disimpan di cache, tombol berisi UUID
+    keyboard = app.bot.callback_data_cache.process_keyboard(sw.wonum_sto_keyboard("7:5", sw.wonum_index_get("7:5")))
+    button = keyboard.inline_keyboard[0][0]
+    assert isinstance(button.callback_data, str)
+
+    async def main():
+        response = await post_webhook(callback_update_json(button, keyboard))
+        assert response.status_code == 200
+        await dispatch(app, app.update_queue.get_nowait())
+    asyncio.run(main())
+    assert calls == [('wonum', "7:5", 'CID', None, 0)]
+
+
+def test_unknown_callback_goes_to_expired_handler(bot_app, monkeypatch):
+    app, calls = bot_app
+    expired = []
+    async def expired_callback(update, context): expired.append(update.callback_query.data)
+    keyboard = app.bot.callback_data_cache.process_keyboard(
+        sw.InlineKeyboardMarkup([[sw.InlineKeyboardButton("x", callback_data=('wonum', 'k', None, None, 0))]]))
+    button = keyboard.inline_keyboard[0][0]
+    app.bot.callback_data_cache.clear_callback_data()
+    for group in app.handlers.values():
+        for handler in group:
+            if handler.callback is sw.expired_callback: handler.callback = expired_callback
+
+    async def main():
+        await post_webhook(callback_update_json(button, keyboard))
+        await dispatch(app, app.update_queue.get_nowait())
+    asyncio.run(main())
+    assert calls == []
+    assert len(expired) == 1